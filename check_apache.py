@@ -8,19 +8,19 @@ For use with AppFirst collector
 
 Example Usage:
   python /usr/share/appfirst/plugins/libexec/check_apache.py -H localhost -P 80 -t busy_workers -W 110 -C 130
+  python /usr/share/appfirst/plugins/libexec/check_apache.py -t scoreboard
+
+The status page is fetched once for all the metrics checked together, and
+shared between checks for --cache-ttl secs.
 
 Created on: 8/22/14
 """
 
-import sys
-import argparse
-import urllib2
-
-status_code = 3;
+import nagios
+import httpclient
+from nagios import CommandBasedPlugin as plugin
 
-# metrics dict keys are just script arguments
-# key values are either metrics or scoreboard arrays
-# scoreboard values arrays contain scoreboard key and output string
+# metrics dict keys are just script arguments, values are the keys of server-status?auto
 metrics = {}
 metrics['total_accesses'] = 'Total Accesses'
 metrics['cpu_load'] = 'CPULoad'
@@ -31,84 +31,117 @@ metrics['req_per_sec'] = 'ReqPerSec'
 metrics['total_kbytes'] = 'Total kBytes'
 metrics['busy_workers'] = 'BusyWorkers'
 metrics['idle_workers'] = 'IdleWorkers'
-metrics['scoreboard_c'] = ['C', 'Closing connection']
-metrics['scoreboard_.'] = ['.', 'Open slot with no current process']
-metrics['scoreboard_d'] = ['D', 'DNS lookup']
-metrics['scoreboard_g'] = ['G', 'Gracefully finishing']
-metrics['scoreboard_i'] = ['I', 'Idle cleanup of worker']
-metrics['scoreboard_k'] = ['K', 'Keepalive']
-metrics['scoreboard_l'] = ['L', 'Logging']
-metrics['scoreboard_r'] = ['R', 'Reading request']
-metrics['scoreboard_w'] = ['W', 'Sending reply']
-metrics['scoreboard__'] = ['_', 'Waiting for connection']
-metrics['scoreboard_s'] = ['S', 'Starting up']
-
-parser = argparse.ArgumentParser()
-parser.add_argument('-H', '--host', help='Host location, default=localhost', default='localhost')
-parser.add_argument('-P', '--port', help='Port number, default=80', default='80')
-parser.add_argument('-W', '--warning', help='Warning threshold', default=None, type=float)
-parser.add_argument('-C', '--critical', help='Critical theshold', default=None, type=float)
-parser.add_argument('-t', '--metric', help='Metric to choose', default=None, required=True)
-
-args = parser.parse_args()
-try:
-	cmd = metrics[args.metric]
-	if (isinstance(cmd, list)):
-		scoreboard = True
-		msg = cmd[1]
-		key = cmd[0]
-		cmd = 'Scoreboard'
-	else:
-		scoreboard = False
-		msg = args.metric
-except KeyError:
-	print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-	str_metrics =  "Supported Metrics: ["
-	for metric in metrics:
-		str_metrics += ("'" + metric + "',")
-	print str_metrics[:-1] + "]"
-	sys.exit(status_code)
-
-if (args.critical and args.critical < 0):
-	print "Error: -C Critical cannot be negative"
-	sys.exit(status_code)
-elif (args.warning and args.warning < 0):
-	print "Error: -W Warning cannot be negative"
-	sys.exit(status_code)
-
-#default url = "http://localhost:80/server-status?auto"
-url = "http://{host}:{port}/server-status?auto".format(host=args.host,port=args.port)
-
-apache_stats = urllib2.urlopen(url).read().split('\n')
-if (scoreboard):
-	keycounter = 0
-	for line in apache_stats:
-		tokens = line.split(': ')
-		if (tokens[0] == cmd):
-			for worker in tokens[1]:
-				if (worker == key):
-					keycounter += 1
-			strkeycounter = str(keycounter)
-			if (args.critical and keycounter >= args.critical):
-				print "CRITICAL - " + msg + ": " + strkeycounter + "|" + msg + "=" + strkeycounter
-				status_code = 2
-			elif (args.warning and keycounter >= args.warning):
-				print "WARNING - " + msg + ": " + strkeycounter + "|" + msg + "=" + strkeycounter
-				status_code = 1
-			else:
-				print "OK - " + msg + ": " + strkeycounter + "|" + msg + "=" + strkeycounter
-				status_code = 0
-else:
-	for line in apache_stats:
-		tokens = line.split(': ')
-		if (tokens[0] == cmd):
-			if (args.critical and float(tokens[1]) >= args.critical):
-				print "CRITICAL - " + tokens[0] + ": " + tokens[1] + "|" + msg + "=" + tokens[1]
-				status_code = 2
-			elif (args.warning and float(tokens[1]) >= args.warning):
-				print "WARNING - " + tokens[0] + ": " + tokens[1] + "|" + msg + "=" + tokens[1]
-				status_code = 1
-			else:
-				print "OK - " + tokens[0] + ": " + tokens[1] + "|" + msg + "=" + tokens[1]
-				status_code = 0
-sys.exit(status_code)
+
+# scoreboard arguments by scoreboard key, with the name the count is kept
+# under, as scoreboard@name, and the output string
+scoreboard = {}
+scoreboard['C'] = ('scoreboard_c', 'closing', 'Closing connection')
+scoreboard['.'] = ('scoreboard_.', 'open_slot', 'Open slot with no current process')
+scoreboard['D'] = ('scoreboard_d', 'dns_lookup', 'DNS lookup')
+scoreboard['G'] = ('scoreboard_g', 'finishing', 'Gracefully finishing')
+scoreboard['I'] = ('scoreboard_i', 'idle_cleanup', 'Idle cleanup of worker')
+scoreboard['K'] = ('scoreboard_k', 'keepalive', 'Keepalive')
+scoreboard['L'] = ('scoreboard_l', 'logging', 'Logging')
+scoreboard['R'] = ('scoreboard_r', 'reading', 'Reading request')
+scoreboard['W'] = ('scoreboard_w', 'sending', 'Sending reply')
+scoreboard['_'] = ('scoreboard__', 'waiting', 'Waiting for connection')
+scoreboard['S'] = ('scoreboard_s', 'starting', 'Starting up')
+scoreboard_options = dict((option, (name, description)) for option, name, description in scoreboard.itervalues())
+
+
+def parse_server_status(text):
+    '''server-status?auto as { key: number }, the scoreboard counted by
+       state as { scoreboard@name: count }, in one pass over the page'''
+    stats = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition(":")
+        if not sep:
+            continue
+        value = value.strip()
+        if key == "Scoreboard":
+            counts = dict.fromkeys(scoreboard, 0)
+            for worker in value:
+                counts[worker] = counts.get(worker, 0) + 1
+            for worker, count in counts.iteritems():
+                if worker in scoreboard:
+                    stats["scoreboard@" + scoreboard[worker][1]] = count
+        else:
+            number = nagios.to_num(value)
+            if number is not None:
+                stats[key] = number
+    return stats
+
+
+class ApacheChecker(nagios.BatchStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(ApacheChecker, self).__init__(*args, **kwargs)
+        self.parser.add_argument("-H", "--host",     required=False, type=str, default="localhost")
+        self.parser.add_argument("-P", "--port",     required=False, type=str, default="80")
+        self.parser.add_argument("-L", "--location", required=False, type=str, default="server-status",
+            help="location of status page, default=server-status")
+        self.parser.add_argument("-W", "--warning",  required=False, type=float, dest="warn")
+        self.parser.add_argument("-C", "--critical", required=False, type=float, dest="crit")
+        self.parser.add_argument("--timeout",  required=False, type=float, default=10)
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default="pd@apache_status")
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default="apache")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-P", "--port", type=str)
+        self.add_unique_argument("-L", "--location", type=str)
+        # the metrics are checked one at a time by most configurations,
+        # they share one fetch of the status page within a cycle
+        self.parser.set_defaults(cache_ttl=10)
+        # every metric and scoreboard state is checked by the same method
+        for name in metrics:
+            self.commands[name] = ApacheChecker.check_metric.im_func
+        for option in scoreboard_options:
+            self.commands[option] = ApacheChecker.check_scoreboard_state.im_func
+
+    def get_url(self, request):
+        return "http://%s:%s/%s?auto" % (request.host, request.port, request.location.lstrip("/"))
+
+    def _get_batch_status(self, request):
+        try:
+            return httpclient.get(self.get_url(request), timeout=request.timeout)
+        except httpclient.HTTPError, e:
+            raise nagios.http_error(request, e)
+
+    def _validate_output(self, request, output):
+        if "Scoreboard:" not in output:
+            raise nagios.OutputFormatError(request, output)
+        return True
+
+    def _parse_output(self, request, output):
+        return parse_server_status(output)
+
+    def check_metric(self, request):
+        key = metrics[request.option]
+        value = self.get_status_value(key, request)
+        return self.get_result(request, value, "%s: %s" % (key, value), request.option)
+
+    def check_scoreboard_state(self, request):
+        name, description = scoreboard_options[request.option]
+        value = self.get_status_value("scoreboard@" + name, request)
+        return self.get_result(request, value, "%s: %s" % (description, value), request.option)
+
+    @plugin.command("scoreboard")
+    def get_scoreboard(self, request):
+        busy = self.get_status_value("BusyWorkers", request)
+        sub_perfs = [(name, self.get_status_value(k, request))
+                     for name, k in self.get_sub_attrs("scoreboard", request)]
+        return self.get_result(request, busy, "%s busy workers" % busy, "busy_workers", sub_perfs=sub_perfs)
+
+    @plugin.command("total_accesses_rate")
+    def get_total_accesses_rate(self, request):
+        value = self.get_rate_value("Total Accesses", request)
+        return self.get_result(request, value, "%.2f accesses per second" % value, "accesses_per_sec")
+
+    @plugin.command("total_kbytes_rate")
+    def get_total_kbytes_rate(self, request):
+        value = self.get_rate_value("Total kBytes", request)
+        return self.get_result(request, value, "%.2f kBytes per second" % value, "kbytes_per_sec", UOM="KB")
+
+if __name__ == "__main__":
+    import sys
+    ApacheChecker().run(sys.argv[1:])
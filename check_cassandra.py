@@ -11,77 +11,135 @@ For use with AppFirst collector
 
 Usage Example:
   python /usr/share/appfirst/plugins/libexec/check_cassandra.py -L path/to/cassandra/bin -t pending_tasks -W 50 -C 100
+  python /usr/share/appfirst/plugins/libexec/check_cassandra.py -L path/to/cassandra/bin -t ALL --keyspaces
+
+nodetool cfstats starts a JVM and walks every table, it's run once for all
+the metrics checked together and its output, parsed into keyspace, table
+and metric, is shared between checks for --cache-ttl secs. The metrics add
+up over the tables, --keyspaces gives the value of every keyspace as
+perfdata.
 
 Created on: 8/22/14
 """
 
-import sys
-import subprocess
-import argparse
-
-status_code = 3
-value = 0
+import re
+import pipes
+import commands
+import nagios
 
 # metrics dict key is script argument
-# values are array of metric to filter for and output string
+# values are array of metric to filter for and output string, the names of
+# the metric in the later versions follow
 metrics = {}
 metrics['bloom_filter_space_used'] = ['Bloom Filter Space Used', 'Total Bloom Filter Space Used']
 metrics['bloom_filter_false_positives'] = ['Bloom Filter False Positives', 'Total Bloom Filter False Positives']
 metrics['bloom_filter_false_ratio'] = ['Bloom Filter False Ratio', 'Total Bloom Filter False Ratio']
-metrics['pending_tasks'] = ['Pending Tasks', 'Total Pending Tasks']
+metrics['pending_tasks'] = ['Pending Tasks', 'Total Pending Tasks', 'Pending flushes']
 metrics['memtable_switch_count'] = ['Memtable Switch Count', 'Total Switch Count']
 metrics['memtable_data_size'] = ['Memtable Data Size', 'Total Data Size']
-metrics['memtable_columns_count'] = ['Memtable Columns Count', 'Total Columns Count']
-
-parser = argparse.ArgumentParser()
-parser.add_argument('-L', '--location', help='Directory path of nodetool script, should be in same directory as cassdandra')
-parser.add_argument('-W', '--warning', help='Warning threshold', default=None, type=float)
-parser.add_argument('-C', '--critical', help='Critical theshold', default=None, type=float)
-parser.add_argument('-t', '--metric', help='Metric to choose', default=None, required=True)
-
-args = parser.parse_args()
-if (args.location):
-	path = args.location + "/nodetool"
-else:
-	print "Error - option -L for NodeTool script directory required"
-	sys.exit(2)
-try:
-	metric = args.metric
-	cmd = metrics[metric][0]
-	msg = metrics[metric][1]
-
-except KeyError:
-	print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-	str_metrics =  "Supported Metrics: ["
-	for metric in metrics:
-		str_metrics += ("'" + metric + "',")
-	print str_metrics[:-1] + "]"
-	sys.exit(status_code)
-if (args.critical and args.critical < 0):
-	print "Error: -C Critical cannot be negative"
-	sys.exit(status_code)
-elif (args.warning and args.warning < 0):
-	print "Error: -W Warning cannot be negative"
-	sys.exit(status_code)
-
-cass_info = subprocess.Popen([path, 'cfstats'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-output, err = cass_info.communicate()
-if (output is ""):
-	sys.exit(status_code)
-for line in output.split('\n\t\t'):
-	tokens = line.split(':')
-	if (tokens[0] == cmd):
-		value += float(tokens[1])
-
-
-if (args.critical and value>= args.critical):
-	print "CRITICAL - " + msg + ": " + str(value) +  "|" +  metric + "=" + str(value)
-	status_code = 2
-elif (args.warning and value >= args.warning):
-	print "WARNING - " + msg + ": " + str(value) +  "|" + metric + "=" + str(value)
-	status_code = 1
-else:
-	print "OK - " + msg + ": " + str(value) + "|" + metric + "=" + str(value)
-	status_code = 0
-
-sys.exit(status_code)
+metrics['memtable_columns_count'] = ['Memtable Columns Count', 'Total Columns Count', 'Memtable cell count']
+
+TABLE = re.compile(r"^\t\t(?:Column Family|Table)(?: \(index\))?: (.+)$")
+
+
+def metric_names(name):
+    '''the cfstats names of a metric, lowercased'''
+    return [n.lower() for n in metrics[name][:1] + metrics[name][2:]]
+
+
+def parse_cfstats(text):
+    '''nodetool cfstats as { keyspace: { table: { metric: number } } }, the
+       metric names lowercased. the lines of the keyspaces themselves and
+       the values that aren't numbers (i.e. NaN) aren't kept'''
+    tree = {}
+    keyspace = table = None
+    for line in text.splitlines():
+        if line.startswith("Keyspace"):
+            keyspace = line.partition(":")[2].strip()
+            tree[keyspace] = {}
+            table = None
+            continue
+        match = TABLE.match(line)
+        if match and keyspace is not None:
+            table = match.group(1).strip()
+            tree[keyspace][table] = {}
+            continue
+        if table is None or not line.startswith("\t\t"):
+            continue
+        key, sep, value = line.partition(":")
+        fields = value.split()
+        number = nagios.to_num(fields[0]) if sep and fields else None
+        # NaN while a table hasn't been read
+        if number is not None and number == number:
+            tree[keyspace][table][key.strip().lower()] = number
+    return tree
+
+
+class CassandraChecker(nagios.BatchStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(CassandraChecker, self).__init__(*args, **kwargs)
+        self.parser.add_argument("-L", "--location", required=False, type=str, default=None,
+            help="Directory path of nodetool script, should be in same directory as cassandra, "
+                 "nodetool in PATH by default")
+        self.parser.add_argument("-W", "--warning",  required=False, type=float, dest="warn")
+        self.parser.add_argument("-C", "--critical", required=False, type=float, dest="crit")
+        self.parser.add_argument("--keyspaces", required=False, action="store_true",
+            help="give the value of every keyspace as perfdata")
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default="pd@cassandra")
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default="cassandra")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-L", "--location", type=str)
+        # the JVM of nodetool takes seconds to start, its output is shared by
+        # the checks of an interval
+        self.parser.set_defaults(cache_ttl=30)
+        for name in metrics:
+            self.commands[name] = CassandraChecker.check_metric.im_func
+
+    def parse_args(self, args):
+        request = super(CassandraChecker, self).parse_args(args)
+        for name in ("warn", "crit"):
+            if getattr(request, name) is not None and getattr(request, name) < 0:
+                self.parser.error("-%s %s cannot be negative" % (name[0].upper(), name))
+        return request
+
+    def _get_batch_status(self, request):
+        nodetool = request.location.rstrip("/") + "/nodetool" if request.location else "nodetool"
+        status, output = commands.getstatusoutput(pipes.quote(nodetool) + " cfstats")
+        if status != 0:
+            raise nagios.ServiceInaccessibleError(request, output.strip() or "%s exited %s" % (nodetool, status))
+        return output
+
+    def _validate_output(self, request, output):
+        if "Keyspace" not in output:
+            raise nagios.OutputFormatError(request, output)
+        return True
+
+    # every metric added up over the tables, and by keyspace as metric@keyspace.
+    # the whole tree is kept as cfstats
+    def _parse_output(self, request, output):
+        tree = parse_cfstats(output)
+        stats = {"cfstats": tree}
+        for name in metrics:
+            names = metric_names(name)
+            stats[name] = 0
+            for keyspace, tables in tree.iteritems():
+                value = sum(t[n] for t in tables.itervalues() for n in names if n in t)
+                stats["%s@%s" % (name, keyspace)] = value
+                stats[name] += value
+        return stats
+
+    def check_metric(self, request):
+        msg = metrics[request.option][1]
+        value = self.get_status_value(request.option, request)
+        r = nagios.Result(request.option, self.verdict(value, request.warn, request.crit),
+                          "%s: %s" % (msg, value), request.appname)
+        r.add_performance_data(request.option, value, warn=request.warn, crit=request.crit)
+        if request.keyspaces:
+            for keyspace, k in self.get_sub_attrs(request.option, request):
+                r.add_performance_data(keyspace, self.get_status_value(k, request))
+        return r
+
+if __name__ == "__main__":
+    import sys
+    CassandraChecker().run(sys.argv[1:])
@@ -12,8 +12,7 @@ Created on: 8/22/14
 
 import sys
 import argparse
-import urllib2
-import json
+import httpclient
 
 status_code = 3
 
@@ -38,6 +37,7 @@ parser.add_argument('-P', '--port', help='Port number, default=5984', default='5
 parser.add_argument('-W', '--warning', help='Warning threshold', default=None, type=float)
 parser.add_argument('-C', '--critical', help='Critical theshold', default=None, type=float)
 parser.add_argument('-t', '--metric', help='Metric to choose', default=None, required=True)
+parser.add_argument('--timeout', help='Seconds to wait for the server, default=10', default=10, type=float)
 
 args = parser.parse_args()
 try:
@@ -60,7 +60,11 @@ elif (args.warning and args.warning < 0):
 url = "http://{host}:{port}/_stats/{_path1}/{_path2}".format(host=args.host,port=args.port, 
 								_path1=metric_path[0], _path2=metric_path[1])
 
-couchdb_obj   = json.loads(urllib2.urlopen(url).read())
+try:
+	couchdb_obj = httpclient.get_json(url, timeout=args.timeout)
+except (httpclient.HTTPError, ValueError), e:
+	print "Error: %s - Check host and port arguments" % e
+	sys.exit(status_code)
 metric_value  = couchdb_obj[metric_path[0]][metric_path[1]][metric_path[2]]
 if (metric_value is None):
 	metric_value = 0
@@ -4,21 +4,25 @@
 Author: Tony Ling
 Uses Elasticsearch HTTP API for cluster health metrics and parses the output
 Metrics supported: status, number_of_nodes, number_of_data_nodes, active_primary_shards, active_shards, relocating_shards, initializing_shards, unassigned_shards
+With --nodes: heap_used_percent, cpu_percent, the highest of the nodes
+With --indices: docs_count
 Warnings if metric value is less than threshold: number_of_nodes, number_of_data_nodes, active_primary_shards, active_shards
-Warnings if metric value is greater than threshold: relocating_shards, initializing_shards, unassigned_shards
+Warnings if metric value is greater than threshold: relocating_shards, initializing_shards, unassigned_shards, heap_used_percent, cpu_percent, docs_count
 
 Example Usage:
   python check_elasticsearch.py -t status -H localhost -P 9200 -W 10 -C 20
+  python check_elasticsearch.py -t ALL --nodes --indices
+
+_cluster/health, and _nodes/stats and _cat/indices when asked, are fetched
+once for all the metrics checked together and shared between checks for
+--cache-ttl secs. --nodes gives the value of each node as perfdata, and
+--indices the value of each index for active_primary_shards and docs_count.
 
 Created on: 10/31/14
 """
 
-import sys
-import urllib2
-import json
-import argparse
-
-status_code = 3
+import re
+import nagios
 
 # metrics dict keys are script metric -t arguments
 # key list values: element 0 = script output string, 1 = greater than/less than/status for critical/warning values
@@ -31,76 +35,135 @@ metrics['active_shards']= ['Number of active shards', 'less']
 metrics['relocating_shards']= ['Number of relocating shards', 'greater']
 metrics['initializing_shards']= ['Number of initializing shards', 'greater']
 metrics['unassigned_shards']= ['Number of unassigned shards', 'greater']
+metrics['heap_used_percent']= ['Highest JVM heap used percent of a node', 'greater']
+metrics['cpu_percent']= ['Highest CPU percent of a node', 'greater']
+metrics['docs_count']= ['Number of documents', 'greater']
+
+# the metrics read from another endpoint than _cluster/health, by the option fetching it
+endpoint_metrics = {}
+endpoint_metrics['nodes'] = ['heap_used_percent', 'cpu_percent']
+endpoint_metrics['indices'] = ['docs_count']
+
+health_status = {'green': nagios.Status.OK, 'yellow': nagios.Status.WARNING, 'red': nagios.Status.CRITICAL}
+
+
+def parse_nodes_stats(document):
+    '''_nodes/stats as { metric@node: value, metric: highest of the nodes }'''
+    stats = {}
+    for node_id, node in document.get('nodes', {}).iteritems():
+        name = re.sub(r"[^\w.-]+", "_", node.get('name', node_id))
+        heap = node.get('jvm', {}).get('mem', {}).get('heap_used_percent')
+        cpu = node.get('os', {}).get('cpu', {})
+        # os.cpu.percent since 5.0, os.cpu_percent before
+        cpu = cpu.get('percent') if isinstance(cpu, dict) else None
+        if cpu is None:
+            cpu = node.get('os', {}).get('cpu_percent')
+        for metric, value in (('heap_used_percent', heap), ('cpu_percent', cpu)):
+            if value is not None:
+                stats['%s@%s' % (metric, name)] = value
+                stats[metric] = max(stats.get(metric, value), value)
+    return stats
+
+
+def parse_cat_indices(document):
+    '''_cat/indices?format=json as { metric@index: value, docs_count: total },
+       a closed index has no counts'''
+    stats = {'docs_count': 0}
+    for index in document:
+        name = index.get('index')
+        if index.get('pri') is not None:
+            stats['active_primary_shards@%s' % name] = int(index['pri'])
+        if index.get('docs.count') is not None:
+            stats['docs_count@%s' % name] = int(index['docs.count'])
+            stats['docs_count'] += int(index['docs.count'])
+    return stats
+
+
+class ElasticsearchChecker(nagios.JsonStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(ElasticsearchChecker, self).__init__(*args, **kwargs)
+        self.parser.add_argument("-H", "--host",     required=False, type=str, default="localhost",
+            help="Host location, default=localhost")
+        self.parser.add_argument("-P", "--port",     required=False, type=str, default="9200",
+            help="Port number, default=9200")
+        self.parser.add_argument("-W", "--warning",  required=False, type=float, dest="warn")
+        self.parser.add_argument("-C", "--critical", required=False, type=float, dest="crit")
+        self.parser.add_argument("--nodes",    required=False, action="store_true",
+            help="read _nodes/stats too, for the metrics of the nodes and per node perfdata")
+        self.parser.add_argument("--indices",  required=False, action="store_true",
+            help="read _cat/indices too, for the metrics of the indices and per index perfdata")
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default="pd@elasticsearch")
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default="elasticsearch")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options, the
+        # snapshot of one holds the endpoints it's asked for
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-P", "--port", type=str)
+        self.add_unique_argument("--nodes", action="store_true")
+        self.add_unique_argument("--indices", action="store_true")
+        for name in metrics:
+            self.commands[name] = ElasticsearchChecker.check_metric.im_func
+
+    def parse_args(self, args):
+        request = super(ElasticsearchChecker, self).parse_args(args)
+        for name in ("warn", "crit"):
+            if getattr(request, name) is not None and getattr(request, name) < 0:
+                self.parser.error("-%s %s cannot be negative" % (name[0].upper(), name))
+        return request
+
+    def get_endpoints(self, request):
+        base = "http://%s:%s/" % (request.host, request.port)
+        endpoints = {"health": base + "_cluster/health"}
+        if request.nodes:
+            endpoints["nodes"] = base + "_nodes/stats/jvm,os"
+        if request.indices:
+            endpoints["indices"] = base + "_cat/indices?format=json&h=index,health,pri,docs.count"
+        return endpoints
+
+    def _parse_output(self, request, documents):
+        health = documents["health"]
+        if not isinstance(health, dict) or "status" not in health:
+            raise nagios.OutputFormatError(request, "_cluster/health: %r" % (health,))
+        stats = dict((k, v) for k, v in health.iteritems() if k in metrics)
+        if "nodes" in documents:
+            stats.update(parse_nodes_stats(documents["nodes"]))
+        if "indices" in documents:
+            stats.update(parse_cat_indices(documents["indices"]))
+            stats["unhealthy_indices"] = sorted(i["index"] for i in documents["indices"]
+                                                if i.get("health") in ("yellow", "red"))
+        return stats
+
+    # ALL is every metric of the endpoints asked for
+    def check(self, request):
+        if request.option == "ALL":
+            skipped = [name for option, names in endpoint_metrics.iteritems()
+                       if not getattr(request, option) for name in names]
+            request.option = ",".join(o for o in self.split_options("ALL") if o not in skipped)
+        return super(ElasticsearchChecker, self).check(request)
+
+    def check_metric(self, request):
+        msg, cmp_method = metrics[request.option]
+        for option, names in endpoint_metrics.iteritems():
+            if request.option in names and not getattr(request, option):
+                raise nagios.StatusUnknownError(request, "%s needs --%s" % (request.option, option))
+        stats = self.get_status_values(request)
+        if request.option not in stats:
+            raise nagios.StatusUnknownError(request,
+                "Returned cluster health does not include metric %s" % request.option)
+        value = stats[request.option]
+        message = "%s: %s" % (msg, value)
+        if request.option == "status" and stats.get("unhealthy_indices"):
+            message += " (%s)" % ", ".join(stats["unhealthy_indices"])
+        if cmp_method == 'status':
+            status = health_status.get(value, nagios.Status.UNKNOWN)
+        else:
+            status = self.verdict(value, request.warn, request.crit, reverse=cmp_method == 'less')
+        r = nagios.Result(request.option, status, message, request.appname)
+        r.add_performance_data(request.option, value, warn=request.warn, crit=request.crit)
+        for name, k in self.get_sub_attrs(request.option, request):
+            r.add_performance_data(name, stats[k], warn=request.warn, crit=request.crit)
+        return r
 
-parser = argparse.ArgumentParser()
-parser.add_argument('-H', '--host', help='Host location, default=localhost', default='localhost')
-parser.add_argument('-P', '--port', help='Port number, default=9200', default='9200')
-parser.add_argument('-W', '--warning', help='Warning threshold', default=None, type=float)
-parser.add_argument('-C', '--critical', help='Critical theshold', default=None, type=float)
-parser.add_argument('-t', '--metric', help='Metric to choose', default=None, required=True)
-
-args = parser.parse_args()
-
-if (args.critical and args.critical < 0):
-	print "Error: -C Critical cannot be negative"
-	sys.exit(status_code)
-elif (args.warning and args.warning < 0):
-	print "Error: -W Warning cannot be negative"
-	sys.exit(status_code)
-
-try:
-	array_value = metrics[args.metric]
-	msg = array_value[0]
-	cmp_method = array_value[1]
-	output = urllib2.urlopen("http://{host}:{port}/_cluster/health?pretty=true".format(host=args.host, port=args.port))
-	cluster_health = json.loads(output.read())
-except KeyError:
-	print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-	str_metrics =  "Supported Metrics: ["
-	for metric in metrics:
-		str_metrics += ("'" + metric + "',")
-	print str_metrics[:-1] + "]"
-	sys.exit(status_code)
-except urllib2.URLError:
-	print "Error: Connection Refused - Check host and port arguments"
-	sys.exit(status_code)
-
-try:
-	value = cluster_health[args.metric]
-except:
-	print "Error: Returned cluster health does not include metric {_metric}".format(_metric=args.metric)
-	status_code = 2
-	sys.exit(status_code)
-
-if cmp_method == 'status':
-	if value == "red":
-		status_code = 2
-		print "CRITICAL - " + msg + ": " + value + "|" + args.metric + "=" + value
-	elif value == "yellow":
-		status_code = 1
-		print "WARNING - " + msg + ": " + value + "|" + args.metric + "=" + value
-	else:
-		status_code = 0
-		print "OK - " + msg + ": " + value + "|" + args.metric + "=" + value
-elif cmp_method == 'less':
-	if (args.critical and int(value) <= args.critical):
-		print "CRITICAL - " + msg + ": " + str(value) +  "|" +  args.metric  + "=" + str(value)
-		status_code = 2
-	elif (args.warning and int(value) <= args.warning):
-		print "WARNING - " + msg + ": " + str(value) +  "|" + args.metric  + "=" + str(value)
-		status_code = 1
-	else:
-		print "OK - " + msg + ": " + str(value) + "|" + args.metric  + "=" + str(value)
-		status_code = 0
-elif cmp_method == 'greater':
-	if (args.critical and int(value) >= args.critical):
-		print "CRITICAL - " + msg + ": " + str(value) +  "|" +  args.metric  + "=" + str(value)
-		status_code = 2
-	elif (args.warning and int(value) >= args.warning):
-		print "WARNING - " + msg + ": " + str(value) +  "|" + args.metric  + "=" + str(value)
-		status_code = 1
-	else:
-		print "OK - " + msg + ": " + str(value) + "|" + args.metric  + "=" + str(value)
-		status_code = 0
-
-sys.exit(status_code)
+if __name__ == "__main__":
+    import sys
+    ElasticsearchChecker().run(sys.argv[1:])
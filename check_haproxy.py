@@ -8,18 +8,20 @@ For use with AppFirst collector
 
 Example Usage:
   python /usr/share/appfirst/plugins/libexec/check_haproxy.py -P 1935 -L haproxy?stats -U guest -p guest -t qcur -W 500 -C 1000
+  python /usr/share/appfirst/plugins/libexec/check_haproxy.py -P 1935 -L haproxy?stats -t ALL --proxy 'www*,api'
+
+The stats page is read once for all the metrics, as a stream, and shared
+between checks for --cache-ttl secs. Every metric gives the value of each
+proxy as perfdata, from its BACKEND line, or its FRONTEND line for the
+metrics only frontends have.
 
 Created on: 8/22/14
 """
 
-import sys
-import argparse
-import urllib2
 import csv
-import base64
-import StringIO
-
-status_code = 3;
+import fnmatch
+import nagios
+import httpclient
 
 #metrics dict key is the cvs column metric and value is output string
 metrics = {}
@@ -30,78 +32,96 @@ metrics['qcur'] = 'Total current queues'
 metrics['scur'] = 'Total current sessions'
 metrics['stot'] = 'Total sessions'
 
-parser = argparse.ArgumentParser()
-parser.add_argument('-H', '--host', help='Host location, default=localhost', default='localhost')
-parser.add_argument('-P', '--port', help='Port number', default=None, type=int)
-parser.add_argument('-U', '--username', help='Username for authentication, default=guest', default='guest')
-parser.add_argument('-p', '--password', help='Password for authentication, default=guest', default='guest')
-parser.add_argument('-L', '--location', help='Path location of stats page, ex: [host]:[port]/haproxy?stats', default=None)
-parser.add_argument('-W', '--warning', help='Warning threshold', default=None, type=float)
-parser.add_argument('-C', '--critical', help='Critical theshold', default=None, type=float)
-parser.add_argument('-t', '--metric', help='Metric to choose', default=None, required=True)
-
-args = parser.parse_args()
-try:
-	msg = metrics[args.metric]
-	metric = args.metric
-except KeyError:
-	print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-	str_metrics =  "Supported Metrics: ["
-	for metric in metrics:
-		str_metrics += ("'" + metric + "',")
-	print str_metrics[:-1] + "]"
-	sys.exit(status_code)
-
-if (args.critical and args.critical < 0):
-	print "Error: -C Critical cannot be negative"
-	sys.exit(status_code)
-elif (args.warning and args.warning < 0):
-	print "Error: -W Warning cannot be negative"
-	sys.exit(status_code)
-
-#example url = "http://localhost:1935/haproxy?stats;csv"
-if (args.port):
-	if (args.location):
-		request = urllib2.Request("http://{host}:{port}/{path};csv".format(host=args.host,port=args.port,path=args.location))
-	else:
-		print "Error: No path location supplied.  Type -h or --help for help"
-		sys.exit(2)
-else:
-	print "Error: No port supplied.  Type -h or --help for help"
-	sys.exit(2)
-
-if (args.username and args.password):
-	base64string = base64.encodestring('%s:%s' % (args.username, args.password)).replace('\n', '')
-	request.add_header("Authorization", "Basic %s" % base64string)
-
-csvstring = StringIO.StringIO(urllib2.urlopen(request).read())
-reader = csv.reader(csvstring, delimiter=',')
-
-data = []
-for row in reader:
-	data.append(row)
-limit = len(data[0])
-
-for i in range(0,limit):
-	if (data[0][i] == metric):
-		index = i;
-		break;
-metric_value = 0
-for i in range(1,len(data)):
-	if (data[i][index] is not ''):
-		try:
-			metric_value += int(data[i][index])
-		except:
-			pass
-
-if (args.critical and metric_value >= args.critical):
-	print "CRITICAL - " + msg + ": " + str(metric_value) + "|" + metric + "=" + str(metric_value)
-	status_code = 2
-elif (args.warning and metric_value >= args.warning):
-	print "WARNING - " + msg + ": " + str(metric_value) + "|" + metric + "=" + str(metric_value)
-	status_code = 1
-else:
-	print "OK - " + msg + ": " + str(metric_value) + "|" + metric + "=" + str(metric_value)
-	status_code = 0
-
-sys.exit(status_code)
+
+def aggregate_stats(lines, proxies=None):
+    '''sum every metric over the lines of the stats csv as they are read,
+       as { metric: total, metric@pxname: value of the proxy }. proxies is a
+       list of fnmatch patterns of the pxname to count, all if none'''
+    reader = csv.reader(lines)
+    header = reader.next()
+    header[0] = header[0].lstrip("# ")
+    columns = [(i, name) for i, name in enumerate(header) if name in metrics]
+    if not columns:
+        raise csv.Error("not a stats csv, header %r" % ",".join(header))
+    stats = dict.fromkeys(metrics, 0)
+    frontends = {}
+    for row in reader:
+        if len(row) < len(header):
+            continue
+        pxname, svname = row[0], row[1]
+        if proxies and not any(fnmatch.fnmatchcase(pxname, p) for p in proxies):
+            continue
+        for i, name in columns:
+            try:
+                value = int(row[i])
+            except ValueError:
+                continue
+            stats[name] += value
+            if svname == "BACKEND":
+                stats["%s@%s" % (name, pxname)] = value
+            elif svname == "FRONTEND":
+                frontends["%s@%s" % (name, pxname)] = value
+    for k, v in frontends.iteritems():
+        stats.setdefault(k, v)
+    return stats
+
+
+class HAProxyChecker(nagios.BatchStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(HAProxyChecker, self).__init__(*args, **kwargs)
+        self.parser.add_argument("-H", "--host",     required=False, type=str, default="localhost")
+        self.parser.add_argument("-P", "--port",     required=True,  type=int)
+        self.parser.add_argument("-U", "--username", required=False, type=str, default="guest")
+        self.parser.add_argument("-p", "--password", required=False, type=str, default="guest")
+        self.parser.add_argument("-L", "--location", required=True,  type=str,
+            help="Path location of stats page, ex: [host]:[port]/haproxy?stats")
+        self.parser.add_argument("-W", "--warning",  required=False, type=float, dest="warn")
+        self.parser.add_argument("-C", "--critical", required=False, type=float, dest="crit")
+        self.parser.add_argument("--proxy",    required=False, type=str,
+            help="comma separated names of the proxies to count, wildcards allowed, all of them by default")
+        self.parser.add_argument("--timeout",  required=False, type=float, default=10)
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default="pd@haproxy_stats")
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default="haproxy")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-P", "--port", type=str)
+        self.add_unique_argument("-L", "--location", type=str)
+        self.add_unique_argument("--proxy", type=str)
+        # the metrics are checked one at a time by most configurations,
+        # they share one fetch of the stats page within a cycle
+        self.parser.set_defaults(cache_ttl=10)
+        for name in metrics:
+            self.commands[name] = HAProxyChecker.check_metric.im_func
+
+    def get_url(self, request):
+        return "http://%s:%s/%s;csv" % (request.host, request.port, request.location.lstrip("/"))
+
+    # the page is aggregated while it is read, it's never held as a whole
+    def _get_batch_status(self, request):
+        proxies = [p.strip() for p in request.proxy.split(",")] if request.proxy else None
+        username, password = (request.username, request.password) if request.username and request.password else (None, None)
+        try:
+            lines = httpclient.iter_lines(self.get_url(request), username, password, timeout=request.timeout)
+            return aggregate_stats(lines, proxies)
+        except httpclient.HTTPError, e:
+            raise nagios.http_error(request, e)
+        except (csv.Error, StopIteration), e:
+            raise nagios.OutputFormatError(request, "%s: %s" % (self.get_url(request), e or "empty page"))
+
+    def _validate_output(self, request, output):
+        return True
+
+    def _parse_output(self, request, output):
+        return output
+
+    def check_metric(self, request):
+        value = self.get_status_value(request.option, request)
+        sub_perfs = [(pxname, self.get_status_value(k, request))
+                     for pxname, k in self.get_sub_attrs(request.option, request)]
+        return self.get_result(request, value, "%s: %s" % (metrics[request.option], value),
+                               request.option, sub_perfs=sub_perfs)
+
+if __name__ == "__main__":
+    import sys
+    HAProxyChecker().run(sys.argv[1:])
@@ -8,139 +8,113 @@ Warnings if metric value is less than threshold: views
 Warnings if metric value is greater than threshold: executorsUtilization, buildQueue
 
 Example Usage:
-  python check_jenkins.py -t executorsUtilization -H localhost -P 8080 -W 80 -C 90
+  python check_jenkins.py -t executorsUtilization -H localhost -P 8080 -W 0.8 -C 0.9
+  python check_jenkins.py -t ALL
+
+Only the fields used are asked for, with ?tree=, from api/json, queue/api/json
+and computer/api/json. They are fetched together, once for all the metrics
+checked, and shared between checks for --cache-ttl secs so that polling
+doesn't load the master. executorsUtilization is the ratio of busy
+executors, from 0 to 1, and gives the ratio of each node as perfdata.
 
 Created on: 10/31/14
 """
 
-import sys
-import urllib2
-import json
-import argparse
-
-parser = argparse.ArgumentParser()
-parser.add_argument('-H', '--host', help='Host location, default=localhost', default='localhost')
-parser.add_argument('-P', '--port', help='Port number, default=8080', default='8080')
-parser.add_argument('-W', '--warning', help='Warning threshold', default=None, type=float)
-parser.add_argument('-C', '--critical', help='Critical theshold', default=None, type=float)
-parser.add_argument('-t', '--metric', help='Metric to choose', default=None, required=True)
-args = parser.parse_args()
-
-def check_thresholds():
-	if (args.critical and args.critical < 0):
-		print "Error: -C Critical cannot be negative"
-		sys.exit(status_code)
-	elif (args.warning and args.warning < 0):
-		print "Error: -W Warning cannot be negative"
-		sys.exit(status_code)
-
-def cmp_less(msg, value):
-	check_thresholds()
-	if (args.critical and float(value) <= args.critical):
-		print "CRITICAL - " + msg + ": " + str(value) +  "|" +  args.metric  + "=" + str(value)
-		status_code = 2
-	elif (args.warning and float(value) <= args.warning):
-		print "WARNING - " + msg + ": " + str(value) +  "|" + args.metric  + "=" + str(value)
-		status_code = 1
-	else:
-		print "OK - " + msg + ": " + str(value) + "|" + args.metric  + "=" + str(value)
-		status_code = 0
-	sys.exit(status_code)
-
-def cmp_greater(msg, value):
-	check_thresholds()
-	if (args.critical and float(value) >= args.critical):
-		print "CRITICAL - " + msg + ": " + str(value) +  "|" +  args.metric  + "=" + str(value)
-		status_code = 2
-	elif (args.warning and float(value) >= args.warning):
-		print "WARNING - " + msg + ": " + str(value) +  "|" + args.metric  + "=" + str(value)
-		status_code = 1
-	else:
-		print "OK - " + msg + ": " + str(value) + "|" + args.metric  + "=" + str(value)
-		status_code = 0
-	sys.exit(status_code)
-
-def get_mode():
-	metrics = get_jenkins_metrics("api/json")
-	status = metrics[args.metric]
-	if status == "NORMAL":
-		print "OK - Server mode: " + status + "|" + args.metric + "=" + status
-		status_code = 0
-		sys.exit(status_code)
-	else:
-		print "WARNING - Server mode: " + status + "|" + args.metric + "=" + status
-		status_code = 1
-		sys.exit(status_code)
-
-def get_quietingDown():
-	metrics = get_jenkins_metrics("api/json")
-	status = str(metrics[args.metric])
-	print "OK - Server is quieting down: " + status + "|" + args.metric + "=" + status
-	status_code = 0
-	sys.exit(status_code)
-
-def get_useCrumbs():
-	metrics = get_jenkins_metrics("api/json")
-	status = str(metrics[args.metric])
-	print "OK - Server is using crumbs: " + status + "|" + args.metric + "=" + status
-	status_code = 0
-	sys.exit(status_code)
-
-def get_views():
-	metrics = get_jenkins_metrics("api/json")
-	value = len(metrics[args.metric])
-	msg = "Number of views"
-	cmp_less(msg, value)
-
-def get_buildQueue():
-	metrics = get_jenkins_metrics("queue/api/json")
-	value = len(metrics["items"])
-	msg = "Number of build queue items"
-	cmp_greater(msg, value)
-
-def get_executorsUtilization():
-	metrics = get_jenkins_metrics("computer/api/json")
-	busy = int(metrics["busyExecutors"])
-	total = float(metrics["totalExecutors"])
-	percent = busy/total
-	msg = "Executors Utilization (%)"
-	cmp_greater(msg, percent)
-
-def get_jenkins_metrics(url):
-	try:
-		output = urllib2.urlopen("http://{host}:{port}/{url}".format(host=args.host, port=args.port, url=url))
-		jenkins_metrics = json.loads(output.read())
-	except KeyError:
-		print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-		str_metrics =  "Supported Metrics: ["
-		for metric in metrics:
-			str_metrics += ("'" + metric + "',")
-		print str_metrics[:-1] + "]"
-		sys.exit(status_code)
-	except urllib2.URLError:
-		print "Error: Connection Refused - Check host and port arguments"
-		sys.exit(status_code)
-	return jenkins_metrics
+import re
+import nagios
 
-# metrics dict keys are script metric -t arguments
-# key values are functions called when the keys are matched
-metrics = { "mode": get_mode,
-            "quietingDown": get_quietingDown,
-            "useCrumbs": get_useCrumbs,
-            "views": get_views,
-            "buildQueue": get_buildQueue,
-            "executorsUtilization": get_executorsUtilization
-            }
-
-# Program entry starts here
-status_code = 3
-try:
-	metrics[args.metric]()
-except KeyError:
-	print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-	str_metrics =  "Supported Metrics: ["
-	for metric in metrics:
-		str_metrics += ("'" + metric + "',")
-	print str_metrics[:-1] + "]"
-	sys.exit(status_code)
+# the fields read from each endpoint
+ENDPOINTS = {}
+ENDPOINTS['jenkins'] = 'api/json?tree=mode,quietingDown,useCrumbs,views[name]'
+ENDPOINTS['queue'] = 'queue/api/json?tree=items[id]'
+ENDPOINTS['computer'] = 'computer/api/json?tree=busyExecutors,totalExecutors,computer[displayName,offline,executors[idle]]'
 
+# metrics dict keys are script metric -t arguments
+# key list values: element 0 = script output string, 1 = greater than/less than/mode/info for critical/warning values
+metrics = {}
+metrics['mode'] = ['Server mode', 'mode']
+metrics['quietingDown'] = ['Server is quieting down', 'info']
+metrics['useCrumbs'] = ['Server is using crumbs', 'info']
+metrics['views'] = ['Number of views', 'less']
+metrics['buildQueue'] = ['Number of build queue items', 'greater']
+metrics['executorsUtilization'] = ['Executors Utilization (%)', 'greater']
+
+
+def utilization(busy, total):
+    return float(busy) / total if total else 0.0
+
+
+def parse_jenkins(documents):
+    '''the documents of ENDPOINTS as { metric: value, executorsUtilization@node: value }'''
+    jenkins, queue, computer = documents['jenkins'], documents['queue'], documents['computer']
+    stats = {}
+    stats['mode'] = jenkins['mode']
+    stats['quietingDown'] = str(jenkins['quietingDown'])
+    stats['useCrumbs'] = str(jenkins['useCrumbs'])
+    stats['views'] = len(jenkins['views'])
+    stats['buildQueue'] = len(queue['items'])
+    stats['executorsUtilization'] = utilization(computer['busyExecutors'], computer['totalExecutors'])
+    for node in computer.get('computer', []):
+        if node.get('offline'):
+            continue
+        executors = node.get('executors') or []
+        busy = len([e for e in executors if not e.get('idle', True)])
+        name = re.sub(r"[^\w.-]+", "_", node.get('displayName', 'master'))
+        stats['executorsUtilization@' + name] = utilization(busy, len(executors))
+    return stats
+
+
+class JenkinsChecker(nagios.JsonStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(JenkinsChecker, self).__init__(*args, **kwargs)
+        self.parser.add_argument("-H", "--host",     required=False, type=str, default="localhost",
+            help="Host location, default=localhost")
+        self.parser.add_argument("-P", "--port",     required=False, type=str, default="8080",
+            help="Port number, default=8080")
+        self.parser.add_argument("-W", "--warning",  required=False, type=float, dest="warn")
+        self.parser.add_argument("-C", "--critical", required=False, type=float, dest="crit")
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default="pd@jenkins")
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default="jenkins")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-P", "--port", type=str)
+        for name in metrics:
+            self.commands[name] = JenkinsChecker.check_metric.im_func
+
+    def parse_args(self, args):
+        request = super(JenkinsChecker, self).parse_args(args)
+        for name in ("warn", "crit"):
+            if getattr(request, name) is not None and getattr(request, name) < 0:
+                self.parser.error("-%s %s cannot be negative" % (name[0].upper(), name))
+        return request
+
+    def get_endpoints(self, request):
+        base = "http://%s:%s/" % (request.host, request.port)
+        return dict((name, base + path) for name, path in ENDPOINTS.iteritems())
+
+    def _parse_output(self, request, documents):
+        try:
+            return parse_jenkins(documents)
+        except (KeyError, TypeError, AttributeError), e:
+            raise nagios.OutputFormatError(request, "missing %s in the Jenkins API" % e)
+
+    def check_metric(self, request):
+        msg, cmp_method = metrics[request.option]
+        value = self.get_status_value(request.option, request)
+        message = "%s: %s" % (msg, value)
+        if cmp_method == 'mode':
+            status = nagios.Status.OK if value == 'NORMAL' else nagios.Status.WARNING
+        elif cmp_method == 'info':
+            status = nagios.Status.OK
+        else:
+            status = self.verdict(value, request.warn, request.crit, reverse=cmp_method == 'less')
+        r = nagios.Result(request.option, status, message, request.appname)
+        r.add_performance_data(request.option, value, warn=request.warn, crit=request.crit)
+        for name, k in self.get_sub_attrs(request.option, request):
+            r.add_performance_data(name, self.get_status_value(k, request), warn=request.warn, crit=request.crit)
+        return r
+
+if __name__ == "__main__":
+    import sys
+    JenkinsChecker().run(sys.argv[1:])
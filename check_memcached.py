@@ -7,128 +7,151 @@ Updated on September 19, 2014 by Tony Ling
 '''
 import nagios
 from nagios import CommandBasedPlugin as plugin
-import commands
 import statsd
-import argparse
+import sockquery
 
 class MemcachedChecker(nagios.BatchStatusPlugin):
     def __init__(self, *args, **kwargs):
         super(MemcachedChecker, self).__init__(*args, **kwargs)
-        # Hack to determine uniqueness of script defs
-        check = argparse.ArgumentParser()
-        check.add_argument("-H", "--host",     required=False, type=str)
-        check.add_argument("-p", "--port",     required=False, type=int)
-        chk, unknown = check.parse_known_args()
-
         self.parser.add_argument("-f", "--filename", required=False, type=str, default='pd@memcached_stats')
-        self.parser.add_argument("-H", "--host",     required=False, type=str, default="localhost")
+        self.parser.add_argument("-H", "--host",     required=False, type=str, default="localhost",
+            help="host, or a comma separated list of host[:port] checked as one")
         self.parser.add_argument("-p", "--port",     required=False, type=int, default=11211)
         self.parser.add_argument("-z", "--appname",  required=False, type=str, default='memcached')
-        self.parser.add_argument("--unique",   required=False, type=str, default=str(chk.host)+str(chk.port))
+        self.parser.add_argument("--timeout",  required=False, type=int, default=10)
+        self.parser.add_argument("--slabs",    required=False, action="store_true",
+            help="read stats slabs and stats items as well")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-p", "--port", type=int)
+
+    def get_targets(self, request):
+        try:
+            return sockquery.parse_targets(request.host, request.port)
+        except ValueError, e:
+            raise nagios.StatusUnknownError(request, "%s. usage: -H host[:port][,host[:port]...]" % e)
 
     def _get_batch_status(self, request):
-        cmd = "echo 'stats' | nc"
-        cmd += " %s %s" % (request.host, request.port)
-#        output = commands.getoutput(cmd)
-#        if output.strip() == "":
-        import subprocess
-        cmd = "exec 5<>/dev/tcp/%s/%s;echo -e \"stats\nquit\" >&5;cat <&5" % (request.host, request.port)
-        proc = subprocess.Popen(['bash', '-c', cmd],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            stdin=subprocess.PIPE)
-        output, _ = proc.communicate()
-        return output
-
-
+        payload = "stats\r\n"
+        if request.slabs:
+            payload += "stats slabs\r\nstats items\r\n"
+        payload += "quit\r\n"
+        replies = sockquery.query_all(self.get_targets(request), payload, request.timeout)
+        return dict((sockquery.format_target(address), reply) for address, reply in replies.iteritems())
+
+    # stats summed up over the servers, and by server as attr@host:port.
+    # slab classes are like 1:used_chunks and items:1:evicted
     def _parse_output(self, request, output):
-        for l in output.split('\r\n'):
-            triple = l.split(" ")
-            if triple[0] != "STAT":
-                continue
-            k = triple[1]
-            v = triple[2]
-            value = nagios.to_num(v)
-            if value is not None:
-                yield k, value
-
+        stats = {}
+        nodes = [node for node, reply in output.iteritems() if self._is_valid(reply)]
+        for node in nodes:
+            for l in output[node].split('\r\n'):
+                triple = l.split(" ")
+                if triple[0] != "STAT" or len(triple) < 3:
+                    continue
+                k = triple[1]
+                value = nagios.to_num(triple[2])
+                if value is None:
+                    continue
+                stats[k] = stats.get(k, 0) + value
+                stats["%s@%s" % (k, node)] = value
+        stats["servers_down"] = len(output) - len(nodes)
+        return stats.iteritems()
+
+    def _is_valid(self, reply):
+        return isinstance(reply, str) and "STAT" in reply and "END" in reply
+
+    # UNKNOWN when none of the servers answers
     def _validate_output(self, request, output):
-        if output.strip() == "":
-            raise nagios.ServiceInaccessibleError(request)
-        elif "STAT" not in output or "END" not in output:
-            raise nagios.ServiceInaccessibleError(request, output)
+        if not any(self._is_valid(reply) for reply in output.itervalues()):
+            raise nagios.StatusUnknownError(request,
+                "; ".join("%s %s" % (node, reply) for node, reply in sorted(output.iteritems())))
         return True
 
+    # the perfdata of every server follows the total when -H lists several
+    def get_sub_perfs(self, request, node_attrs, values):
+        if len(self.get_targets(request)) < 2:
+            return []
+        return zip([node for node, _ in node_attrs], values)
+
+    def get_status_result(self, request, attr, message, pfhead):
+        value = self.get_status_value(attr, request)
+        node_attrs = self.get_sub_attrs(attr, request)
+        values = [self.get_status_value(k, request) for _, k in node_attrs]
+        return self.get_result(request, value, message % value, pfhead,
+                               sub_perfs=self.get_sub_perfs(request, node_attrs, values))
+
+    # the deltas are taken by server and added up, a server that's down
+    # is left out rather than taking its counters off the total. a server
+    # without a last value, i.e. one added or the totals saved before the
+    # keys were by server, starts from 0 rather than its whole counter
+    def get_delta_result(self, request, attr, message, pfhead):
+        node_attrs = self.get_sub_attrs(attr, request)
+        deltas = self.get_delta_values([k for _, k in node_attrs], request, initial=0)
+        value = sum(deltas)
+        return self.get_result(request, value, message % value, pfhead,
+                               sub_perfs=self.get_sub_perfs(request, node_attrs, deltas))
+
     @plugin.command("OPERATIONS_SET_REQUESTS")
     @statsd.counter
     def get_cmd_set(self, request):
-        value = self.get_delta_value("cmd_set", request)
-        return self.get_result(request, value, '%s set requests' % value, 'set_requests')
+        return self.get_delta_result(request, "cmd_set", '%s set requests', 'set_requests')
 
     @plugin.command("OPERATIONS_GET_REQUESTS")
     @statsd.counter
     def get_cmd_get(self, request):
-        value = self.get_delta_value("cmd_get", request)
-        return self.get_result(request, value, '%s get resquests' % value, 'get_requests')
+        return self.get_delta_result(request, "cmd_get", '%s get resquests', 'get_requests')
 
     @plugin.command("BYTES_READ")
     @statsd.counter
     def get_bytes_read(self, request):
-        value = self.get_delta_value("bytes_read", request)
-        return self.get_result(request, value, '%s bytes read' % value, 'bytes_read')
+        return self.get_delta_result(request, "bytes_read", '%s bytes read', 'bytes_read')
 
     @plugin.command("BYTES_WRITTEN")
     @statsd.counter
     def get_bytes_written(self, request):
-        value = self.get_delta_value("bytes_written", request)
-        return self.get_result(request, value, '%s bytes written' % value, 'bytes_written')
+        return self.get_delta_result(request, "bytes_written", '%s bytes written', 'bytes_written')
 
     @plugin.command("BYTES_ALLOCATED")
     @statsd.gauge
     def get_bytes_allocated(self, request):
-        value = self.get_status_value("bytes", request)
-        return self.get_result(request, value, '%s bytes allocated' % value, 'bytes')
+        return self.get_status_result(request, "bytes", '%s bytes allocated', 'bytes')
 
     @plugin.command("TOTAL_ITEMS")
     @statsd.gauge
     def get_total_items(self, request):
-        value = self.get_status_value("total_items", request)
-        return self.get_result(request, value, '%s total items' % value, 'total_items')
+        return self.get_status_result(request, "total_items", '%s total items', 'total_items')
 
     @plugin.command("CURRENT_CONNECTIONS")
     @statsd.gauge
     def get_current_connections(self, request):
-        value = self.get_status_value("curr_connections", request)
-        return self.get_result(request, value, '%s current connections' % value, "connections")
+        return self.get_status_result(request, "curr_connections", '%s current connections', "connections")
 
     @plugin.command("CACHE_EVICTIONS")
     @statsd.gauge
     def get_cache_evictions(self, request):
-        value = self.get_status_value("evictions", request)
-        return self.get_result(request, value, '%s cache evictions' % value, "evictions")
+        return self.get_status_result(request, "evictions", '%s cache evictions', "evictions")
 
     @plugin.command("CACHE_RECLAIMED")
     @statsd.gauge
     def get_cache_reclaimed(self, request):
-        value = self.get_status_value("reclaimed", request)
-        return self.get_result(request, value, '%s cache reclaimed' % value, "reclaimed")
+        return self.get_status_result(request, "reclaimed", '%s cache reclaimed', "reclaimed")
 
     @plugin.command("OPERATIONS_FLUSH_REQUESTS")
     @statsd.counter
     def get_cmd_flush(self, request):
-        value = self.get_delta_value("cmd_flush", request)
-        return self.get_result(request, value, '%s flush requests' % value, 'cmd_flush')
+        return self.get_delta_result(request, "cmd_flush", '%s flush requests', 'cmd_flush')
 
     @plugin.command("OPERATIONS_TOUCH_REQUESTS")
     @statsd.counter
     def get_cmd_touch(self, request):
-        value = self.get_delta_value("cmd_touch", request)
-        return self.get_result(request, value, '%s touch requests' % value, 'cmd_touch')
+        return self.get_delta_result(request, "cmd_touch", '%s touch requests', 'cmd_touch')
 
     @plugin.command("CURRENT_ITEMS")
     @statsd.counter
     def get_current_items(self, request):
-        value = self.get_status_value("curr_items", request)
-        return self.get_result(request, value, '%s current items' % value, 'curr_items')
+        return self.get_status_result(request, "curr_items", '%s current items', 'curr_items')
 
     @plugin.command("HIT_RATIO")
     @statsd.counter
@@ -145,8 +168,39 @@ class MemcachedChecker(nagios.BatchStatusPlugin):
     @plugin.command("THREADS")
     @statsd.counter
     def get_threads(self, request):
-        value = self.get_delta_value("threads", request)
-        return self.get_result(request, value, '%s threads' % value, 'threads')
+        return self.get_delta_result(request, "threads", '%s threads', 'threads')
+
+    @plugin.command("SERVERS_DOWN")
+    @statsd.gauge
+    def get_servers_down(self, request):
+        return self.get_status_result(request, "servers_down", '%s servers down', 'servers_down')
+
+    def check_slabs(self, request):
+        if not request.slabs:
+            raise nagios.StatusUnknownError(request, "%s needs --slabs" % request.option)
+
+    @plugin.command("SLABS_MALLOCED")
+    @statsd.gauge
+    def get_slabs_malloced(self, request):
+        self.check_slabs(request)
+        return self.get_status_result(request, "total_malloced", '%s bytes malloced for slabs', 'total_malloced')
+
+    @plugin.command("ITEMS_OUTOFMEMORY")
+    @statsd.counter
+    def get_items_outofmemory(self, request):
+        self.check_slabs(request)
+        # items:<slab class>:outofmemory@host:port, the deltas by server
+        # added up by slab class
+        attrs = sorted(k for k in self.get_status_values(request)
+                       if k.startswith("items:") and ":outofmemory@" in k)
+        slabs = {}
+        for attr, delta in zip(attrs, self.get_delta_values(attrs, request, initial=0)):
+            slab = "slab_%s" % attr.split(":")[1]
+            slabs[slab] = slabs.get(slab, 0) + delta
+        value = sum(slabs.values())
+        sub_perfs = sorted(slabs.iteritems())
+        return self.get_result(request, value, '%s items failed to store for out of memory' % value,
+                               'outofmemory', sub_perfs=sub_perfs)
 
 if __name__ == "__main__":
     import sys
@@ -11,28 +11,50 @@ Updated Sept 26, 2014 by Tony Ling
 import nagios
 from nagios import CommandBasedPlugin as plugin
 import commands
+import socket
 import statsd
-import argparse
+import mysqlwire
 
 
 class MySqlChecker(nagios.BatchStatusPlugin):
     def __init__(self, *args, **kwargs):
         super(MySqlChecker, self).__init__(*args, **kwargs)
-        # Hack to determine uniqueness of script defs
-        check = argparse.ArgumentParser()
-        check.add_argument("-H", "--host",     required=False, type=str)
-        check.add_argument("-p", "--port",     required=False, type=int)
-        chk, unknown = check.parse_known_args()
-
         self.parser.add_argument("-f", "--filename", required=False, type=str, default='pd@mysqladmin_extended-status')
         self.parser.add_argument("-u", "--user",     required=False, type=str, default='mysql')
         self.parser.add_argument("-s", "--password", required=False, type=str)
         self.parser.add_argument("-H", "--host",     required=False, type=str)
         self.parser.add_argument("-p", "--port",     required=False, type=int)
         self.parser.add_argument("-z", "--appname",  required=False, type=str, default='mysql')
-        self.parser.add_argument("--unique",   required=False, type=str, default=str(chk.host)+str(chk.port))
+        self.parser.add_argument("--socket",   required=False, type=str)
+        self.parser.add_argument("--collector", required=False, choices=["auto", "native", "mysqladmin"], default="auto",
+            help="native speaks the MySQL protocol in process, mysqladmin runs the client. "
+                 "auto tries native first and falls back to mysqladmin");
+        self.parser.add_argument("--timeout",  required=False, type=float, default=10,
+            help="secs to wait for the server with the native collector, default=10")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-p", "--port", type=int)
 
     def _get_batch_status(self, request):
+        if request.collector == "mysqladmin":
+            return self._get_mysqladmin_status(request)
+        try:
+            return mysqlwire.global_status(host=request.host, port=request.port, user=request.user,
+                                           password=request.password, unix_socket=request.socket,
+                                           timeout=request.timeout)
+        except mysqlwire.AuthenticationError, e:
+            if request.collector == "native":
+                raise nagios.AuthenticationFailedError(request, str(e))
+        except mysqlwire.MySQLError, e:
+            if request.collector == "native":
+                raise nagios.ServiceInaccessibleError(request, str(e))
+        except socket.error, e:
+            if request.collector == "native":
+                raise nagios.StatusUnknownError(request, "can't query mysql: %s" % (e or e.__class__.__name__))
+        return self._get_mysqladmin_status(request)
+
+    def _get_mysqladmin_status(self, request):
         cmd = "mysqladmin"
         if hasattr(request, "user") and request.user is not None:
             cmd += " --user=%s" % request.user
@@ -42,10 +64,19 @@ class MySqlChecker(nagios.BatchStatusPlugin):
             cmd += " --host=%s" % request.host
         if hasattr(request, "port") and request.port is not None:
             cmd += " --port=%s" % request.port
+        if hasattr(request, "socket") and request.socket is not None:
+            cmd += " --socket=%s" % request.socket
         cmd += " extended-status"
         return commands.getoutput(cmd)
 
     def _parse_output(self, request, output):
+        if isinstance(output, dict):
+            # SHOW GLOBAL STATUS from the native collector
+            for k, v in output.iteritems():
+                value = nagios.to_num(v or "")
+                if value is not None:
+                    yield k, value
+            return
         for l in output.split('\n')[3:-1]:
             fields = l.split('|')[1:3]
             k = fields[0].strip()
@@ -55,6 +86,8 @@ class MySqlChecker(nagios.BatchStatusPlugin):
                 yield k, value
 
     def _validate_output(self, request, output):
+        if isinstance(output, dict):
+            return True
         if "command not found" in output or \
             "Can't connect to MySQL server on" in output:
             raise nagios.ServiceInaccessibleError(request, output)
@@ -69,9 +102,7 @@ class MySqlChecker(nagios.BatchStatusPlugin):
     @plugin.command("QUERIES_PER_SECOND")
     @statsd.gauge
     def get_queries_per_second(self, request):
-        queries = self.get_delta_value("Queries", request)
-        sec = self.get_delta_value("Uptime", request)
-        value = float(queries) / sec
+        value = self.get_rate_value("Queries", request)
         return self.get_result(request, value, '%s queries per second' % value, 'total')
 
     @plugin.command("SLOW_QUERIES")
@@ -86,12 +117,10 @@ class MySqlChecker(nagios.BatchStatusPlugin):
         # read data from command line, calculate and verdict
         attrs = ["Innodb_rows_deleted","Innodb_rows_inserted",
                  "Innodb_rows_updated","Innodb_rows_read"]
-        values = []
+        values = self.get_delta_values(attrs, request)
         total = 0
         status_code = nagios.Status.OK
-        for attr in attrs:
-            v = self.get_delta_value(attr, request)
-            values.append(v)
+        for v in values:
             total += v
             status_code = self.superimpose(status_code, v, request.warn, request.crit)
 
@@ -109,12 +138,10 @@ class MySqlChecker(nagios.BatchStatusPlugin):
     def get_transactions(self, request):
         # read data from command line, calculate and verdict
         attrs = ["Handler_commit","Handler_rollback"]
-        values = []
+        values = self.get_delta_values(attrs, request)
         total = 0
         status_code = nagios.Status.OK
-        for attr in attrs:
-            v = self.get_delta_value(attr, request)
-            values.append(v)
+        for v in values:
             total += v
             status_code = self.superimpose(status_code, v, request.warn, request.crit)
 
@@ -143,12 +170,10 @@ class MySqlChecker(nagios.BatchStatusPlugin):
     def get_bytes_transfer(self, request):
         # read data from command line, calculate and verdict
         attrs = ["Bytes_received", "Bytes_sent"]
-        values = []
+        values = [float(v) / 1024 /1024 for v in self.get_delta_values(attrs, request)]
         total = 0
         status_code = nagios.Status.OK
-        for attr in attrs:
-            v = float(self.get_delta_value(attr, request)) / 1024 /1024
-            values.append(v)
+        for v in values:
             total += v
             status_code = self.superimpose(status_code, v, request.warn, request.crit)
 
@@ -165,12 +190,10 @@ class MySqlChecker(nagios.BatchStatusPlugin):
         # read data from command line, calculate and verdict
         attrs = ["Select_full_join",  "Select_full_range_join","Select_range",
                  "Select_range_check","Select_scan"]
-        values = []
+        values = self.get_delta_values(attrs, request)
         total = 0
         status_code = nagios.Status.OK
-        for attr in attrs:
-            v = self.get_delta_value(attr, request)
-            values.append(v)
+        for v in values:
             total += v
             status_code = self.superimpose(status_code, v, request.warn, request.crit)
 
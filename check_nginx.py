@@ -8,165 +8,130 @@ For use with AppFirst collector
 
 Example Usage:
   python /usr/share/appfirst/plugins/libexec/check_nginx.py -H localhost -P 80 -L status -t waiting -W 10 -C 20
+  python /usr/share/appfirst/plugins/libexec/check_nginx.py -t active_connections,handled_requests_rate
 
+The status page is fetched once for all the metrics checked together, and
+shared between checks for --cache-ttl secs.
 
 Created on: 11/14/14
 """
 
-import sys
-import argparse
-import urllib2
 import re
-
-status_code = 3
-
-def cmp_greater(msg, metric, value):
-	check_thresholds()
-	if (args.critical and float(value) >= args.critical):
-		print "CRITICAL - " + str(msg) + ": " + str(value) +  "|" +  str(metric)  + "=" + str(value)
-		status_code = 2
-	elif (args.warning and float(value) >= args.warning):
-		print "WARNING - " + str(msg) + ": " + str(value) +  "|" + str(metric)  + "=" + str(value)
-		status_code = 1
-	else:
-		print "OK - " + str(msg) + ": " + str(value) + "|" + str(metric)  + "=" + str(value)
-		status_code = 0
-	sys.exit(status_code)
-
-#Due to how the output of the status page is formated, different functions are used for different metrics
-def accepted_conn(nginx_stats):
-	cmd = 'accepts'
-	output = "Accepted connections: "
-	server_metrics = False
-	metric_index = 0
-	for line in nginx_stats:
-		tokens = line.split(' ')	
-		if (server_metrics):
-			cmp_greater(output, "accepted_connections", tokens[metric_index])
-		else:
-			for i in range(len(tokens)):
-				if (tokens[i] == cmd):
-					server_metrics = True
-					metric_index = i
-
-def active_conn(nginx_status):
-	cmd = 'Active connections'
-	for line in nginx_stats:
-		tokens = line.split(': ')
-		for i in range(len(tokens)):
-			if (tokens[i] == cmd):
-				cmp_greater(tokens[i], "active_connections", tokens[i+1])
-
-def handled_conn(nginx_status):
-	cmd = 'handled'
-	output = "Handled connections: "
-	server_metrics = False
-	metric_index = 0
-	for line in nginx_stats:
-		tokens = line.split(' ')	
-		if (server_metrics):
-			cmp_greater(output, "handled_connections", tokens[metric_index])
-		else:
-			for i in range(len(tokens)):
-				if (tokens[i] == cmd):
-					server_metrics = True
-					metric_index = i
-
-def handled_req(nginx_status):
-	cmd = 'requests'
-	output = "Handled requests: "
-	server_metrics = False
-	metric_index = 0
-	for line in nginx_stats:
-		tokens = line.split(' ')	
-		if (server_metrics):
-			cmp_greater(output, "handled_requests", tokens[metric_index])
-		else:
-			for i in range(len(tokens)):
-				if (tokens[i] == cmd):
-					server_metrics = True
-					metric_index = i
-
-def req_per_conn(nginx_status):
-	cmd = 'handled'
-	output = "Request per connection: "
-	server_metrics = False
-	m_i = 0
-	for line in nginx_stats:
-		tokens = line.split(' ')	
-		if (server_metrics):
-			req_per_conn = float(int(tokens[m_i+1]))/float(int(tokens[m_i]))
-			cmp_greater(output, "req_per_conn", req_per_conn)
-		else:
-			for i in range(len(tokens)):
-				if (tokens[i] == cmd):
-					server_metrics = True
-					m_i = i
-
-def reading(nginx_status):
-	cmd = 'Reading:'
-	for line in nginx_stats:
-		tokens = line.split(' ')
-		for i in range(len(tokens)):
-			if (tokens[i] == cmd):
-				cmp_greater(tokens[i], "reading", tokens[i+1])
-
-def waiting(nginx_status):
-	cmd = 'Waiting:'
-	for line in nginx_stats:
-		tokens = line.split(' ')
-		for i in range(len(tokens)):
-			if (tokens[i] == cmd):
-				cmp_greater(tokens[i], "waiting", tokens[i+1])
-
-def writing(nginx_status):
-	cmd = 'Writing:'
-	for line in nginx_stats:
-		tokens = line.split(' ')
-		for i in range(len(tokens)):
-			if (tokens[i] == cmd):
-				cmp_greater(tokens[i], "writing", tokens[i+1])
-
-# Metrics dict storing functions as values
-metrics = {'accepted_connections' : accepted_conn,
-           'active_connections' : active_conn,
-           'handled_connections' : handled_conn,
-           'handled_requests' : handled_req,
-           'requests_per_connection' : req_per_conn,
-           'reading' : reading,
-           'waiting' : waiting,
-           'writing' : writing
-           }
-
-parser = argparse.ArgumentParser()
-parser.add_argument('-H', '--host', help='Host location, default=localhost', default='localhost')
-parser.add_argument('-P', '--port', help='Port number, default=80', default='80')
-parser.add_argument('-L', '--location', help='location of status page, default=status', default='status')
-parser.add_argument('-W', '--warning', help='Warning threshold', default=None, type=int)
-parser.add_argument('-C', '--critical', help='Critical theshold', default=None, type=int)
-parser.add_argument('-t', '--metric', help='Metric to choose', default=None, required=True)
-args = parser.parse_args()
-
-if (args.critical and args.critical < 0):
-	print "Error: -C Critical cannot be negative"
-	sys.exit(status_code)
-elif (args.warning and args.warning < 0):
-	print "Error: -W Warning cannot be negative"
-	sys.exit(status_code)
-
-try:
-	url = "http://{host}:{port}/{location}".format(host=args.host,port=args.port, location=args.location)
-	nginx_stats = urllib2.urlopen(url).read().split('\n')
-	metrics[args.metric](nginx_stats)
-except KeyError:
-	str_metrics =  "Supported Metrics: ["
-	for metric in metrics:
-		str_metrics += ("'" + metric + "',")
-	print str_metrics[:-1] + "]"
-	print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-	sys.exit(status_code)
-except urllib2.URLError:
-	print "Error: Connection Refused - Check host and port arguments"
-	sys.exit(status_code)
-
-sys.exit(status_code)
+import nagios
+import httpclient
+from nagios import CommandBasedPlugin as plugin
+
+STUB_STATUS = re.compile(r"Active connections:\s*(?P<active_connections>\d+)\s+"
+                         r"server accepts handled requests\s+"
+                         r"(?P<accepts>\d+)\s+(?P<handled>\d+)\s+(?P<requests>\d+)\s+"
+                         r"Reading:\s*(?P<reading>\d+)\s+Writing:\s*(?P<writing>\d+)\s+Waiting:\s*(?P<waiting>\d+)")
+
+
+def parse_stub_status(text):
+    '''the stub_status page as { field: int }, None if it isn't one'''
+    match = STUB_STATUS.search(text)
+    if match is None:
+        return None
+    return dict((k, int(v)) for k, v in match.groupdict().iteritems())
+
+
+class NginxChecker(nagios.BatchStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(NginxChecker, self).__init__(*args, **kwargs)
+        self.parser.add_argument("-H", "--host",     required=False, type=str, default="localhost")
+        self.parser.add_argument("-P", "--port",     required=False, type=str, default="80")
+        self.parser.add_argument("-L", "--location", required=False, type=str, default="status",
+            help="location of status page, default=status")
+        self.parser.add_argument("-W", "--warning",  required=False, type=float, dest="warn")
+        self.parser.add_argument("-C", "--critical", required=False, type=float, dest="crit")
+        self.parser.add_argument("--timeout",  required=False, type=float, default=10)
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default="pd@nginx_status")
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default="nginx")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-P", "--port", type=str)
+        self.add_unique_argument("-L", "--location", type=str)
+        # the metrics are checked one at a time by most configurations,
+        # they share one fetch of the status page within a cycle
+        self.parser.set_defaults(cache_ttl=10)
+
+    def get_url(self, request):
+        return "http://%s:%s/%s" % (request.host, request.port, request.location.lstrip("/"))
+
+    def _get_batch_status(self, request):
+        try:
+            return httpclient.get(self.get_url(request), timeout=request.timeout)
+        except httpclient.HTTPError, e:
+            raise nagios.http_error(request, e)
+
+    def _validate_output(self, request, output):
+        if "Active connections" not in output:
+            raise nagios.OutputFormatError(request, output)
+        return True
+
+    def _parse_output(self, request, output):
+        stats = parse_stub_status(output)
+        if stats is None:
+            raise nagios.OutputFormatError(request, output)
+        return stats
+
+    @plugin.command("active_connections")
+    def get_active_connections(self, request):
+        value = self.get_status_value("active_connections", request)
+        return self.get_result(request, value, "%s active connections" % value, "active_connections")
+
+    @plugin.command("accepted_connections")
+    def get_accepted_connections(self, request):
+        value = self.get_status_value("accepts", request)
+        return self.get_result(request, value, "%s accepted connections" % value, "accepted_connections")
+
+    @plugin.command("handled_connections")
+    def get_handled_connections(self, request):
+        value = self.get_status_value("handled", request)
+        return self.get_result(request, value, "%s handled connections" % value, "handled_connections")
+
+    @plugin.command("handled_requests")
+    def get_handled_requests(self, request):
+        value = self.get_status_value("requests", request)
+        return self.get_result(request, value, "%s handled requests" % value, "handled_requests")
+
+    @plugin.command("requests_per_connection")
+    def get_requests_per_connection(self, request):
+        handled = self.get_status_value("handled", request)
+        value = self.get_status_value("requests", request) / float(handled) if handled else 0.0
+        return self.get_result(request, value, "%.2f requests per connection" % value, "req_per_conn")
+
+    @plugin.command("accepted_connections_rate")
+    def get_accepted_connections_rate(self, request):
+        value = self.get_rate_value("accepts", request)
+        return self.get_result(request, value, "%.2f accepted connections per second" % value, "accepts_per_sec")
+
+    @plugin.command("handled_connections_rate")
+    def get_handled_connections_rate(self, request):
+        value = self.get_rate_value("handled", request)
+        return self.get_result(request, value, "%.2f handled connections per second" % value, "handled_per_sec")
+
+    @plugin.command("handled_requests_rate")
+    def get_handled_requests_rate(self, request):
+        value = self.get_rate_value("requests", request)
+        return self.get_result(request, value, "%.2f requests per second" % value, "requests_per_sec")
+
+    @plugin.command("reading")
+    def get_reading(self, request):
+        value = self.get_status_value("reading", request)
+        return self.get_result(request, value, "%s connections reading" % value, "reading")
+
+    @plugin.command("writing")
+    def get_writing(self, request):
+        value = self.get_status_value("writing", request)
+        return self.get_result(request, value, "%s connections writing" % value, "writing")
+
+    @plugin.command("waiting")
+    def get_waiting(self, request):
+        value = self.get_status_value("waiting", request)
+        return self.get_result(request, value, "%s connections waiting" % value, "waiting")
+
+if __name__ == "__main__":
+    import sys
+    NginxChecker().run(sys.argv[1:])
@@ -5,244 +5,164 @@ Author: Tony Ling
 Uses OpenTSDB HTTP API for server metrics and parses the output
 Metrics supported: open_connections, http, telnet,total_connections, get, put,
     delete, scan, increment, flushes, compactions, timeouts, resets
+    and their per second rates but for open_connections, as <metric>_rate
+Any other stat is checked with a selector, the stat name and the tags to
+match, the values of all the stats matching are added up:
+    -t tsd.rpc.exceptions:type=put, -t tsd.jvm.ramused, rate:tsd.http.query.invalid_requests
 Warnings trigger if metric values are greater than or equal to threshold.
 
 Example Usage:
   python check_opentsdb.py -t open_connections -H localhost -P 10101
+  python check_opentsdb.py -t get_rate,put_rate,tsd.rpc.errors:type=invalid_values -W 100
+
+/api/stats is fetched once for all the metrics checked together, and
+shared between checks for --cache-ttl secs.
 
 Created on: 11/07/14
 """
 
-import sys
-import urllib2
-import json
-import argparse
-
-parser = argparse.ArgumentParser()
-parser.add_argument('-H', '--host', help='Host location, default=localhost', default='localhost')
-parser.add_argument('-P', '--port', help='Port number, default=10101', default='10101')
-parser.add_argument('-W', '--warning', help='Warning threshold', default=None, type=float)
-parser.add_argument('-C', '--critical', help='Critical theshold', default=None, type=float)
-parser.add_argument('-t', '--metric', help='Metric to choose', default=None, required=True)
-args = parser.parse_args()
-
-def check_thresholds():
-	if (args.critical and args.critical < 0):
-		print "Error: -C Critical cannot be negative"
-		sys.exit(status_code)
-	elif (args.warning and args.warning < 0):
-		print "Error: -W Warning cannot be negative"
-		sys.exit(status_code)
-
-def cmp_greater(msg, value):
-	check_thresholds()
-	if (args.critical and int(value) >= args.critical):
-		print "CRITICAL - " + msg + ": " + str(value) +  "|" +  args.metric  + "=" + str(value)
-		status_code = 2
-	elif (args.warning and int(value) >= args.warning):
-		print "WARNING - " + msg + ": " + str(value) +  "|" + args.metric  + "=" + str(value)
-		status_code = 1
-	else:
-		print "OK - " + msg + ": " + str(value) + "|" + args.metric  + "=" + str(value)
-		status_code = 0
-	sys.exit(status_code)
-
-
-def get_total_connections():
-	msg = "Number of total connections"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.connectionmgr.connections':
-				if metric['tags']['type'] == 'total':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain total connections"
-	cmp_greater(msg, value)
-
-def get_current_connections(metrics):
-	msg = "Number of open connections"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.connectionmgr.connections':
-				if metric['tags']['type'] == 'open':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain open connections"
-	cmp_greater(msg, value)
-
-def get_connections_timeout(metrics):
-	msg = "Number of connections timeouts"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.connectionmgr.exceptions':
-				if metric['tags']['type'] == 'timeout':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain connections timeouts"
-	cmp_greater(msg, value)
-
-def get_connections_reset(metrics):
-	msg = "Number of connections resets"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.connectionmgr.exceptions':
-				if metric['tags']['type'] == 'reset':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain connections resets"
-	cmp_greater(msg, value)
-
-def get_rpc_telnet(metrics):
-	msg = "Number of telnet rpcs recieved"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.rpc.received':
-				if metric['tags']['type'] == 'telnet':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain telnet rpcs recieved"
-	cmp_greater(msg, value)
-
-def get_rpc_http(metrics):
-	msg = "Number of http rpcs recieved"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.rpc.received':
-				if metric['tags']['type'] == 'http':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain http rpcs recieved"
-	cmp_greater(msg, value)
-
-def get_rpc_hbase_get(metrics):
-	msg = "Number of hbase get rpcs"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.hbase.rpcs':
-				if metric['tags']['type'] == 'get':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain hbase get rpcs"
-	cmp_greater(msg, value)
-
-def get_rpc_hbase_put(metrics):
-	msg = "Number of hbase put rpcs"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.hbase.rpcs':
-				if metric['tags']['type'] == 'put':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain hbase put rpcs"
-	cmp_greater(msg, value)
-
-def get_rpc_hbase_delete(metrics):
-	msg = "Number of hbase delete rpcs"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.hbase.rpcs':
-				if metric['tags']['type'] == 'delete':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain hbase delete rpcs"
-	cmp_greater(msg, value)
-
-def get_rpc_hbase_scan(metrics):
-	msg = "Number of hbase scan rpcs"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.hbase.rpcs':
-				if metric['tags']['type'] == 'scan':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain hbase scan rpcs"
-	cmp_greater(msg, value)
-
-def get_rpc_hbase_increment(metrics):
-	msg = "Number of hbase increment rpcs"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.hbase.rpcs':
-				if metric['tags']['type'] == 'increment':
-					value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain hbase increment rpcs"
-	cmp_greater(msg, value)
-
-def get_rpc_hbase_flushes(metrics):
-	msg = "Number of hbase flushes"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.hbase.flushes':
-				value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain hbase flush"
-	cmp_greater(msg, value)
-
-def get_compactions(metrics):
-	msg = "Number of tsd compactions"
-	value = 0
-	for metric in metrics:
-		try:
-			if metric['metric'] == 'tsd.compaction.count':
-				value += int(metric['value'])
-		except:
-			print "ERROR - Cannot obtain tsd compaction"
-	cmp_greater(msg, value)
-
-def get_opentsdb_metrics():
-	try:
-		output = urllib2.urlopen("http://{host}:{port}/api/stats".format(host=args.host, port=args.port))
-		opentsdb_metrics = json.loads(output.read())
-	except KeyError:
-		print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-		str_metrics =  "Supported Metrics: ["
-		for metric in metrics:
-			str_metrics += ("'" + metric + "',")
-		print str_metrics[:-1] + "]"
-		sys.exit(status_code)
-	except urllib2.URLError:
-		print "Error: Connection Refused - Check host and port arguments"
-		sys.exit(status_code)
-	return opentsdb_metrics
+import re
+import itertools
+import nagios
 
 # metrics dict keys are script metric -t arguments
-# key values are functions called when the keys are matched
-metrics = { "open_connections": get_current_connections,
-            "http": get_rpc_http,
-            "telnet": get_rpc_telnet,
-            "total_connections": get_total_connections,
-            "get": get_rpc_hbase_get,
-            "put": get_rpc_hbase_put,
-            "delete": get_rpc_hbase_delete,
-            "scan": get_rpc_hbase_scan,
-            "increment": get_rpc_hbase_increment,
-            "flushes": get_rpc_hbase_flushes,
-            "compactions": get_compactions,
-            "timeouts": get_connections_timeout,
-            "resets": get_connections_reset
-            }
-
-# Program entry starts here
-status_code = 3
-try:
-	metrics[args.metric](get_opentsdb_metrics())
-except KeyError:
-	print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-	str_metrics =  "Supported Metrics: ["
-	for metric in metrics:
-		str_metrics += ("'" + metric + "',")
-	print str_metrics[:-1] + "]"
-	sys.exit(status_code)
+# key values are the stat, its tags and the output string
+metrics = {}
+metrics['open_connections'] = ('tsd.connectionmgr.connections', {'type': 'open'}, 'Number of open connections')
+metrics['total_connections'] = ('tsd.connectionmgr.connections', {'type': 'total'}, 'Number of total connections')
+metrics['timeouts'] = ('tsd.connectionmgr.exceptions', {'type': 'timeout'}, 'Number of connections timeouts')
+metrics['resets'] = ('tsd.connectionmgr.exceptions', {'type': 'reset'}, 'Number of connections resets')
+metrics['telnet'] = ('tsd.rpc.received', {'type': 'telnet'}, 'Number of telnet rpcs recieved')
+metrics['http'] = ('tsd.rpc.received', {'type': 'http'}, 'Number of http rpcs recieved')
+metrics['get'] = ('tsd.hbase.rpcs', {'type': 'get'}, 'Number of hbase get rpcs')
+metrics['put'] = ('tsd.hbase.rpcs', {'type': 'put'}, 'Number of hbase put rpcs')
+metrics['delete'] = ('tsd.hbase.rpcs', {'type': 'delete'}, 'Number of hbase delete rpcs')
+metrics['scan'] = ('tsd.hbase.rpcs', {'type': 'scan'}, 'Number of hbase scan rpcs')
+metrics['increment'] = ('tsd.hbase.rpcs', {'type': 'increment'}, 'Number of hbase increment rpcs')
+metrics['flushes'] = ('tsd.hbase.flushes', {}, 'Number of hbase flushes')
+metrics['compactions'] = ('tsd.compaction.count', {}, 'Number of tsd compactions')
+
+# the metrics that aren't counters, without a rate
+gauges = ['open_connections']
+
+RATE_PREFIX = "rate:"
+
+
+def stat_key(metric, tags):
+    return (metric, frozenset(tags.iteritems()))
+
+
+def index_stats(stats):
+    '''/api/stats as { (metric, frozenset(tags)): value }. a value is added
+       up under every subset of its tags, so that the stats matching some
+       tags, i.e. of all hosts, are read at once'''
+    index = {}
+    for stat in stats:
+        value = nagios.to_num(str(stat['value']))
+        if value is None:
+            continue
+        tags = stat.get('tags') or {}
+        items = tags.items()
+        for n in xrange(len(items) + 1):
+            for subset in itertools.combinations(items, n):
+                key = (stat['metric'], frozenset(subset))
+                index[key] = index.get(key, 0) + value
+    return index
+
+
+def parse_selector(option):
+    '''metric:tag=value:... as (metric, { tag: value }, rate), None if the
+       option isn't a selector'''
+    rate = option.startswith(RATE_PREFIX)
+    if rate:
+        option = option[len(RATE_PREFIX):]
+    parts = option.split(":")
+    if not parts[0] or len(parts) == 1 and "." not in parts[0]:
+        return None
+    tags = {}
+    for part in parts[1:]:
+        tag, sep, value = part.partition("=")
+        if not sep or not tag or not value:
+            return None
+        tags[tag] = value
+    return parts[0], tags, rate
+
+
+class OpenTSDBChecker(nagios.JsonStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(OpenTSDBChecker, self).__init__(*args, **kwargs)
+        self.parser.add_argument("-H", "--host",     required=False, type=str, default="localhost",
+            help="Host location, default=localhost")
+        self.parser.add_argument("-P", "--port",     required=False, type=str, default="10101",
+            help="Port number, default=10101")
+        self.parser.add_argument("-W", "--warning",  required=False, type=float, dest="warn")
+        self.parser.add_argument("-C", "--critical", required=False, type=float, dest="crit")
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default="pd@opentsdb")
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default="opentsdb")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-P", "--port", type=str)
+        for name in metrics:
+            self.commands[name] = OpenTSDBChecker.check_metric.im_func
+            if name not in gauges:
+                self.commands[name + "_rate"] = OpenTSDBChecker.check_metric.im_func
+
+    # the selectors aren't listed, any of them is checked by check_selector
+    def lookup_command(self, option):
+        command = super(OpenTSDBChecker, self).lookup_command(option)
+        if command is None and parse_selector(option) is not None:
+            return OpenTSDBChecker.check_selector.im_func
+        return command
+
+    def parse_args(self, args):
+        request = super(OpenTSDBChecker, self).parse_args(args)
+        for name in ("warn", "crit"):
+            if getattr(request, name) is not None and getattr(request, name) < 0:
+                self.parser.error("-%s %s cannot be negative" % (name[0].upper(), name))
+        return request
+
+    def get_endpoints(self, request):
+        return {"stats": "http://%s:%s/api/stats" % (request.host, request.port)}
+
+    def _parse_output(self, request, documents):
+        stats = documents["stats"]
+        if not isinstance(stats, list):
+            raise nagios.OutputFormatError(request, "/api/stats: %r" % (stats,))
+        try:
+            index = index_stats(stats)
+        except (KeyError, TypeError, AttributeError), e:
+            raise nagios.OutputFormatError(request, "/api/stats: bad stat %s" % e)
+        # the named metrics count 0 when no stat matches, i.e. no compaction yet
+        for metric, tags, msg in metrics.itervalues():
+            index.setdefault(stat_key(metric, tags), 0)
+        return index
+
+    def get_stat_result(self, request, key, rate, msg):
+        if key not in self.get_status_values(request):
+            raise nagios.StatusUnknownError(request, "no stat %s in /api/stats" % request.option)
+        if rate:
+            value = self.get_rate_value(key, request)
+            message = "%s per second: %.2f" % (msg, value)
+        else:
+            value = self.get_status_value(key, request)
+            message = "%s: %s" % (msg, value)
+        # the selectors hold ':' and '=', which don't go in a perfdata label
+        name = re.sub(r"[^\w.-]+", "_", request.option)
+        r = nagios.Result(name, self.verdict(value, request.warn, request.crit), message, request.appname)
+        r.add_performance_data(name, value, warn=request.warn, crit=request.crit)
+        return r
+
+    def check_metric(self, request):
+        rate = request.option not in metrics
+        metric, tags, msg = metrics[request.option[:-len("_rate")] if rate else request.option]
+        return self.get_stat_result(request, stat_key(metric, tags), rate, msg)
+
+    def check_selector(self, request):
+        metric, tags, rate = parse_selector(request.option)
+        msg = " ".join([metric] + ["%s=%s" % item for item in sorted(tags.iteritems())])
+        return self.get_stat_result(request, stat_key(metric, tags), rate, msg)
+
+if __name__ == "__main__":
+    import sys
+    OpenTSDBChecker().run(sys.argv[1:])
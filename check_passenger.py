@@ -5,24 +5,51 @@ Created on Jun 7, 2012
 @author: Yangming
 @copyright: appfirst inc.
 '''
+import re
 import commands
 import statsd
 import nagios
+from StringIO import StringIO
+from xml.etree import cElementTree as ElementTree
 from nagios import CommandBasedPlugin as plugin
 
+# process readings kept per process as well, i.e. process_rss@group/pid
+PROCESS_ATTRS = ("sessions", "processed", "rss", "cpu")
+
 class PassengerChecker(nagios.BatchStatusPlugin):
     def __init__(self, *args, **kwargs):
         super(PassengerChecker, self).__init__(*args, **kwargs)
         self.parser.add_argument("-f", "--filename", required=False, type=str, default="pd@passenger-status")
-        self.parser.add_argument("-p", "--pid",      required=False, type=str)
+        self.parser.add_argument("-p", "--pid",      required=False, type=str,
+            help="pid of the passenger instance, when several of them are running")
         self.parser.add_argument("-z", "--appname",  required=False, type=str, default='passenger')
+        self.parser.add_argument("--passenger-status", required=False, type=str,
+            default="/usr/bin/passenger-status")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        self.add_unique_argument("-p", "--pid", type=str)
+        # passenger-status takes a second or more to start, all the options
+        # checked within a cycle share one snapshot of it
+        self.parser.set_defaults(cache_ttl=20)
 
     def _get_batch_status(self, request):
-        # TODO: make path optional
-        cmd = nagios.rootify("/usr/bin/passenger-status")
-        return commands.getoutput(cmd)
+        cmd = request.passenger_status
+        if request.pid:
+            cmd += " %s" % request.pid
+        output = commands.getoutput(nagios.rootify(cmd + " --show=xml"))
+        if "<info" not in output and "ERROR" not in output:
+            # too old to tell the status in xml
+            output = commands.getoutput(nagios.rootify(cmd))
+        return output
 
     def _parse_output(self, request, output):
+        if "<info" in output:
+            stats = self._parse_xml(request, output)
+        else:
+            stats = dict(self._parse_text(request, output))
+        self._fill_totals(stats)
+        return stats
+
+    def _parse_text(self, request, output):
         for l in output.split('\n'):
             pair = l.split('=')
             if len(pair) == 2:
@@ -33,8 +60,72 @@ class PassengerChecker(nagios.BatchStatusPlugin):
                     raise nagios.OutputFormatError(request, output)
                 yield k, value
 
+    # the xml is read element by element and each process dropped once
+    # counted, a server with many applications gives a long output
+    def _parse_xml(self, request, output):
+        output = output[output.index("<?xml" if "<?xml" in output else "<info"):]
+        stats = {}
+        path = []
+        group = None
+        process = {}
+        try:
+            for event, elem in ElementTree.iterparse(StringIO(output), events=("start", "end")):
+                if event == "start":
+                    path.append(elem.tag)
+                    if elem.tag == "process":
+                        process = {}
+                    continue
+                path.pop()
+                parent = path[-1] if path else None
+                if parent == "info" and elem.text:
+                    value = nagios.to_num(elem.text.strip())
+                    if value is not None:
+                        stats[elem.tag] = value
+                elif parent == "group" and elem.tag == "name":
+                    # i.e. "/var/www/app (production)", fit for a perfdata label
+                    group = re.sub(r"\W+", "_", elem.text or "").strip("_") or "default"
+                elif parent == "group" and elem.tag in ("capacity_used", "get_wait_list_size") and elem.text:
+                    stats["%s@%s" % (elem.tag, group)] = nagios.to_num(elem.text.strip()) or 0
+                elif parent == "process" and elem.text:
+                    process[elem.tag] = elem.text.strip()
+                elif elem.tag == "process":
+                    self._count_process(stats, group, process)
+                    elem.clear()
+                elif elem.tag == "group":
+                    group = None
+                    elem.clear()
+        except SyntaxError, e:
+            raise nagios.OutputFormatError(request, "%s: %s" % (e, output))
+        return stats
+
+    def _count_process(self, stats, group, process):
+        group = group or "default"
+        readings = dict((k, nagios.to_num(process.get(k, "")) or 0) for k in PROCESS_ATTRS)
+        active = int(readings["sessions"] > 0)
+        # rss is in KB
+        for k, v in (("count", 1), ("active", active), ("rss", readings["rss"])):
+            stats[k + "@" + group] = stats.get(k + "@" + group, 0) + v
+        stats["rss"] = stats.get("rss", 0) + readings["rss"]
+        stats["@active"] = stats.get("@active", 0) + active
+        name = "%s/%s" % (group, process.get("pid"))
+        for k, v in readings.iteritems():
+            stats["process_%s@%s" % (k, name)] = v
+
+    # the totals passenger 3 and later tell under other names, or not at all
+    def _fill_totals(self, stats):
+        if "count" not in stats and "process_count" in stats:
+            stats["count"] = stats["process_count"]
+        if "get_wait_list_size" not in stats and "global_queue_size" in stats:
+            stats["get_wait_list_size"] = stats["global_queue_size"]
+        counted = stats.pop("@active", 0)
+        if "count" in stats:
+            stats.setdefault("active", counted)
+            stats.setdefault("capacity_used", stats["count"])
+            stats.setdefault("rss", 0)
+            stats["inactive"] = stats["count"] - stats["active"]
+
     def _validate_output(self, request, output):
-        if "command not found" in output:
+        if "command not found" in output or ("not found" in output and "<info" not in output):
             raise nagios.ServiceInaccessibleError(request, output)
         elif "ERROR: Phusion Passenger doesn't seem to be running." in output:
             raise nagios.ServiceInaccessibleError(request, output)
@@ -44,11 +135,17 @@ class PassengerChecker(nagios.BatchStatusPlugin):
             raise nagios.StatusUnknownError(request, output)
         return True
 
+    # the total followed by every application group
+    def get_group_result(self, request, attr, message, pfhead):
+        value = self.get_status_value(attr, request)
+        sub_perfs = [(group, self.get_status_value(k, request))
+                     for group, k in self.get_sub_attrs(attr, request)]
+        return self.get_result(request, value, message % value, pfhead, sub_perfs=sub_perfs)
+
     @plugin.command("RUNNING_PROCESSES")
     @statsd.gauge
     def get_procs(self, request):
-        value = self.get_status_value("count", request)
-        return self.get_result(request, value, '%s running processes' % value, 'procs')
+        return self.get_group_result(request, "count", '%s running processes', 'procs')
 
     @plugin.command("MAX_PROCESSES")
     @statsd.gauge
@@ -59,8 +156,32 @@ class PassengerChecker(nagios.BatchStatusPlugin):
     @plugin.command("ACTIVE_PROCESSES")
     @statsd.gauge
     def get_active_procs(self, request):
-        value = self.get_status_value("active", request)
-        return self.get_result(request, value, '%s active processes' % value, 'active')
+        return self.get_group_result(request, "active", '%s active processes', 'active')
+
+    @plugin.command("INACTIVE_PROCESSES")
+    @statsd.gauge
+    def get_inactive_procs(self, request):
+        value = self.get_status_value("inactive", request)
+        return self.get_result(request, value, '%s inactive processes' % value, 'inactive')
+
+    @plugin.command("CAPACITY_USED")
+    @statsd.gauge
+    def get_capacity_used(self, request):
+        return self.get_group_result(request, "capacity_used", '%s capacity used', 'capacity')
+
+    @plugin.command("WAIT_LIST_SIZE")
+    @statsd.gauge
+    def get_wait_list_size(self, request):
+        return self.get_group_result(request, "get_wait_list_size", '%s requests waiting', 'waiting')
+
+    @plugin.command("MEMORY_USED")
+    @statsd.gauge
+    def get_memory_used(self, request):
+        value = self.get_status_value("rss", request) / 1024.0
+        sub_perfs = [(process, self.get_status_value(k, request) / 1024.0)
+                     for process, k in self.get_sub_attrs("process_rss", request)]
+        return self.get_result(request, value, '%.2fMB memory used' % value, 'memory',
+                               UOM="MB", sub_perfs=sub_perfs)
 
 if __name__ == "__main__":
     import sys
@@ -10,6 +10,19 @@ import nagios
 from nagios import CommandBasedPlugin as plugin
 
 class PostgresChecker(nagios.BatchStatusPlugin):
+    # pg_stat_activity counts, pg_stat_activity has changed in 9.2
+    ACTIVITY_SQL = [
+        "SELECT 'activity', 'active', count(*) FROM pg_stat_activity "
+            "WHERE waiting='f' AND current_query<>'<IDLE>'",
+        "SELECT 'activity', 'waiting', count(*) FROM pg_stat_activity WHERE waiting='t'",
+        "SELECT 'activity', 'idle', count(*) FROM pg_stat_activity WHERE current_query='<IDLE>'",
+        "SELECT 'activity', 'total', count(datid) FROM pg_stat_activity",
+    ]
+
+    # the pg_stat_database counters kept per database
+    DATABASE_COLUMNS = ["tup_fetched", "tup_inserted", "tup_updated", "tup_deleted",
+                        "xact_commit", "xact_rollback", "blks_read", "blks_hit"]
+
     def __init__(self, *args, **kwargs):
         super(PostgresChecker, self).__init__(*args, **kwargs)
         self.parser.add_argument("-f", "--filename", required=False, type=str, default='pd@stats_psql')
@@ -18,167 +31,139 @@ class PostgresChecker(nagios.BatchStatusPlugin):
         self.parser.add_argument("-z", "--appname",  required=False, type=str, default='postgres')
         self.parser.add_argument("--unique",   required=False, type=str, default='localhost')
 
+    def parse_args(self, args):
+        request = super(PostgresChecker, self).parse_args(args)
+        # pg_database_size stats every file of the databases, it's only
+        # queried when DATABASE_SIZE is checked
+        request.sizes = "DATABASE_SIZE" in self.split_options(request.option)
+        return request
+
+    # the snapshots with the database sizes are kept apart
+    def get_snapshot_key(self, request):
+        key = super(PostgresChecker, self).get_snapshot_key(request)
+        return "%s@size" % key if request.sizes else key
+
+    # everything the options need in one query, as rows of kind|name|value
+    def snapshot_sql(self, request):
+        stmts = ["SELECT '%s', datname, %s FROM pg_stat_database WHERE datname IS NOT NULL" % (c, c)
+                 for c in self.DATABASE_COLUMNS]
+        if request.sizes:
+            stmts.append("SELECT 'size', datname, pg_database_size(datname) FROM pg_database")
+        stmts.append("SELECT 'lock', mode, count(*) FROM pg_locks GROUP BY mode")
+        stmts.append("SELECT 'setting', name, setting::bigint FROM pg_settings WHERE name='max_connections'")
+        stmts.extend(self.ACTIVITY_SQL)
+        return " UNION ALL ".join(stmts) + ";"
+
+    def _get_batch_status(self, request):
+        return self._get_query_status(self.snapshot_sql(request), request)
+
+    # stats are keyed by kind@name, i.e. tup_fetched@postgres or activity@idle
+    def _parse_output(self, request, output):
+        for row in output.split("\n"):
+            try:
+                kind, row = row.split("|", 1)
+                name, value = row.rsplit("|", 1)
+            except ValueError:
+                raise nagios.OutputFormatError(request, output)
+            value = nagios.to_num(value)
+            if value is not None:
+                yield "%s@%s" % (kind, name), value
+
+    def get_sub_stats(self, kind, request):
+        stats = self.get_status_values(request)
+        return dict((name, stats[attr]) for name, attr in self.get_sub_attrs(kind, request))
+
+    # changes of a pg_stat_database counter, in total and by database
+    def get_sub_deltas(self, kind, request):
+        names, attrs = zip(*self.get_sub_attrs(kind, request)) or ((), ())
+        deltas = self.get_delta_values(attrs, request)
+        return sum(deltas), dict(zip(names, deltas))
+
     @plugin.command("CONNECTIONS_ACTIVE")
     @statsd.gauge
     def get_connections_active(self, request):
-        sql_stmt = "SELECT count(*) FROM pg_stat_activity " \
-                   "WHERE waiting=\'f\' AND current_query<>\'<IDLE>\'"
-        value = self._single_value_stat(request, sql_stmt)
+        value = self.get_status_value("activity@active", request)
         return self.get_result(request, value, '%s active conns' % value, 'active')
 
     @plugin.command("CONNECTIONS_WAITING")
     @statsd.gauge
     def get_connections_waiting(self, request):
-        sql_stmt = "SELECT count(*) FROM pg_stat_activity WHERE waiting=\'t\';"
-        value = self._single_value_stat(request, sql_stmt)
+        value = self.get_status_value("activity@waiting", request)
         return self.get_result(request, value, '%s waiting conns' % value, 'waiting')
 
     @plugin.command("CONNECTIONS_IDLE")
     @statsd.gauge
     def get_connections_idle(self, request):
-        sql_stmt = "SELECT count(*) FROM pg_stat_activity WHERE current_query=\'<IDLE>\';"
-        value = self._single_value_stat(request, sql_stmt)
+        value = self.get_status_value("activity@idle", request)
         return self.get_result(request, value, '%s idle conns' % value, 'idle')
 
-    def _single_value_stat(self, request, query):
-        rows = self.run_query(request, query)
-        if len(rows) > 0 or len(rows[0]) > 0:
-            value = nagios.to_num(rows[0][0])
-            if value is None:
-                raise nagios.OutputFormatError(request, rows)
-            return value
-        else:
-            raise nagios.StatusUnknownError(request.option)
-
     @plugin.command("DATABASE_SIZE")
     @statsd.gauge
     def get_database_size(self, request):
-        sql_stmt = "SELECT datname, pg_database_size(datname) FROM pg_database;"
-        stat, sub_stats = self._multi_value_stats(request, sql_stmt)
+        sub_stats = self.get_sub_stats("size", request)
         # to MB
-        value = nagios.BtoMB(stat)
+        value = nagios.BtoMB(sum(sub_stats.itervalues()))
         for k, v in sub_stats.iteritems():
             sub_stats[k] = nagios.BtoMB(v)
         return self.get_result(request, value,
                     'total dbsize: %sMB' % value, 'total', UOM='MB', sub_perfs=sub_stats.iteritems())
 
+    # locks of the modes containing statkey, i.e. RowShareLock for row
+    def get_locks(self, statkey, request):
+        sub_stats = dict((mode, v) for mode, v in self.get_sub_stats("lock", request).iteritems()
+                         if statkey in mode.lower())
+        value = sum(sub_stats.itervalues())
+        return self.get_result(request, value,
+                    '%s locks %s' % (value, statkey), 'total', sub_perfs=sub_stats.iteritems())
+
     @plugin.command("LOCKS_ACCESS")
     @statsd.gauge
     def get_locks_access(self, request):
-        statkey = "access"
-        sql_stmt = "SELECT mode, count(*) " \
-                   "FROM pg_locks " \
-                   "GROUP BY mode " \
-                   "HAVING mode ILIKE \'%%%s%%\';" % statkey
-        value, sub_stats = self._multi_value_stats(request, sql_stmt)
-        return self.get_result(request, value,
-                    '%s locks access' % value, 'total', sub_perfs=sub_stats.iteritems())
+        return self.get_locks("access", request)
 
     @plugin.command("LOCKS_ROW")
     @statsd.gauge
     def get_locks_row(self, request):
-        statkey = "row"
-        sql_stmt = "SELECT mode, count(*) " \
-                   "FROM pg_locks " \
-                   "GROUP BY mode " \
-                   "HAVING mode ILIKE \'%%%s%%\';" % statkey
-        value, sub_stats = self._multi_value_stats(request, sql_stmt)
-        return self.get_result(request, value,
-                    '%s locks row' % value, 'total', sub_perfs=sub_stats.iteritems())
+        return self.get_locks("row", request)
 
     @plugin.command("LOCKS_SHARE")
     @statsd.gauge
     def get_locks_share(self, request):
-        statkey = "share"
-        sql_stmt = "SELECT mode, count(*) " \
-                   "FROM pg_locks " \
-                   "GROUP BY mode " \
-                   "HAVING mode ILIKE \'%%%s%%\';" % statkey
-        value, sub_stats = self._multi_value_stats(request, sql_stmt)
-        return self.get_result(request, value,
-                    '%s locks share' % value, 'total', sub_perfs=sub_stats.iteritems())
+        return self.get_locks("share", request)
 
     @plugin.command("LOCKS_EXCLUSIVE")
     @statsd.gauge
     def get_locks_exclusive(self, request):
-        statkey = "exclusive"
-        sql_stmt = "SELECT mode, count(*) " \
-                   "FROM pg_locks " \
-                   "GROUP BY mode " \
-                   "HAVING mode ILIKE \'%%%s%%\';" % statkey
-        value, sub_stats = self._multi_value_stats(request, sql_stmt)
-        return self.get_result(request, value,
-                    '%s locks exclusive' % value, 'total', sub_perfs=sub_stats.iteritems())
-
-    def _multi_value_stats(self, request, query):
-        sub_stats = {}
-        rows = self.run_query(request, query)
-        for substatname, value in rows:
-            value = nagios.to_num(value)
-            if value is None:
-                raise nagios.OutputFormatError(request, rows)
-            sub_stats[substatname] = value
-        stat = reduce(lambda x,y:x+y, sub_stats.itervalues(), 0)
-        return stat, sub_stats
+        return self.get_locks("exclusive", request)
 
     @plugin.command("TUPLES_READ")
     @statsd.counter
     def get_tuples_read(self, request):
-        statkey = "tup_fetched"
-        sql_stmt = "SELECT datname, %s FROM pg_stat_database;" % statkey
-        value, sub_stats = self.get_delta_value(statkey, request, sql_stmt)
+        value, sub_stats = self.get_sub_deltas("tup_fetched", request)
         return self.get_result(request, value,
                     '%s tuples fetched' % value, 'total', sub_perfs=sub_stats.iteritems())
 
     @plugin.command("TUPLES_INSERTED")
     @statsd.counter
     def get_tuples_inserted(self, request):
-        statkey = "tup_inserted"
-        sql_stmt = "SELECT datname, %s FROM pg_stat_database;" % statkey
-        value, sub_stats = self.get_delta_value(statkey, request, sql_stmt)
+        value, sub_stats = self.get_sub_deltas("tup_inserted", request)
         return self.get_result(request, value,
                     '%s tuples inserted' % value, 'total', sub_perfs=sub_stats.iteritems())
 
     @plugin.command("TUPLES_UPDATED")
     @statsd.counter
     def get_tuples_updated(self, request):
-        statkey = "tup_updated"
-        sql_stmt = "SELECT datname, %s FROM pg_stat_database;" % statkey
-        value, sub_stats = self.get_delta_value(statkey, request, sql_stmt)
+        value, sub_stats = self.get_sub_deltas("tup_updated", request)
         return self.get_result(request, value,
                     '%s tuples updated' % value, 'total', sub_perfs=sub_stats.iteritems())
 
     @plugin.command("TUPLES_DELETED")
     @statsd.counter
     def get_tuples_deleted(self, request):
-        statkey = "tup_deleted"
-        sql_stmt = "SELECT datname, %s FROM pg_stat_database;" % statkey
-        value, sub_stats = self.get_delta_value(statkey, request, sql_stmt)
+        value, sub_stats = self.get_sub_deltas("tup_deleted", request)
         return self.get_result(request, value,
                     '%s tuples deleted' % value, 'total', sub_perfs=sub_stats.iteritems())
 
-    def get_delta_value(self, statkey, request, sql_stmt):
-        value, sub_stats = self._multi_value_stats(request, sql_stmt)
-
-        laststats = self.retrieve_last_status(request)
-        last_sub_stats = laststats.setdefault(statkey, [])
-        laststats[statkey] = sub_stats
-        self.save_status(request, laststats)
-
-        if len(last_sub_stats):
-            last_value = reduce(lambda x,y:x+y, last_sub_stats.itervalues())
-            value -= last_value
-            for database in sub_stats:
-                sub_stats[database] -= last_sub_stats.setdefault(database, 0)
-        return value, sub_stats
-
-    def run_query(self, request, query):
-        output = self._get_query_status(query, request)
-        if self._validate_output(request, output):
-            return [tuple(row.split('|')) for row in output.split("\n")]
-        else:
-            return []
-
     def _get_query_status(self, query, request):
         cmd_template = "psql"
         if request.port is not None:
@@ -190,16 +175,16 @@ class PostgresChecker(nagios.BatchStatusPlugin):
         return commands.getoutput(cmd)
 
     def _validate_output(self, request, output):
-        if "command not found" in output or \
-            "psql: could not connect to server" in output:
+        if ("command not found" in output or
+            "psql: could not connect to server" in output):
             raise nagios.ServiceInaccessibleError(request, output)
-        elif ("psql: FATAL:  role" in output and "does not exist" in output) or\
-              "psql: fe_sendauth: no password supplied" in output:
+        elif (("psql: FATAL:  role" in output and "does not exist" in output) or
+              "psql: fe_sendauth: no password supplied" in output):
             raise nagios.AuthenticationFailedError(request, output)
-        elif "psql:" in output:
+        elif "does not exist" in output or "psql:" in output:
             raise nagios.OutputFormatError(request, output)
         elif output.strip() == "":
-            return False
+            raise nagios.StatusUnknownError(request, "psql returned no rows")
         return True
 
 if __name__ == "__main__":
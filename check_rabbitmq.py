@@ -2,15 +2,21 @@
 """
 Updated on November 14, 2014 by Tony Ling
 Uses rabbitmq's HTTP API to get overview metrics and parses the output.
+
+/api/overview is fetched once for all the overview metrics checked together,
+and shared between checks for --cache-ttl secs. list_queues reads the
+queues from /api/queues, a page at a time and only their name and number of
+messages, the queues matching -s or --queue-regex picked by the server.
+
+Example Usage:
+  python check_rabbitmq.py -t messages,consumers,queues -U guest -p guest
+  python check_rabbitmq.py -t list_queues -s orders,retry -w 1000 -c 5000
 """
+import re
+import urllib
 import argparse
-import shlex
-import subprocess
-import sys
-import json
-import urllib2
-
-QSTATUS_CMD = "/usr/sbin/rabbitmqctl list_queues -q"
+import nagios
+from nagios import CommandBasedPlugin as plugin
 
 # metrics dictionary keys are script metric arguments, -t
 # key is also metric name corresponding to HTTP API response metric
@@ -26,107 +32,123 @@ metrics['consumers'] = ['object_totals','Number of consumers']
 metrics['exchanges'] = ['object_totals','Number of exchanges']
 metrics['queues'] = ['object_totals','Number of queues']
 
-def get_metric_value(host, port, username, password, json_field, metric, msg, critical, warning):
-	status_code = 3
-	passman = urllib2.HTTPPasswordMgrWithDefaultRealm()
-	passman.add_password(None, "http://{host}:{port}/api/overview".format(host=host, port=port), username, password)
-	urllib2.install_opener(urllib2.build_opener(urllib2.HTTPBasicAuthHandler(passman)))
-
-	req = urllib2.Request("http://{host}:{port}/api/overview".format(host=host, port=port))
-	response = urllib2.urlopen(req)
-	output = response.read()
-	output = json.loads(output)
-
-	# To find all 'json_field' keys in returned HTTPA API output
-	#for key in output:
-	#	print key
-
-	value = output[json_field][metric]
-	if (critical is not None and int(value) >= critical):
-		print "CRITICAL - " + msg + ": " + str(value) + "|" + metric + "=" + str(value) 
-		status_code = 2
-	elif (warning is not None and int(value) >= warning):
-		print "WARNING - " + msg + ": " + str(value) + "|" + metric + "=" + str(value) 
-		status_code = 1
-	else:
-		print "OK - " + msg + ": " + str(value)  + "|" + metric + "=" + str(value) 
-		status_code = 0
-	return status_code
-
-def get_qstatus():
-    p = subprocess.Popen(shlex.split(QSTATUS_CMD), stdout=subprocess.PIPE)
-    for line in p.stdout:
-        yield line.strip()
-
-
-def check_values(substrs, warning, critical, lines):
-    queues_names = []
-    queues = []
-    total = 0
-    num_substrs = len(substrs)
-    for line in lines:
-        if not line:
-            continue
-        qname, num_qitems = line.split()
-        if len([i for i in substrs if i in qname]) < num_substrs:
-            continue
-        queues_names.append(qname)
-        total += int(num_qitems)
-        queues.append((qname, num_qitems))
-
-    queue_status = " ".join("{0}={1}".format(*i) for i in queues)
-    msg = "- queues: {0} | qitems={1};{2};{3} {4}".format(
-        " ".join(queues_names), total, warning, critical, queue_status)
-    if total >= critical:
-        status = "CRITICAL"
-        ret = 2
-    elif total >= warning:
-        status = "WARNING"
-        ret = 1
-    else:
-        status = "OK"
-        ret = 0
-    return "{0} {1}".format(status, msg), ret
-
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("-w", "--warning", help='Metric Warning threshold', type=int, required=False)
-    parser.add_argument("-c", "--critical", help='Metric Critical threshold', type=int, required=False)
-    parser.add_argument('-s', '--substring', help='Queue names, used with \'-t list_queues\'', default = None)
-    parser.add_argument('-H', '--host', help='Host location, default=localhost', default='localhost')
-    parser.add_argument('-P', '--port', help='Port number, default=6379', default='15672')
-    parser.add_argument('-U', '--username', help='Username when connecting to the server, default=guest', default='guest', type=str)
-    parser.add_argument('-p', '--password', help='Password when connecting to the server, default=guest', default='guest', type=str)
-    parser.add_argument('-t', '--metric', help='Metric to choose', default=None, required=True)
-    args = parser.parse_args()
-
-    status_code = 3
-    if (args.metric == 'list_queues'):
-        ret = 3
+
+def substrings_regex(substrs):
+    '''a regex matching the names holding all of substrs, in any order'''
+    return "^" + "".join("(?=.*%s)" % re.escape(s) for s in substrs)
+
+
+class RabbitMQChecker(nagios.JsonStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(RabbitMQChecker, self).__init__(*args, **kwargs)
+        # -w/--warn and -c/--crit come with the plugin, --warning and
+        # --critical are kept for the former command lines
+        self.parser.add_argument("--warning",  required=False, type=int, dest="warn", help=argparse.SUPPRESS)
+        self.parser.add_argument("--critical", required=False, type=int, dest="crit", help=argparse.SUPPRESS)
+        self.parser.add_argument("-s", "--substring", required=False, type=str, default=None,
+            help="comma separated parts of the queue names, used with '-t list_queues'")
+        self.parser.add_argument("--queue-regex", required=False, type=str, default=None,
+            help="regex of the queue names, used with '-t list_queues'")
+        self.parser.add_argument("--page-size", required=False, type=int, default=500,
+            help="queues read by request, default=500")
+        self.parser.add_argument("-H", "--host",     required=False, type=str, default="localhost",
+            help="Host location, default=localhost")
+        self.parser.add_argument("-P", "--port",     required=False, type=str, default="15672",
+            help="Port number, default=15672")
+        self.parser.add_argument("-U", "--username", required=False, type=str, default="guest",
+            help="Username when connecting to the server, default=guest")
+        self.parser.add_argument("-p", "--password", required=False, type=str, default="guest",
+            help="Password when connecting to the server, default=guest")
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default="pd@rabbitmq")
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default="rabbitmq")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options, the
+        # snapshot of one holds the queues it's asked for
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-P", "--port", type=str)
+        self.add_unique_argument("-s", "--substring", type=str)
+        self.add_unique_argument("--queue-regex", type=str)
+        for name in metrics:
+            self.commands[name] = RabbitMQChecker.check_metric.im_func
+
+    def get_credentials(self, request):
+        return request.username, request.password
+
+    def get_base_url(self, request):
+        return "http://%s:%s/api/" % (request.host, request.port)
+
+    def get_endpoints(self, request):
+        return {"overview": self.get_base_url(request) + "overview"}
+
+    def get_queue_regex(self, request):
+        if request.queue_regex:
+            return request.queue_regex
+        if request.substring:
+            return substrings_regex([s for s in request.substring.split(",") if s])
+        return None
+
+    # the queues are counted page by page as they are read, the pages
+    # aren't kept
+    def retrieve_queues(self, request, regex):
+        query = {"columns": "name,messages", "page_size": request.page_size,
+                 "name": regex, "use_regex": "true"}
+        stats = {"qitems": 0}
+        page, page_count = 1, 1
+        while page <= page_count:
+            query["page"] = page
+            url = self.get_base_url(request) + "queues?" + urllib.urlencode(sorted(query.items()))
+            document = self.fetch_json(request, url)
+            try:
+                page_count = document["page_count"]
+                for queue in document["items"]:
+                    # a queue that's just been declared may have no stats yet
+                    value = queue.get("messages") or 0
+                    stats["qitems@" + queue["name"]] = value
+                    stats["qitems"] += value
+            except (KeyError, TypeError, AttributeError), e:
+                raise nagios.OutputFormatError(request, "%s: missing %s" % (url, e))
+            page += 1
+        return stats
+
+    def _get_batch_status(self, request):
+        documents = super(RabbitMQChecker, self)._get_batch_status(request)
+        regex = self.get_queue_regex(request)
+        if regex is not None:
+            documents["queues"] = self.retrieve_queues(request, regex)
+        return documents
+
+    def _parse_output(self, request, documents):
+        overview = documents["overview"]
+        stats = {}
         try:
-            if (args.substring):
-                substrs = args.substring.split(",")
-                msg, ret = check_values(
-			substrs, args.warning, args.critical, get_qstatus())
-            else:
-                print '-s or --substring argument required with metric \'list_queues\''
-        except:
-            msg = "UNKNOWN - exception occured"
-            print msg
-        sys.exit(ret)
-
-    try:
-    	status_code = get_metric_value(args.host, args.port, args.username, args.password,
-		 metrics[args.metric][0],args.metric,metrics[args.metric][1], args.critical, args.warning)
-    except KeyError:
-        print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-        str_metrics =  "Supported Metrics: ["
-        for metric in metrics:
-            str_metrics += ("'" + metric + "',")
-        print str_metrics[:-1] + "]"
-    except urllib2.URLError:
-        print "Error: Connection Refused - Check host and port arguments"
-    sys.exit(status_code)
+            for name, (field, msg) in metrics.iteritems():
+                # queue_totals is empty while there's no queue
+                stats[name] = overview[field].get(name, 0)
+        except (KeyError, TypeError, AttributeError), e:
+            raise nagios.OutputFormatError(request, "/api/overview: missing %s" % e)
+        stats.update(documents.get("queues", {}))
+        return stats
+
+    def check_metric(self, request):
+        value = self.get_status_value(request.option, request)
+        r = nagios.Result(request.option, self.verdict(value, request.warn, request.crit),
+                          "%s: %s" % (metrics[request.option][1], value), request.appname)
+        r.add_performance_data(request.option, value, warn=request.warn, crit=request.crit)
+        return r
+
+    @plugin.command("list_queues")
+    def check_queues(self, request):
+        if self.get_queue_regex(request) is None:
+            raise nagios.StatusUnknownError(request, "-s/--substring or --queue-regex required with list_queues")
+        total = self.get_status_value("qitems", request)
+        queues = self.get_sub_attrs("qitems", request)
+        r = nagios.Result(request.option, self.verdict(total, request.warn, request.crit),
+                          "queues: %s" % " ".join(name for name, k in queues), request.appname)
+        r.add_performance_data("qitems", total, warn=request.warn, crit=request.crit)
+        for name, k in queues:
+            r.add_performance_data(name, self.get_status_value(k, request))
+        return r
 
 if __name__ == "__main__":
-    main()
+    import sys
+    RabbitMQChecker().run(sys.argv[1:])
@@ -5,70 +5,61 @@ Updated on August 26, 2014 by Tony Ling
 
 @author: Yangming
 '''
-import re
-import commands
+import sys
+import socket
 import statsd
 import nagios
 from nagios import CommandBasedPlugin as plugin
-import argparse
-import subprocess
+import resp
 
 class RedisChecker(nagios.BatchStatusPlugin):
     def __init__(self, *args, **kwargs):
         super(RedisChecker, self).__init__(*args, **kwargs)
-        # Hack to determine uniqueness of script defs
-        check = argparse.ArgumentParser()
-        check.add_argument("-H", "--host",     required=False, type=str)
-        check.add_argument("-p", "--port",     required=False, type=int)
-        chk, unknown = check.parse_known_args()
-
         self.parser.add_argument("-f", "--filename", required=False, type=str, default='pd@redis-cli_info')
-        self.parser.add_argument("-u", "--user",     required=False, type=str)
+        self.parser.add_argument("-u", "--user",     required=False, type=str,
+            help="deprecated and ignored, was the user to run redis-cli as")
         self.parser.add_argument("-s", "--password", required=False, type=str)
         self.parser.add_argument("-H", "--host",     required=False, type=str)
         self.parser.add_argument("-p", "--port",     required=False, type=int)
         self.parser.add_argument("-n", "--database", required=False, type=int)
         self.parser.add_argument("-z", "--appname",  required=False, type=str, default='redis')
-        self.parser.add_argument("--unique",   required=False, type=str, default=str(chk.host)+str(chk.port))
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-p", "--port", type=int)
+
+    def parse_args(self, args):
+        request = super(RedisChecker, self).parse_args(args)
+        if request.user is not None:
+            sys.stderr.write("-u/--user is deprecated and ignored, redis is queried in process\n")
+        return request
 
     def _get_batch_status(self, request):
-        cmd = "redis-cli --raw"
-        if request.password:
-            cmd += " -a %s" % request.password
-        if request.database:
-            cmd += " -n %s" % request.database
-        if request.host:
-            cmd += " -h %s" % request.host
-        if request.port:
-            cmd += " -p %s" % request.port
-        cmd += " info"
-        if request.user:
-            cmd = nagios.rootify(cmd, request.user)
-        return commands.getoutput(cmd)
+        # INFO and DBSIZE in one round-trip
+        try:
+            info, dbsize = resp.pipeline([("INFO",), ("DBSIZE",)], host=request.host, port=request.port,
+                                         password=request.password, database=request.database)
+        except resp.AuthenticationError, e:
+            raise nagios.AuthenticationFailedError(request, str(e))
+        except resp.RedisError, e:
+            raise nagios.ServiceInaccessibleError(request, str(e))
+        except socket.error, e:
+            raise nagios.StatusUnknownError(request, "can't query redis: %s" % (e or e.__class__.__name__))
+        output = resp.parse_info(info)
+        output["dbsize"] = dbsize
+        return output
 
     def _parse_output(self, request, output):
-        for l in output.split('\n'):
-            try:
-                k, v = l.split(':')
-                value = nagios.to_num(v)
-                if value is not None:
-                    yield k, value
-            except ValueError:
-                pass
+        for k, v in output.iteritems():
+            value = nagios.to_num(str(v))
+            # non-numeric fields are kept as well, i.e. role
+            yield k, v if value is None else value
 
     def _validate_output(self, request, output):
-        if "command not found" in output:
-            raise nagios.ServiceInaccessibleError(request, output)
-        elif output.strip() == "":
+        if not output:
             raise nagios.ServiceInaccessibleError(request, output)
         return True
 
-    def _get_metric(self,data, metric):
-	for line in data.split('\r\n'):
-		tokens = line.split(':')
-		if (tokens[0] == metric):
-			return tokens[1]
-
     @plugin.command("CURRENT_OPERATIONS")
     @statsd.counter
     def get_current_operations_rate(self, request):
@@ -110,13 +101,7 @@ class RedisChecker(nagios.BatchStatusPlugin):
     @plugin.command("TOTAL_KEYS")
     @statsd.gauge
     def get_total_keys(self, request):
-        cmd = "redis-cli dbsize"
-        output = commands.getoutput(cmd)
-        dbsize_pattern = re.compile(".*?(\d+)")
-        matchResult = dbsize_pattern.match(output)
-        if not matchResult:
-            raise nagios.OutputFormatError(request, output)
-        value = int(matchResult.groups(1)[0])
+        value = self.get_status_value("dbsize", request)
         return self.get_result(request, value, '%s total keys' % value, 'total_keys')
 
     @plugin.command("COMMAND_FREQUENCY")
@@ -128,82 +113,64 @@ class RedisChecker(nagios.BatchStatusPlugin):
     @plugin.command("CONNECTED_CLIENTS")
     @statsd.counter
     def get_connected_clients(self, request):
-	cmd = "redis-cli info"
-	metric = 'connected_clients'
-        output = commands.getoutput(cmd)
-	value = self._get_metric(output, metric)
+        metric = 'connected_clients'
+        value = self.get_status_value(metric, request)
         return self.get_result(request, value, "%s connected clients" % value, metric)
 
     @plugin.command("MEMORY_FRAGMENTATION")
     @statsd.counter
     def get_mem_fragmentation(self, request):
-	cmd = "redis-cli info"
-	metric = 'mem_fragmentation_ratio'
-        output = commands.getoutput(cmd)
-	value = self._get_metric(output, metric)
+        metric = 'mem_fragmentation_ratio'
+        value = self.get_status_value(metric, request)
         return self.get_result(request, value, "%s Memory fragmentation ratio (used_memory_rss:used_memory)" % value, metric)
 
     @plugin.command("USED_MEMORY_LUA")
     @statsd.counter
     def get_used_mem_lua(self, request):
-	cmd = "redis-cli info"
-	metric = 'used_memory_lua'
-        output = commands.getoutput(cmd)
-	value = self._get_metric(output, metric)
+        metric = 'used_memory_lua'
+        value = self.get_status_value(metric, request)
         return self.get_result(request, value, "%s Bytes used by Lua engine" % value, metric)
 
     @plugin.command("REPLICATION_CONNECTED_SLAVES")
     @statsd.counter
     def get_repl_connected_slaves(self, request):
-	cmd = "redis-cli info"
-	metric = 'connected_slaves'
-        output = commands.getoutput(cmd)
-	value = self._get_metric(output, metric)
+        metric = 'connected_slaves'
+        value = self.get_status_value(metric, request)
         return self.get_result(request, value, "%s connected slaves" % value, metric)
 
     @plugin.command("REPLICATION_ROLE")
     @statsd.counter
     def get_repl_role(self, request):
-	cmd = "redis-cli info"
-	metric = 'role'
-        output = commands.getoutput(cmd)
-	value = self._get_metric(output, metric)
+        metric = 'role'
+        value = self.get_status_value(metric, request)
         return self.get_result(request, value, "%s replication server role" % value, metric)
 
     @plugin.command("EVICTED_KEYS")
     @statsd.counter
     def get_evicted_keys(self, request):
-	cmd = "redis-cli info"
-	metric = 'evicted_keys'
-        output = commands.getoutput(cmd)
-	value = self._get_metric(output, metric)
+        metric = 'evicted_keys'
+        value = self.get_status_value(metric, request)
         return self.get_result(request, value, "%s keys evicted due to maxmemory limit" % value, metric)
 
     @plugin.command("EXPIRED_KEYS")
     @statsd.counter
     def get_expired_keys(self, request):
-	cmd = "redis-cli info"
-	metric = 'expired_keys'
-        output = commands.getoutput(cmd)
-	value = self._get_metric(output, metric)
+        metric = 'expired_keys'
+        value = self.get_status_value(metric, request)
         return self.get_result(request, value, "%s key expirations" % value, metric)
 
     @plugin.command("KEYSPACE_HITS")
     @statsd.counter
     def get_keyspace_hits(self, request):
-	cmd = "redis-cli info"
-	metric = 'keyspace_hits'
-        output = commands.getoutput(cmd)
-	value = self._get_metric(output, metric)
+        metric = 'keyspace_hits'
+        value = self.get_status_value(metric, request)
         return self.get_result(request, value, "%s successful main dictionary key lookups" % value, metric)
 
     @plugin.command("KEYSPACE_MISSES")
     @statsd.counter
     def get_keyspace_misses(self, request):
-	cmd = "redis-cli info"
-	metric = 'keyspace_misses'
-        output = commands.getoutput(cmd)
-	value = self._get_metric(output, metric)
+        metric = 'keyspace_misses'
+        value = self.get_status_value(metric, request)
         return self.get_result(request, value, "%s failed main dictionary key lookups" % value, metric)
 
 if __name__ == "__main__":
@@ -4,93 +4,105 @@ Created on May 31, 2012
 
 @author: Yangming
 '''
+import sys
+import socket
 import nagios
 from nagios import CommandBasedPlugin as plugin
-import commands
 import statsd
-import argparse
+import resp
+
+# the processed counter followed by the name and length of every queue,
+# read on the server in one round-trip
+QUEUES_SCRIPT = """
+local result = {redis.call('GET', 'resque:stat:processed') or false}
+for i, q in ipairs(redis.call('SMEMBERS', 'resque:queues')) do
+    result[#result + 1] = q
+    result[#result + 1] = redis.call('LLEN', 'resque:queue:' .. q)
+end
+return result
+"""
 
 class ResqueChecker(nagios.BatchStatusPlugin):
     def __init__(self, *args, **kwargs):
         super(ResqueChecker, self).__init__(*args, **kwargs)
-        # Hack to determine uniqueness of script defs
-        check = argparse.ArgumentParser()
-        check.add_argument("-H", "--host",     required=False, type=str)
-        check.add_argument("-p", "--port",     required=False, type=int)
-        chk, unknown = check.parse_known_args()
-
         self.parser.add_argument("-f", "--filename", required=False, type=str, default='pd@resque_redis-cli')
-        self.parser.add_argument("-u", "--user",     required=False, type=str)
+        self.parser.add_argument("-u", "--user",     required=False, type=str,
+            help="deprecated and ignored, was the user to run redis-cli as")
         self.parser.add_argument("-s", "--password", required=False, type=str)
         self.parser.add_argument("-H", "--host",     required=False, type=str)
         self.parser.add_argument("-p", "--port",     required=False, type=int)
         self.parser.add_argument("-n", "--database", required=False, type=int)
         self.parser.add_argument("-z", "--appname",  required=False, type=str, default='resque')
-        self.parser.add_argument("--unique",   required=False, type=str, default=str(chk.host)+str(chk.port))
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-p", "--port", type=int)
+
+    def parse_args(self, args):
+        request = super(ResqueChecker, self).parse_args(args)
+        if request.user is not None:
+            sys.stderr.write("-u/--user is deprecated and ignored, redis is queried in process\n")
+        return request
+
+    def _get_batch_status(self, request):
+        kwargs = dict(host=request.host, port=request.port,
+                      password=request.password, database=request.database)
+        try:
+            try:
+                return resp.execute("EVAL", QUEUES_SCRIPT, 0, **kwargs)
+            except resp.AuthenticationError:
+                raise
+            except resp.RedisError:
+                # no scripting before redis 2.6, pipeline the LLENs instead
+                processed, queues = resp.pipeline([("GET", "resque:stat:processed"),
+                                                   ("SMEMBERS", "resque:queues")], **kwargs)
+                lengths = resp.pipeline([("LLEN", "resque:queue:%s" % q) for q in queues], **kwargs)
+                output = [processed]
+                for q, length in zip(queues, lengths):
+                    output += [q, length]
+                return output
+        except resp.AuthenticationError, e:
+            raise nagios.AuthenticationFailedError(request, str(e))
+        except resp.RedisError, e:
+            raise nagios.ServiceInaccessibleError(request, str(e))
+        except socket.error, e:
+            raise nagios.StatusUnknownError(request, "can't query redis: %s" % (e or e.__class__.__name__))
+
+    def _validate_output(self, request, output):
+        return True
+
+    def _parse_output(self, request, output):
+        yield "processed", int(output[0] or 0)
+        for i in range(1, len(output), 2):
+            yield "queue:%s" % output[i], output[i + 1]
 
     @plugin.command("QUEUE_LENGTH")
     @statsd.gauge
     def get_queue_length(self, request):
         stats = {}
-        query = "smembers resque:queues"
-        output = self.run_query(request, query)
+        for k, v in self.get_status_values(request).iteritems():
+            if k.startswith("queue:"):
+                stats[k[len("queue:"):]] = v
 
         total = 0
         status_code = nagios.Status.OK
-        query_pattern = "llen resque:queue:%s"
-        for q in output.split('\n'):
-            if q:
-                v = self.run_query(request, query_pattern % q)
-                stats[q] = int(v)
-                total += stats[q]
-                sc = self.verdict(v, request.warn, request.crit)
-                if sc == nagios.Status.WARNING and status_code == nagios.Status.OK:
-                    status_code = nagios.Status.WARNING
-                elif sc == nagios.Status.CRITICAL:
-                    status_code = nagios.Status.CRITICAL
+        for v in stats.itervalues():
+            total += v
+            status_code = self.superimpose(status_code, v, request.warn, request.crit)
 
         r = nagios.Result(request.option, status_code, '%s jobs in queues' % total, request.appname);
         r.add_performance_data('total', total, warn=request.warn, crit=request.crit)
-        for k, v in stats.iteritems():
-            r.add_performance_data(k, v, warn=request.warn, crit=request.crit)
+        for k in sorted(stats):
+            r.add_performance_data(k, stats[k], warn=request.warn, crit=request.crit)
         return r
 
     @plugin.command("JOB_PROCESSED")
     @statsd.counter
     def get_job_processed(self, request):
-        query = "get resque:stat:processed"
-        output = self.run_query(request, query)
-        if output is None:
-            delta = 0
-        else:
-            value = int(output)
-            laststats = self.retrieve_last_status(request)
-            delta = value - laststats.setdefault("processed", 0)
-            laststats["processed"] = value
-            self.save_status(request, laststats)
-
+        value = self.get_status_value("processed", request)
+        delta = self.get_delta_value("processed", request)
         return self.get_result(request, value, '%s jobs in processed' % delta)
 
-    def run_query(self, request, query):
-        cmd_template = "redis-cli --raw"
-        if request.password is not None:
-            cmd_template += " -a %s" % request.password
-        if request.database is not None:
-            cmd_template += " -n %s" % request.database
-        if request.host is not None:
-            cmd_template += " -h %s" % request.host
-        if request.port is not None:
-            cmd_template += " -p %s" % request.port
-        cmd = "%s %s" % (cmd_template, query)
-        if request.user:
-            cmd = nagios.rootify(cmd, request.user)
-        output = commands.getoutput(cmd)
-        if "command not found" in output:
-            raise nagios.ServiceInaccessibleError(request, output)
-        elif output.strip() == "":
-            raise nagios.ServiceInaccessibleError(request, output)
-        return output
-
 if __name__ == "__main__":
     import sys
     ResqueChecker().run(sys.argv[1:])
@@ -16,6 +16,7 @@ Examples:
    python check_smart.py -p /usr/sbin/ -t OVERALL_HEALTH
    python check_smart.py -p /usr/sbin/ -r megaraid -t OVERALL_HEALTH
    python check_smart.py -p /usr/sbin/ -r megaraid -t SPIN_RETRY_COUNT
+   python check_smart.py -p /usr/sbin/ --workers 12 --disk-timeout 10 -t OVERALL_HEALTH
     
 '''
 import sys
@@ -24,28 +25,46 @@ if sys.platform == "win32":
     import ucommands as commands
 else:    
     import commands
+import os
+import json
+import socket
 import nagios
 import re
 import time
-from xml.dom.minidom import parseString
+import Queue
+import threading
+import subprocess
+from StringIO import StringIO
+from xml.etree import cElementTree as ElementTree
 from nagios import CommandBasedPlugin as plugin
-import argparse
 
 class SmartAttribute(object):
-    def __init__(self):
-        self.value = None
-        self.threshold = None
-        self.worst = None
-        self.raw_value = None
+    # a host with many disks keeps a few hundreds of them
+    __slots__ = ("value", "threshold", "worst", "raw_value")
+
+    def __init__(self, value=None, threshold=None, worst=None, raw_value=None):
+        self.value = value
+        self.threshold = threshold
+        self.worst = worst
+        self.raw_value = raw_value
+
+    # the laststats are pickled with protocol 0, which needs these with __slots__
+    def __getstate__(self):
+        return (self.value, self.threshold, self.worst, self.raw_value)
+
+    def __setstate__(self, state):
+        self.value, self.threshold, self.worst, self.raw_value = state
+
+# columns of smartctl -A
+TEXT_COLUMNS = {"VALUE": "value", "THRESH": "threshold", "WORST": "worst", "RAW_VALUE": "raw_value"}
+
+def _num(v):
+    n = nagios.to_num(v)
+    return v if n is None else n
 
 class SmartChecker(nagios.BatchStatusPlugin):
     def __init__(self, *args, **kwargs):
         super(SmartChecker, self).__init__(*args, **kwargs)
-        # Hack to determine uniqueness of script defs
-        check = argparse.ArgumentParser()
-        check.add_argument("-D", "--disk",     required=False, type=str)
-        chk, unknown = check.parse_known_args()
-
         if sys.platform == "win32":
             self.parser.set_defaults(rootdir="c:\\temp\\")
         self.parser.add_argument("-f", "--filename", required=False, type=str, default='pd@smartctl')
@@ -56,13 +75,72 @@ class SmartChecker(nagios.BatchStatusPlugin):
         #the interval (by sec) indicates how often this program will fetch smart info
         #if queried more frequently, it returns merely the last fetched info
         self.parser.add_argument("-i", "--interval", required=False, type=int, default=300)
-        self.parser.add_argument("--unique",   required=False, type=str, default=str(chk.disk))
+        self.parser.add_argument("--workers", required=False, type=int, default=8,
+            help="how many disks are probed at once")
+        self.parser.add_argument("--disk-timeout", required=False, type=int, default=20,
+            help="secs to wait for smartctl on one disk before giving it up")
+        self.parser.add_argument("--topology-ttl", required=False, type=int, default=86400,
+            help="secs the disks found and the raid layout are kept before looking for them again")
+        self.parser.add_argument("--rescan", required=False, action="store_true",
+            help="look for the disks again instead of using the ones kept")
+        self.parser.add_argument("--parser", required=False, choices=["auto", "json", "text"], default="auto",
+            help="read smartctl --json, available since smartmontools 7.0, or the text output")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw value of --disk
+        self.add_unique_argument("-D", "--disk", type=str)
+        # the disks whose smartctl timed out in the last fetch
+        self.timedout = []
 
     def _get_disks(self, request):
         if request.disk:
-            disklist = [request.disk]
-            
-        elif request.raid == "megaraid":
+            return [request.disk]
+        return self.get_topology(request)["disks"]
+
+    # the devices seen by the kernel, a disk added or removed changes it.
+    # loop and ram devices come and go without any disk changing
+    def _get_block_signature(self):
+        try:
+            names = os.listdir("/sys/block")
+        except OSError:
+            return None
+        return sorted(n for n in names if not n.startswith(("loop", "ram", "zram")))
+
+    # the disks found and their raid layout, kept in the state store by host
+    # for --topology-ttl secs, unless /sys/block has changed or --rescan
+    # is given, so the checks don't scan for them every time
+    def get_topology(self, request):
+        signature = self._get_block_signature()
+        topology = self.get_state_store(request).load(self._get_topology_key(request))
+        if (request.rescan or not topology
+            or topology["raid"] != request.raid
+            or topology["signature"] != signature
+            or int(time.time()) - topology["fetchtime"] > request.topology_ttl):
+            disks = [request.disk] if request.disk else self._discover_disks(request)
+            topology = {"raid": request.raid, "signature": signature,
+                        "fetchtime": int(time.time()), "disks": disks}
+            if disks:
+                self.save_topology(request, topology)
+            # --rescan applies once per check
+            request.rescan = False
+        return topology
+
+    def _get_topology_key(self, request):
+        return "topology@%s@%s" % (socket.gethostname(), request.disk or "")
+
+    def save_topology(self, request, topology):
+        self.get_state_store(request).save(self._get_topology_key(request), topology)
+
+    # adaptec disk ids mapped to disk names, detected once per topology
+    def get_adaptec_disks(self, request):
+        topology = self.get_topology(request)
+        if "adaptec" not in topology:
+            disklist = [d.split()[0] for d in topology["disks"] if d]
+            topology["adaptec"] = self._detect_adaptec(disklist, request)
+            self.save_topology(request, topology)
+        return topology["adaptec"]
+
+    def _discover_disks(self, request):
+        if request.raid == "megaraid":
             # get list of OS device names (/dev/sda1, etc)
             devlist = []
             cmd = nagios.rootify("/sbin/fdisk -l")
@@ -93,7 +171,7 @@ class SmartChecker(nagios.BatchStatusPlugin):
                 output = commands.getoutput(cmd)
                 disklist = re.findall(r"(?<=Disk )((?:/[\w-]+)+)(?=:)", output)
             else:
-                nagios.StatusUnknownError(request, "Can't get disk list")
+                raise nagios.StatusUnknownError(request, "Can't get disk list")
         return disklist
 
     def _get_smartctl(self, request):
@@ -102,6 +180,58 @@ class SmartChecker(nagios.BatchStatusPlugin):
         else:
             return nagios.rootify(request.path + "smartctl")
 
+    # output of cmd like commands.getoutput, or None if it hasn't finished
+    # within timeout secs, in which case it is killed. the output is read
+    # by a thread of its own, so even a process that can't be killed
+    # (i.e. a hung smartctl run by sudo) doesn't hold up the check
+    def _run(self, cmd, timeout):
+        if sys.platform == "win32":
+            proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            kill = proc.kill
+        else:
+            # in a session of its own, so that the shell and smartctl are killed together
+            proc = subprocess.Popen("{ %s ; } 2>&1" % cmd, shell=True, stdout=subprocess.PIPE,
+                                    preexec_fn=os.setsid)
+            kill = lambda: os.killpg(proc.pid, 9)
+        outputs = []
+        reader = threading.Thread(target=lambda: outputs.append(proc.communicate()[0]))
+        reader.daemon = True
+        reader.start()
+        reader.join(timeout)
+        if reader.is_alive():
+            try:
+                kill()
+            except OSError:
+                pass
+            return None
+        output = outputs[0]
+        if output.endswith("\n"):
+            output = output[:-1]
+        return output
+
+    # run smartctl with args on every device with --workers threads, return
+    # { device: output, or None if it timed out }
+    def _probe_disks(self, request, devicelist, args):
+        devices = Queue.Queue()
+        for device_with_type in devicelist:
+            devices.put(device_with_type)
+        outputs = {}
+        def work():
+            while True:
+                try:
+                    device_with_type = devices.get_nowait()
+                except Queue.Empty:
+                    return
+                cmd = nagios.rootify(self._get_smartctl(request) + " %s %s" % (args, device_with_type))
+                outputs[device_with_type] = self._run(cmd, request.disk_timeout)
+        workers = [threading.Thread(target=work) for _ in range(max(1, min(request.workers, len(devicelist))))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return outputs
+
     def _validate_scan_output(self, request, output):
         if ("is not recognized as an internal or external command" in output
             or "No such file or directory" in output
@@ -131,34 +261,65 @@ class SmartChecker(nagios.BatchStatusPlugin):
         else:
             raise nagios.StatusUnknownError(request, output)
 
+    # attributes of smartctl -A as (attrid, SmartAttribute), the numbers as numbers
     def _parse_output(self, request, output):
-        metricset = []
+        columns = []
         for l in output.split('\n'):
-            if "ID#" in l or "Pre-fail" in l or "Old_age" in l:
-                fields = l.split()
-                if fields[0] == "ID#":
-                    metricset = fields
-                if fields[0].isdigit() and len(fields) == len(metricset):
-                    attribute = SmartAttribute()
-                    for metric, value in zip(metricset[2:], fields[2:]):
-                        if metric == "VALUE":
-                            attribute.value = value
-                        elif metric == "THRESH":
-                            attribute.threshold = value
-                        elif metric == "WORST":
-                            attribute.worst = value
-                        elif metric == "RAW_VALUE":
-                            attribute.raw_value = value
-                    yield fields[0], attribute
+            fields = l.split()
+            if not fields:
+                continue
+            if fields[0] == "ID#":
+                columns = [TEXT_COLUMNS.get(f) for f in fields]
+            elif columns and fields[0].isdigit() and len(fields) == len(columns):
+                attribute = SmartAttribute()
+                for column, value in zip(columns[2:], fields[2:]):
+                    if column:
+                        setattr(attribute, column, _num(value))
+                yield fields[0], attribute
+
+    # attributes of smartctl -A --json as (attrid, SmartAttribute), none
+    # for the disks without ata attributes, i.e. nvme
+    def _parse_json_output(self, request, output):
+        try:
+            table = json.loads(output).get("ata_smart_attributes", {}).get("table", [])
+        except (ValueError, AttributeError):
+            raise nagios.OutputFormatError(request, output)
+        for row in table:
+            raw = row.get("raw", {})
+            yield str(row["id"]), SmartAttribute(row.get("value"), row.get("thresh"), row.get("worst"),
+                                                 _num(raw.get("string", raw.get("value"))))
+
+    def _validate_json_output(self, request, output):
+        try:
+            smartctl = json.loads(output).get("smartctl", {})
+        except (ValueError, AttributeError):
+            raise nagios.OutputFormatError(request, output)
+        # bit 1 is set when the device couldn't be opened
+        if smartctl.get("exit_status", 0) & 2:
+            messages = [m.get("string", "") for m in smartctl.get("messages", [])]
+            if any("No such device" in m for m in messages):
+                return False
+            raise nagios.StatusUnknownError(request, "; ".join(messages) or output)
+        return True
+
+    # whether smartctl can tell in json, found once per topology
+    def _use_json(self, request):
+        if request.parser != "auto":
+            return request.parser == "json"
+        topology = self.get_topology(request)
+        if "json" not in topology:
+            output = commands.getoutput(self._get_smartctl(request) + " --version")
+            version = re.findall(r"^smartctl (\d+)\.(\d+)", output, re.M)
+            topology["json"] = bool(version) and int(version[0][0]) >= 7
+            self.save_topology(request, topology)
+        return topology["json"]
 
     def _detect_adaptec(self, disklist, request):
         # map disk name to disk mount path
         adaptec_disks = {}
-        diskset = set(disklist)
-        for disk in diskset:
-            cmd = nagios.rootify(self._get_smartctl(request) + " -a %s" % disk)
-            output = commands.getoutput(cmd)
-            results = re.findall(r"Device: Adaptec\s+(\S+)", output)
+        outputs = self._probe_disks(request, set(disklist), "-a")
+        for disk, output in outputs.iteritems():
+            results = re.findall(r"Device: Adaptec\s+(\S+)", output or "")
             if len(results) == 1:
                 adaptec_disks[results[0]] = disk
                 disklist.remove(disk)
@@ -178,66 +339,96 @@ class SmartChecker(nagios.BatchStatusPlugin):
 
     def retrieve_adaptec_status(self, request, disklist):
         stats = {}
-        diskdict = self._detect_adaptec(disklist, request)
+        diskdict = self.get_adaptec_disks(request)
         if not diskdict:
             return stats
         cmd = nagios.rootify("/usr/StorMan/arcconf getsmartstats 1")
         output = commands.getoutput(cmd)
-        xml = output[output.index("<SmartStats"):output.index("</SmartStats>")+13]
-        dom = parseString(xml)
-        for disknode in dom.getElementsByTagName("PhysicalDriveSmartStats"):
-            disk = diskdict[disknode.getAttribute("id")]
-            for attrnode in disknode.getElementsByTagName("Attribute"):
-                attribute = SmartAttribute()
-                attribute.value = attrnode.getAttribute("normalizedCurrent")
-                attribute.worst = attrnode.getAttribute("normalizedWorst")
-                attribute.raw_value = attrnode.getAttribute("rawValue")
-                attrid = str(int(attrnode.getAttribute("id"), 16))
+        disk = None
+        for event, elem in self._iterparse_arcconf(request, output, "SmartStats"):
+            if elem.tag == "PhysicalDriveSmartStats":
+                disk = diskdict.get(elem.get("id")) if event == "start" else None
+            elif elem.tag == "Attribute" and event == "end" and disk is not None:
+                attribute = SmartAttribute(_num(elem.get("normalizedCurrent")), None,
+                                           _num(elem.get("normalizedWorst")), _num(elem.get("rawValue")))
+                attrid = str(int(elem.get("id"), 16))
                 stats.setdefault(attrid, {})[disk] = attribute
+                elem.clear()
         return stats
 
-    def retrieve_batch_status(self, request):
-        devicelist = self._get_disks(request)
-        # print "devicelist: ", devicelist
-        disklist = [d.split()[0] for d in devicelist if d]
-        # print "disklist: ", disklist
-        stats = {}
+    # (event, element) of the xml document of root within the output of
+    # arcconf, read as a stream and not kept as a whole
+    def _iterparse_arcconf(self, request, output, root):
+        start, end = output.find("<" + root), output.find("</%s>" % root)
+        if start < 0 or end < 0:
+            raise nagios.OutputFormatError(request, output)
+        xml = StringIO(output[start:end + len(root) + 3])
+        return ElementTree.iterparse(xml, events=("start", "end"))
+
+    # the SMART attributes of the devices, as { device: { attrid: attribute } }.
+    # the devices whose smartctl timed out are left out
+    def retrieve_disk_status(self, request, devicelist):
+        disklist = [d.split()[0] for d in devicelist]
 
         # load the SMART info of adaptec raid controller
         if request.raid == "adaptec":
-            stats.update(self.retrieve_adaptec_status(request, disklist))
-            return stats
-            
+            diskstats = {}
+            for attrid, attributes in self.retrieve_adaptec_status(request, disklist).iteritems():
+                for disk, attribute in attributes.iteritems():
+                    diskstats.setdefault(disk, {})[attrid] = attribute
+            return diskstats
+
         # load the SMART info of the rest disks.
-        for device_with_type in devicelist:
-            if device_with_type:
-                disk = device_with_type.split()[0]
-            else:
+        if self._use_json(request):
+            args, validate, parse = "-A --json", self._validate_json_output, self._parse_json_output
+        else:
+            args, validate, parse = "-A", self._validate_output, self._parse_output
+        diskstats = {}
+        for device_with_type, output in self._probe_disks(request, devicelist, args).iteritems():
+            if output is None:
                 continue
-            cmd = nagios.rootify(self._get_smartctl(request) + (" -A %s" % device_with_type))
-            # print "smartctl cmd: ", cmd
-            output = commands.getoutput(cmd)
-            if not self._validate_output(request, output):
+            if not validate(request, output):
+                diskstats[device_with_type] = {}
                 continue
-            for attrid, attribute in self._parse_output(request, output):
-                # stats.setdefault(attrid, {})[disk] = attribute
+            diskstats[device_with_type] = dict(parse(request, output))
+        return diskstats
+
+    # the SMART attributes as { attrid: { device: attribute } }. each disk is
+    # kept in the laststats with the time it was fetched, and probed again
+    # only after --interval secs. a disk not answering within --disk-timeout
+    # keeps its last attributes and is listed in self.timedout
+    def retrieve_batch_status(self, request):
+        laststats = self.retrieve_last_status(request)
+        disks = laststats.get("disks", {})
+        now = int(time.time())
+        self.timedout = []
+        if not disks or any(now - fetchtime > request.interval for fetchtime, _ in disks.itervalues()):
+            devicelist = [d for d in self._get_disks(request) if d]
+            stale = [d for d in devicelist if d not in disks or now - disks[d][0] > request.interval]
+            fetched = self.retrieve_disk_status(request, stale)
+            # the disks gone are dropped
+            disks = dict((d, disks[d]) for d in devicelist if d in disks)
+            for device_with_type, attributes in fetched.iteritems():
+                disks[device_with_type] = (now, attributes)
+            if request.raid != "adaptec":
+                self.timedout = [d for d in stale if d not in fetched]
+                # probed again on the next check
+                for device_with_type in self.timedout:
+                    disks.setdefault(device_with_type, (0, {}))
+            self.save_status(request, {"disks": disks})
+        stats = {}
+        for device_with_type, (_, attributes) in disks.iteritems():
+            for attrid, attribute in attributes.iteritems():
                 stats.setdefault(attrid, {})[device_with_type] = attribute
-        # print "stats: ", stats        
         return stats
 
     def get_status_value(self, attr, request):
         if not hasattr(self, "stats") or self.stats is None:
-            self.stats = self.retrieve_last_status(request)
-        if ("fetchtime" not in self.stats
-           or int(time.time()) - self.stats["fetchtime"] > request.interval):
-                self.stats = self.retrieve_batch_status(request)
-                self.stats["fetchtime"] = int(time.time())
-                self.save_status(request, self.stats)
+            self.stats = self.retrieve_batch_status(request)
         if attr not in self.stats:
             raise nagios.StatusUnknownError(request)
         else:
             return self.stats[attr]
-        return self.stats[attr];
 
     @plugin.command("OVERALL_HEALTH")
     def get_overall_health(self, request):
@@ -251,14 +442,16 @@ class SmartChecker(nagios.BatchStatusPlugin):
     def check_health_status(self, request, disklist):
         message = "overall test results"
         status_code = nagios.Status.OK
-        for device_with_type in disklist:
-            if device_with_type:
-                disk = device_with_type.split()[0]
-            else:
+        devicelist = [d for d in disklist if d]
+        outputs = self._probe_disks(request, devicelist, "-H")
+        for device_with_type in devicelist:
+            disk = device_with_type.split()[0]
+            output = outputs.get(device_with_type)
+            if output is None:
+                # the other disks are still reported
+                message += " %s=TIMEOUT" % disk
+                status_code = nagios.Status.worst(status_code, nagios.Status.UNKNOWN)
                 continue
-            cmd = nagios.rootify(self._get_smartctl(request) + " -H %s" % device_with_type)
-            # print "get health command: ", cmd
-            output = commands.getoutput(cmd)
             if not self._validate_output(request, output):
                 continue
             if "SMART support is: Unavailable" in output:
@@ -276,12 +469,8 @@ class SmartChecker(nagios.BatchStatusPlugin):
 
     def check_all_attribute(self, request, disklist):
         if not hasattr(self, "stats") or self.stats is None:
-            stats = self.retrieve_last_status(request)
-        if ("fetchtime" not in stats
-           or int(time.time()) - stats["fetchtime"] > request.interval):
-                stats = self.retrieve_batch_status(request)
-                stats["fetchtime"] = int(time.time())
-                self.save_status(request, stats)
+            self.stats = self.retrieve_batch_status(request)
+        stats = self.stats
         diskstats = {}
         status_code = nagios.Status.OK
         critical = request.crit
@@ -308,8 +497,7 @@ class SmartChecker(nagios.BatchStatusPlugin):
     def get_adaptec_health(self, request):
         if sys.platform == "win32":
             raise nagios.StatusUnknownError(request, "Adaptec Health only supported on linux.")
-        disklist = self._get_disks(request)
-        diskdict = self._detect_adaptec(disklist, request)
+        diskdict = self.get_adaptec_disks(request)
         if not diskdict:
             raise nagios.StatusUnknownError(request, "No Adaptec Raid Controller detected.")
         message = ""
@@ -317,8 +505,6 @@ class SmartChecker(nagios.BatchStatusPlugin):
         output = commands.getoutput(cmd)
         if not self._validate_arcconf_output(request, output):
             return
-        xml = output[output.index("<ControllerLog"):output.index("</ControllerLog>")+16]
-        dom = parseString(xml)
         status_code = nagios.Status.OK
         if not request.warn:
             warn = 1
@@ -326,9 +512,12 @@ class SmartChecker(nagios.BatchStatusPlugin):
             warn = request.warn
 
         sub_perfs = []
-        for statsnodee in dom.getElementsByTagName("physicaldrivestats"):
-            value = int(statsnodee.getAttribute("smartWarnCnt"))
-            disk = diskdict[statsnodee.getAttribute("id")]
+        for event, elem in self._iterparse_arcconf(request, output, "ControllerLog"):
+            if event != "end" or elem.tag != "physicaldrivestats":
+                continue
+            value = int(elem.get("smartWarnCnt"))
+            disk = diskdict[elem.get("id")]
+            elem.clear()
             if value > 0:
                 if message == "":
                     message = "smart warnings:"
@@ -387,6 +576,8 @@ class SmartChecker(nagios.BatchStatusPlugin):
                 critical = attribute.threshold
             status_code = self.superimpose(status_code, attribute.value, request.warn, critical, reverse=True)
             r.add_performance_data(disk, attribute.value, warn=request.warn, crit=critical)
+        if self.timedout:
+            r.message += ", timed out on %s" % " ".join(d.split()[0] for d in self.timedout)
         r.set_status_code(status_code)
         return r
 
@@ -2,83 +2,212 @@
 
 """
 Author: Tony Ling
-Executes a zookeeper 4 letter command and parses the output depending on the metric argument.
-The script uses netcat 'nc' command. For use with AppFirst collector.
+Sends zookeeper 4 letter commands and parses the output depending on the metric argument.
+For use with AppFirst collector.
 
 Example Usage:
   python check_zookeeper.py -t connections -H localhost -P 2181 -W 100 -C 200
+  python check_zookeeper.py -t leaders,zk_max_latency,znode_count_skew -H zk1,zk2,zk3:2182
+
+mntr is sent to every member of the ensemble at once, and stat to the ones
+not answering it (before 3.4, or kept out of 4lw.commands.whitelist). The
+metrics add up or pick the worst of the members, and give the value of each
+member as perfdata when there's more than one. leaders, znode_count_skew and
+members_down are checked on the ensemble as a whole.
 
 Created on: 8/26/14
 """
 
-import sys
-import subprocess
-import argparse
-
-status_code = 3;
+import re
+import nagios
+import sockquery
+from nagios import CommandBasedPlugin as plugin
 
 # metrics dict keys are script metric -t arguments, key values are array values
-# Elements: 1=nc command to zk server, 2=metric to obtain, 3=script output string
+# Elements: 1=mntr key of the metric, 2=how the members add up, 3=script output string
 metrics = {}
-metrics['mode'] = ['stat', 'Mode', 'Server Mode']
-metrics['connections'] = ['stat', 'Connections', 'Number of client connections']
-metrics['connections_outstanding'] = ['stat', 'Outstanding', 'Number of outstanding requests']
-metrics['zk_znode_count']= ['mntr', 'zk_znode_count', 'Zookeeper Znode count']
-metrics['zk_min_latency']= ['mntr', 'zk_min_latency', 'Zookeeper min latency']
-metrics['zk_max_latency']= ['mntr', 'zk_max_latency', 'Zookeeper max latency']
-metrics['zk_avg_latency']= ['mntr', 'zk_avg_latency', 'Zookeeper avg latency']
-
-parser = argparse.ArgumentParser()
-parser.add_argument('-H', '--host', help='Host location, default=localhost', default='localhost')
-parser.add_argument('-P', '--port', help='Port number, default=2181', default='2181')
-parser.add_argument('-W', '--warning', help='Warning threshold', default=None, type=float)
-parser.add_argument('-C', '--critical', help='Critical theshold', default=None, type=float)
-parser.add_argument('-t', '--metric', help='Metric to choose', default=None, required=True)
-
-args = parser.parse_args()
-
-if (args.critical and args.critical < 0):
-	print "Error: -C Critical cannot be negative"
-	sys.exit(status_code)
-elif (args.warning and args.warning < 0):
-	print "Error: -W Warning cannot be negative"
-	sys.exit(status_code)
-try:
-	array_value = metrics[args.metric]
-	cmd = array_value[0]
-	metric = array_value[1]
-	msg = array_value[2]
-	zk_info = subprocess.Popen(['nc', args.host, args.port], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-	output, err = zk_info.communicate(input=cmd)
-except KeyError:
-	print "Error: Unrecognized/unsupported metric '{_metric}'".format(_metric=args.metric)
-	str_metrics =  "Supported Metrics: ["
-	for metric in metrics:
-		str_metrics += ("'" + metric + "',")
-	print str_metrics[:-1] + "]"
-	sys.exit(status_code)
-
-for line in output.split('\n'):
-	if (cmd == 'stat'):
-		tokens = line.split(':')
-	elif (cmd == 'mntr'):
-		tokens = line.split('\t')
-	else:
-		break
-	if (tokens[0] == metric):
-		try:
-			if (args.critical and float(tokens[1]) >= args.critical):
-				print "CRITICAL - " + msg + ": " + tokens[1] +  "|" +  metric + "=" + tokens[1]
-				status_code = 2
-			elif (args.warning and float(tokens[1]) >= args.warning):
-				print "WARNING - " + msg + ": " + tokens[1] +  "|" + metric + "=" + tokens[1]
-				status_code = 1
-			else:
-				print "OK - " + msg + ": " + tokens[1] + "|" + metric + "=" + tokens[1]
-				status_code = 0
-		except ValueError:
-			print "OK - " + msg + ": " + tokens[1] + "|" + metric + "=" + tokens[1]
-			status_code = 0
-		break
-
-sys.exit(status_code)
+metrics['connections'] = ['zk_num_alive_connections', sum, 'Number of client connections']
+metrics['connections_outstanding'] = ['zk_outstanding_requests', sum, 'Number of outstanding requests']
+metrics['zk_znode_count']= ['zk_znode_count', max, 'Zookeeper Znode count']
+metrics['zk_min_latency']= ['zk_min_latency', min, 'Zookeeper min latency']
+metrics['zk_max_latency']= ['zk_max_latency', max, 'Zookeeper max latency']
+metrics['zk_avg_latency']= ['zk_avg_latency', max, 'Zookeeper avg latency']
+
+# stat lines as the mntr keys
+STAT_KEYS = {'Zookeeper version': 'zk_version', 'Connections': 'zk_num_alive_connections',
+             'Outstanding': 'zk_outstanding_requests', 'Node count': 'zk_znode_count',
+             'Mode': 'zk_server_state'}
+STAT_LATENCY = re.compile(r"^Latency min/avg/max: ([\d.]+)/([\d.]+)/([\d.]+)$")
+
+
+def parse_mntr(text):
+    '''mntr as { key: number or string }'''
+    stats = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition("\t")
+        if sep:
+            number = nagios.to_num(value.strip())
+            stats[key] = value.strip() if number is None else number
+    return stats
+
+
+def parse_stat(text):
+    '''stat as { mntr key: number or string }, the clients are only
+       counted, for the versions without a Connections line'''
+    stats = {}
+    clients = 0
+    for line in text.splitlines():
+        if line.startswith(" /"):
+            clients += 1
+            continue
+        match = STAT_LATENCY.match(line)
+        if match:
+            for key, value in zip(('zk_min_latency', 'zk_avg_latency', 'zk_max_latency'), match.groups()):
+                stats[key] = nagios.to_num(value)
+            continue
+        key, sep, value = line.partition(":")
+        if sep and key in STAT_KEYS:
+            number = nagios.to_num(value.strip())
+            stats[STAT_KEYS[key]] = value.strip() if number is None else number
+    stats.setdefault('zk_num_alive_connections', clients)
+    return stats
+
+
+def parse_reply(reply):
+    '''the reply of mntr or stat as { mntr key: value }, None if it's neither'''
+    if not isinstance(reply, str):
+        return None
+    if "zk_version" in reply:
+        return parse_mntr(reply)
+    if "Zookeeper version:" in reply and "Mode:" in reply:
+        return parse_stat(reply)
+    return None
+
+
+class ZookeeperChecker(nagios.BatchStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(ZookeeperChecker, self).__init__(*args, **kwargs)
+        self.parser.add_argument("-H", "--host",     required=False, type=str, default="localhost",
+            help="host, or a comma separated list of host[:port] of the ensemble members")
+        self.parser.add_argument("-P", "--port",     required=False, type=int, default=2181)
+        self.parser.add_argument("-W", "--warning",  required=False, type=float, dest="warn")
+        self.parser.add_argument("-C", "--critical", required=False, type=float, dest="crit")
+        self.parser.add_argument("--timeout",  required=False, type=float, default=10)
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default="pd@zookeeper")
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default="zookeeper")
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        # instances are told apart by the raw values of those options
+        self.add_unique_argument("-H", "--host", type=str)
+        self.add_unique_argument("-P", "--port", type=int)
+        self.parser.set_defaults(cache_ttl=10)
+        for name in metrics:
+            self.commands[name] = ZookeeperChecker.check_metric.im_func
+
+    def parse_args(self, args):
+        request = super(ZookeeperChecker, self).parse_args(args)
+        for name in ("warn", "crit"):
+            if getattr(request, name) is not None and getattr(request, name) < 0:
+                self.parser.error("-%s %s cannot be negative" % (name[0].upper(), name))
+        return request
+
+    # mntr to all the members at once, then stat to the ones not answering mntr
+    def _get_batch_status(self, request):
+        try:
+            addresses = sockquery.parse_targets(request.host, request.port)
+        except ValueError, e:
+            raise nagios.StatusUnknownError(request, "%s. usage: -H host[:port][,host[:port]...]" % e)
+        replies = sockquery.query_all(addresses, "mntr", request.timeout)
+        fallback = [address for address, reply in replies.iteritems()
+                    if isinstance(reply, str) and parse_reply(reply) is None]
+        if fallback:
+            replies.update(sockquery.query_all(fallback, "stat", request.timeout))
+        return dict((sockquery.format_target(address), reply) for address, reply in replies.iteritems())
+
+    # UNKNOWN when none of the members answers
+    def _validate_output(self, request, output):
+        if not any(parse_reply(reply) is not None for reply in output.itervalues()):
+            raise nagios.StatusUnknownError(request,
+                "; ".join("%s %s" % (node, str(reply).strip()) for node, reply in sorted(output.iteritems())))
+        return True
+
+    # every metric of the members added up, and by member as metric@host:port
+    # when there's more than one. mode@host:port is the state of each member
+    def _parse_output(self, request, output):
+        members = {}
+        for node, reply in output.iteritems():
+            parsed = parse_reply(reply)
+            if parsed is not None:
+                members[node] = parsed
+        stats = {}
+        for name, (key, aggregate, msg) in metrics.iteritems():
+            values = dict((node, m[key]) for node, m in members.iteritems() if key in m)
+            if not values:
+                continue
+            stats[name] = aggregate(values.values())
+            if len(output) > 1:
+                for node, value in values.iteritems():
+                    stats["%s@%s" % (name, node)] = value
+        for node, m in members.iteritems():
+            stats["mode@%s" % node] = m.get('zk_server_state', 'unknown')
+        stats["leaders"] = len([m for m in members.itervalues()
+                                if m.get('zk_server_state') in ('leader', 'standalone')])
+        counts = [m['zk_znode_count'] for m in members.itervalues() if 'zk_znode_count' in m]
+        stats["znode_count_skew"] = max(counts) - min(counts) if counts else 0
+        stats["members_down"] = len(output) - len(members)
+        return stats
+
+    def check_metric(self, request):
+        key, aggregate, msg = metrics[request.option]
+        value = self.get_status_value(request.option, request)
+        sub_perfs = [(node, self.get_status_value(k, request))
+                     for node, k in self.get_sub_attrs(request.option, request)]
+        r = nagios.Result(request.option, self.verdict(value, request.warn, request.crit),
+                          "%s: %s" % (msg, value), request.appname)
+        r.add_performance_data(request.option, value, warn=request.warn, crit=request.crit)
+        for node, v in sub_perfs:
+            r.add_performance_data(node, v, warn=request.warn, crit=request.crit)
+        return r
+
+    @plugin.command("mode")
+    def get_mode(self, request):
+        modes = self.get_sub_attrs("mode", request)
+        if len(modes) == 1:
+            mode = self.get_status_value(modes[0][1], request)
+            return nagios.Result(request.option, nagios.Status.OK, "Server Mode: %s" % mode,
+                                 request.appname).add_performance_data("mode", mode)
+        message = ", ".join("%s %s" % (node, self.get_status_value(k, request)) for node, k in modes)
+        return nagios.Result(request.option, nagios.Status.OK, "Server Mode: %s" % message, request.appname)
+
+    # one leader, or one standalone server, is expected of an ensemble. a
+    # single member of an ensemble doesn't tell, the leader is another one
+    @plugin.command("leaders")
+    def get_leaders(self, request):
+        value = self.get_status_value("leaders", request)
+        modes = self.get_sub_attrs("mode", request)
+        if len(modes) + self.get_status_value("members_down", request) == 1:
+            mode = self.get_status_value(modes[0][1], request)
+            if mode not in ("leader", "standalone"):
+                return nagios.Result(request.option, nagios.Status.OK,
+                                     "the member is a %s, -H the whole ensemble to count its leaders" % mode,
+                                     request.appname)
+        status = nagios.Status.OK if value == 1 else nagios.Status.CRITICAL
+        return nagios.Result(request.option, status, "%s leaders in the ensemble" % value,
+                             request.appname).add_performance_data("leaders", value)
+
+    @plugin.command("znode_count_skew")
+    def get_znode_count_skew(self, request):
+        value = self.get_status_value("znode_count_skew", request)
+        r = nagios.Result(request.option, self.verdict(value, request.warn, request.crit),
+                          "%s znodes between the members" % value, request.appname)
+        return r.add_performance_data("znode_count_skew", value, warn=request.warn, crit=request.crit)
+
+    @plugin.command("members_down")
+    def get_members_down(self, request):
+        value = self.get_status_value("members_down", request)
+        r = nagios.Result(request.option, self.verdict(value, request.warn, request.crit),
+                          "%s members down" % value, request.appname)
+        return r.add_performance_data("members_down", value, warn=request.warn, crit=request.crit)
+
+if __name__ == "__main__":
+    import sys
+    ZookeeperChecker().run(sys.argv[1:])
@@ -0,0 +1,281 @@
+'''
+Created on Oct 18, 2026
+
+a small HTTP client shared by the checks reading a status page or a JSON
+API. connections are kept alive and pooled per server for the following
+requests of the process (i.e. nagiosd, or several options checked at
+once), every request has a connect and a read timeout, and the responses
+are asked gzipped. a response with an ETag or a Last-Modified is kept and
+asked again conditionally, and any response can be reused for a few
+seconds with cache_ttl. redirects are followed, up to MAX_REDIRECTS, and
+the proxies of http_proxy, https_proxy and no_proxy are used as urllib2
+did.
+'''
+import atexit
+import zlib
+import json
+import time
+import base64
+import socket
+import urllib
+import httplib
+import urlparse
+import threading
+
+DEFAULT_TIMEOUT = 10
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class HTTPError(Exception):
+    ''' a request that failed: no connection, a timeout, or an error status.
+        status is None when no response came back
+    '''
+    def __init__(self, url, message, status=None):
+        Exception.__init__(self, "%s: %s" % (url, message))
+        self.url = url
+        self.status = status
+
+
+class Response(object):
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        # lowercased names
+        self.headers = headers
+        self.body = body
+        self.fetchtime = time.time()
+
+
+def _timeouts(timeout):
+    '''timeout as (connect, read), a number is both'''
+    if isinstance(timeout, (tuple, list)):
+        return timeout
+    return timeout, timeout
+
+
+def get_proxy(scheme, host):
+    '''the proxy of scheme in the environment as (host, port, authorization),
+       None if there's none or host is in no_proxy'''
+    proxy = urllib.getproxies().get(scheme)
+    if not proxy or urllib.proxy_bypass(host):
+        return None
+    if "://" not in proxy:
+        proxy = "http://" + proxy
+    parts = urlparse.urlsplit(proxy)
+    authorization = None
+    if parts.username is not None:
+        authorization = "Basic " + base64.b64encode("%s:%s" % (
+            urllib.unquote(parts.username), urllib.unquote(parts.password or "")))
+    return parts.hostname, parts.port or 80, authorization
+
+
+# idle connections by (scheme, host, port, proxy)
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def connect(scheme, host, port, timeout=DEFAULT_TIMEOUT, proxy=None):
+    '''take an idle connection out of the pool, or connect anew. through
+       proxy, an http connection is to the proxy and an https one is
+       tunneled'''
+    key = (scheme, host, port, proxy)
+    connect_timeout, read_timeout = _timeouts(timeout)
+    with _pool_lock:
+        idle = _pool.get(key)
+        if idle:
+            connection = idle.pop()
+            connection.sock.settimeout(read_timeout)
+            return key, connection, True
+    cls = httplib.HTTPSConnection if scheme == "https" else httplib.HTTPConnection
+    if proxy is None:
+        connection = cls(host, port, timeout=connect_timeout)
+    else:
+        connection = cls(proxy[0], proxy[1], timeout=connect_timeout)
+        if scheme == "https":
+            headers = {"Proxy-Authorization": proxy[2]} if proxy[2] else None
+            connection.set_tunnel(host, port, headers)
+    connection.connect()
+    connection.sock.settimeout(read_timeout)
+    return key, connection, False
+
+
+def release(key, connection):
+    with _pool_lock:
+        _pool.setdefault(key, []).append(connection)
+
+
+def close_all():
+    with _pool_lock:
+        connections = [c for idle in _pool.itervalues() for c in idle]
+        _pool.clear()
+    for c in connections:
+        c.close()
+
+
+# the pooled connections are closed as the process exits, the daemon's too
+atexit.register(close_all)
+
+
+# responses kept for cache_ttl or for conditional requests, by (url, username)
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _send(url, username=None, password=None, timeout=DEFAULT_TIMEOUT, headers=None):
+    '''send a GET on a pooled connection, return (key, connection, response)
+       with the body still to be read. a stale pooled connection is
+       replaced once'''
+    parts = urlparse.urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise HTTPError(url, "unsupported url scheme %r" % parts.scheme)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    request_headers = {"Accept-Encoding": "gzip"}
+    if username is not None and password is not None:
+        request_headers["Authorization"] = "Basic " + base64.b64encode("%s:%s" % (username, password))
+    request_headers.update(headers or {})
+    proxy = get_proxy(parts.scheme, parts.hostname)
+    if proxy is not None and parts.scheme == "http":
+        # a plain http proxy is asked for the absolute url
+        path = urlparse.urlunsplit((parts.scheme, parts.netloc, path, "", ""))
+        if proxy[2]:
+            request_headers["Proxy-Authorization"] = proxy[2]
+    while True:
+        try:
+            key, connection, pooled = connect(parts.scheme, parts.hostname, parts.port, timeout, proxy)
+        except socket.timeout:
+            raise HTTPError(url, "timed out connecting")
+        except (socket.error, httplib.HTTPException), e:
+            raise HTTPError(url, e)
+        try:
+            connection.request("GET", path, headers=request_headers)
+            return key, connection, connection.getresponse()
+        except (socket.error, httplib.HTTPException), e:
+            connection.close()
+            # the server has closed the idle connection, i.e. keepalive_timeout
+            if pooled and not isinstance(e, socket.timeout):
+                continue
+            if isinstance(e, socket.timeout):
+                raise HTTPError(url, "timed out reading")
+            raise HTTPError(url, e or e.__class__.__name__)
+
+
+def _finish(key, connection, response):
+    if response.will_close:
+        connection.close()
+    else:
+        release(key, connection)
+
+
+def _open(url, username=None, password=None, timeout=DEFAULT_TIMEOUT, headers=None):
+    '''_send, following up to MAX_REDIRECTS redirects. the credentials are
+       only sent to the host of url'''
+    netloc = urlparse.urlsplit(url).netloc
+    for _ in range(MAX_REDIRECTS + 1):
+        key, connection, response = _send(url, username, password, timeout, headers)
+        location = response.getheader("location")
+        if response.status not in REDIRECT_STATUSES or not location:
+            return key, connection, response
+        try:
+            response.read()
+        except (socket.error, httplib.HTTPException), e:
+            connection.close()
+            raise HTTPError(url, "timed out reading" if isinstance(e, socket.timeout) else e)
+        _finish(key, connection, response)
+        url = urlparse.urljoin(url, location)
+        if urlparse.urlsplit(url).netloc != netloc:
+            username = password = None
+    raise HTTPError(url, "more than %d redirects" % MAX_REDIRECTS, response.status)
+
+
+def request(url, username=None, password=None, timeout=DEFAULT_TIMEOUT, cache_ttl=0):
+    '''GET url, return the Response. raise HTTPError when it fails or its
+       status is 400 or above'''
+    cache_key = (url, username)
+    with _cache_lock:
+        cached = _cache.get(cache_key)
+    if cached is not None and time.time() - cached.fetchtime < cache_ttl:
+        return cached
+    headers = {}
+    if cached is not None and "etag" in cached.headers:
+        headers["If-None-Match"] = cached.headers["etag"]
+    if cached is not None and "last-modified" in cached.headers:
+        headers["If-Modified-Since"] = cached.headers["last-modified"]
+    key, connection, response = _open(url, username, password, timeout, headers)
+    try:
+        body = response.read()
+    except (socket.error, httplib.HTTPException), e:
+        connection.close()
+        raise HTTPError(url, "timed out reading" if isinstance(e, socket.timeout) else e)
+    _finish(key, connection, response)
+    if response.status == 304 and cached is not None:
+        cached.fetchtime = time.time()
+        return cached
+    if response.status >= 400:
+        raise HTTPError(url, "%d %s" % (response.status, response.reason), response.status)
+    response_headers = dict((k.lower(), v) for k, v in response.getheaders())
+    if response_headers.get("content-encoding") == "gzip":
+        try:
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        except zlib.error, e:
+            raise HTTPError(url, "bad gzip body: %s" % e, response.status)
+    result = Response(response.status, response.reason, response_headers, body)
+    if cache_ttl > 0 or "etag" in response_headers or "last-modified" in response_headers:
+        with _cache_lock:
+            _cache[cache_key] = result
+    return result
+
+
+def get(url, **kwargs):
+    '''the body of url'''
+    return request(url, **kwargs).body
+
+
+def get_json(url, **kwargs):
+    '''the body of url decoded from JSON, raise ValueError if it isn't'''
+    return json.loads(get(url, **kwargs))
+
+
+def iter_lines(url, username=None, password=None, timeout=DEFAULT_TIMEOUT):
+    '''the lines of the body of url as they are received, for the pages too
+       big to be held (i.e. the haproxy csv). never cached'''
+    key, connection, response = _open(url, username, password, timeout)
+    if response.status >= 400:
+        response.read()
+        _finish(key, connection, response)
+        raise HTTPError(url, "%d %s" % (response.status, response.reason), response.status)
+    gzipped = (response.getheader("content-encoding") or "").lower() == "gzip"
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    pending = ""
+    finished = False
+    try:
+        while True:
+            chunk = response.read(65536)
+            if not chunk:
+                break
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            lines = (pending + chunk).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line + "\n"
+        if decompressor is not None:
+            pending += decompressor.flush()
+        _finish(key, connection, response)
+        finished = True
+    except (socket.error, httplib.HTTPException, zlib.error), e:
+        raise HTTPError(url, "timed out reading" if isinstance(e, socket.timeout) else e)
+    finally:
+        # the caller stopped early or failed, the rest of the body is
+        # still to be read on the connection
+        if not finished:
+            connection.close()
+    if pending:
+        yield pending
@@ -0,0 +1,329 @@
+'''
+Created on Oct 18, 2026
+
+a minimal MySQL client/server protocol implementation, just enough to log in
+and run text queries such as SHOW GLOBAL STATUS without the mysql client
+binaries. connections are pooled per server and user, so a long running
+process (nagiosd, or several options in one check) logs in only once.
+
+supports mysql_native_password and the fast path of caching_sha2_password;
+a caching_sha2_password full authentication needs TLS or RSA and is refused
+with AuthenticationError, the callers fall back to the mysql client then.
+'''
+import atexit
+import os
+import socket
+import struct
+import hashlib
+import threading
+
+CLIENT_LONG_PASSWORD     = 0x00000001
+CLIENT_LONG_FLAG         = 0x00000004
+CLIENT_PROTOCOL_41       = 0x00000200
+CLIENT_TRANSACTIONS      = 0x00002000
+CLIENT_SECURE_CONNECTION = 0x00008000
+CLIENT_PLUGIN_AUTH       = 0x00080000
+
+CLIENT_FLAGS = (CLIENT_LONG_PASSWORD | CLIENT_LONG_FLAG | CLIENT_PROTOCOL_41 |
+                CLIENT_TRANSACTIONS | CLIENT_SECURE_CONNECTION | CLIENT_PLUGIN_AUTH)
+
+COM_QUIT  = 0x01
+COM_QUERY = 0x03
+COM_PING  = 0x0e
+
+MAX_PACKET_LEN = 0xffffff
+UTF8_GENERAL_CI = 33
+
+DEFAULT_PORT = 3306
+DEFAULT_SOCKETS = ["/var/run/mysqld/mysqld.sock", "/var/lib/mysql/mysql.sock",
+                   "/tmp/mysql.sock"]
+
+
+class MySQLError(Exception):
+    def __init__(self, errno, message):
+        Exception.__init__(self, errno, message)
+        self.errno = errno
+        self.message = message
+
+    def __str__(self):
+        return "ERROR %s: %s" % (self.errno, self.message)
+
+
+class AuthenticationError(MySQLError):
+    pass
+
+
+def _xor(a, b):
+    return "".join(chr(ord(x) ^ ord(y)) for x, y in zip(a, b))
+
+
+def scramble_native(password, salt):
+    '''SHA1(password) XOR SHA1(salt + SHA1(SHA1(password)))'''
+    if not password:
+        return ""
+    stage1 = hashlib.sha1(password).digest()
+    stage2 = hashlib.sha1(stage1).digest()
+    return _xor(stage1, hashlib.sha1(salt + stage2).digest())
+
+
+def scramble_caching_sha2(password, salt):
+    '''SHA256(password) XOR SHA256(SHA256(SHA256(password)) + salt)'''
+    if not password:
+        return ""
+    stage1 = hashlib.sha256(password).digest()
+    stage2 = hashlib.sha256(stage1).digest()
+    return _xor(stage1, hashlib.sha256(stage2 + salt).digest())
+
+SCRAMBLERS = {
+    "mysql_native_password": scramble_native,
+    "caching_sha2_password": scramble_caching_sha2,
+}
+
+
+def read_lenenc_int(data, pos):
+    '''length encoded integer at pos, return (value, next pos), value is None for NULL'''
+    first = ord(data[pos])
+    if first < 0xfb:
+        return first, pos + 1
+    elif first == 0xfb:
+        return None, pos + 1
+    elif first == 0xfc:
+        return struct.unpack("<H", data[pos + 1:pos + 3])[0], pos + 3
+    elif first == 0xfd:
+        return struct.unpack("<I", data[pos + 1:pos + 4] + "\0")[0], pos + 4
+    return struct.unpack("<Q", data[pos + 1:pos + 9])[0], pos + 9
+
+
+def read_lenenc_str(data, pos):
+    length, pos = read_lenenc_int(data, pos)
+    if length is None:
+        return None, pos
+    return data[pos:pos + length], pos + length
+
+
+def _is_eof(packet):
+    return packet[0] == "\xfe" and len(packet) < 9
+
+
+def _error(packet):
+    # ERR packet: 0xff, error code, '#' and sql state, message
+    errno = struct.unpack("<H", packet[1:3])[0]
+    message = packet[9:] if packet[3:4] == "#" else packet[3:]
+    if errno in (1045, 1044, 1698):
+        return AuthenticationError(errno, message)
+    return MySQLError(errno, message)
+
+
+class Connection(object):
+    def __init__(self, host=None, port=None, user="root", password=None,
+                 unix_socket=None, timeout=10):
+        self.user = user or ""
+        self.password = password or ""
+        self.sequence = 0
+        if host in (None, "", "localhost") and port is None:
+            # like the mysql client, localhost means the unix socket
+            unix_socket = unix_socket or self._find_socket()
+        if unix_socket:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = unix_socket
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = (host or "127.0.0.1", port or DEFAULT_PORT)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(address)
+            self.rfile = self.sock.makefile("rb")
+            self._handshake()
+        except:
+            self.sock.close()
+            raise
+
+    @staticmethod
+    def _find_socket():
+        for path in DEFAULT_SOCKETS:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _read_exactly(self, n):
+        data = self.rfile.read(n)
+        if len(data) < n:
+            raise socket.error("connection closed by server")
+        return data
+
+    def read_packet(self):
+        chunks = []
+        while True:
+            header = self._read_exactly(4)
+            length = struct.unpack("<I", header[:3] + "\0")[0]
+            self.sequence = (ord(header[3]) + 1) % 256
+            chunks.append(self._read_exactly(length))
+            # a payload of the maximum length continues in the next packet
+            if length < MAX_PACKET_LEN:
+                return "".join(chunks)
+
+    def write_packet(self, payload):
+        while True:
+            chunk, payload = payload[:MAX_PACKET_LEN], payload[MAX_PACKET_LEN:]
+            header = struct.pack("<I", len(chunk))[:3] + chr(self.sequence)
+            self.sock.sendall(header + chunk)
+            self.sequence = (self.sequence + 1) % 256
+            if len(chunk) < MAX_PACKET_LEN:
+                return
+
+    def _handshake(self):
+        packet = self.read_packet()
+        if packet[0] == "\xff":
+            raise _error(packet)
+        if ord(packet[0]) != 10:
+            raise MySQLError(0, "unsupported protocol version %d" % ord(packet[0]))
+        pos = packet.index("\0", 1)
+        self.server_version = packet[1:pos]
+        pos += 1 + 4    # connection id
+        salt = packet[pos:pos + 8]
+        pos += 8 + 1    # filler
+        capabilities = struct.unpack("<H", packet[pos:pos + 2])[0]
+        pos += 2
+        plugin = "mysql_native_password"
+        if len(packet) > pos:
+            pos += 1 + 2    # character set, status flags
+            capabilities |= struct.unpack("<H", packet[pos:pos + 2])[0] << 16
+            salt_len = ord(packet[pos + 2])
+            pos += 2 + 1 + 10
+            if capabilities & CLIENT_SECURE_CONNECTION:
+                part2_len = max(13, salt_len - 8)
+                # the second part of the salt is NUL terminated
+                salt += packet[pos:pos + part2_len].rstrip("\0")
+                pos += part2_len
+            if capabilities & CLIENT_PLUGIN_AUTH:
+                plugin = packet[pos:].split("\0", 1)[0] or plugin
+        if plugin not in SCRAMBLERS:
+            plugin = "mysql_native_password"
+        auth = SCRAMBLERS[plugin](self.password, salt)
+        response = struct.pack("<IIB23x", CLIENT_FLAGS, MAX_PACKET_LEN, UTF8_GENERAL_CI)
+        response += self.user + "\0" + chr(len(auth)) + auth + plugin + "\0"
+        self.write_packet(response)
+        self._authenticate(plugin)
+
+    def _authenticate(self, plugin):
+        while True:
+            packet = self.read_packet()
+            if packet[0] == "\x00":
+                return
+            elif packet[0] == "\xff":
+                raise _error(packet)
+            elif packet[0] == "\xfe":
+                # auth switch request: plugin name and a new salt
+                plugin, _, salt = packet[1:].partition("\0")
+                if plugin not in SCRAMBLERS:
+                    raise AuthenticationError(0, "unsupported authentication plugin %s" % plugin)
+                self.write_packet(SCRAMBLERS[plugin](self.password, salt.rstrip("\0")))
+            elif packet[0] == "\x01" and plugin == "caching_sha2_password":
+                if packet[1:2] == "\x03":
+                    # fast authentication succeeded, OK packet follows
+                    continue
+                raise AuthenticationError(0, "caching_sha2_password full authentication "
+                                             "requires a secure connection")
+            else:
+                raise MySQLError(0, "unexpected packet during authentication")
+
+    def command(self, command, argument=""):
+        self.sequence = 0
+        self.write_packet(chr(command) + argument)
+
+    def query(self, sql):
+        '''run a text query, return the rows as tuples of strings'''
+        self.command(COM_QUERY, sql)
+        packet = self.read_packet()
+        if packet[0] == "\xff":
+            raise _error(packet)
+        elif packet[0] == "\x00":
+            return []
+        columns, _ = read_lenenc_int(packet, 0)
+        # column definitions, terminated by EOF
+        while not _is_eof(self.read_packet()):
+            pass
+        rows = []
+        while True:
+            packet = self.read_packet()
+            if _is_eof(packet):
+                return rows
+            elif packet[0] == "\xff":
+                raise _error(packet)
+            row, pos = [], 0
+            for _ in xrange(columns):
+                value, pos = read_lenenc_str(packet, pos)
+                row.append(value)
+            rows.append(tuple(row))
+
+    def close(self):
+        try:
+            self.command(COM_QUIT)
+        except socket.error:
+            pass
+        self.sock.close()
+
+
+# idle connections by (host, port, user, password, unix_socket)
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def connect(host=None, port=None, user="root", password=None, unix_socket=None, timeout=10):
+    '''take an idle connection out of the pool, or log in anew'''
+    key = (host, port, user, password, unix_socket)
+    with _pool_lock:
+        idle = _pool.get(key)
+        if idle:
+            connection = idle.pop()
+            connection.sock.settimeout(timeout)
+            return key, connection, True
+    return key, Connection(host, port, user, password, unix_socket, timeout), False
+
+
+def release(key, connection):
+    with _pool_lock:
+        _pool.setdefault(key, []).append(connection)
+
+
+def close_all():
+    with _pool_lock:
+        connections = [c for idle in _pool.itervalues() for c in idle]
+        _pool.clear()
+    for c in connections:
+        c.close()
+
+
+# the pooled connections are closed as the process exits, the daemon's too
+atexit.register(close_all)
+
+
+def query(sql, host=None, port=None, user="root", password=None, unix_socket=None, timeout=10):
+    '''run sql on a pooled connection, a stale pooled connection is replaced
+       once. the connection goes back to the pool after the rows or an error
+       reply of the server, and is closed after anything else as it may be
+       out of step'''
+    key, connection, pooled = connect(host, port, user, password, unix_socket, timeout)
+    in_step = False
+    try:
+        rows = connection.query(sql)
+        in_step = True
+        return rows
+    except MySQLError:
+        in_step = True
+        raise
+    except socket.error:
+        if not pooled:
+            raise
+    finally:
+        if in_step:
+            release(key, connection)
+        else:
+            connection.sock.close()
+    # the server has closed the idle connection, i.e. wait_timeout
+    return query(sql, host, port, user, password, unix_socket, timeout)
+
+
+def global_status(**kwargs):
+    '''SHOW GLOBAL STATUS as { variable name: value string }'''
+    return dict(query("SHOW GLOBAL STATUS", **kwargs))
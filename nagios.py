@@ -7,10 +7,25 @@ Updated 2013-08 by Mike Okner
 
 import sys
 import os
+import re
+import copy
+import time
 import pickle
 import argparse
 import string
+import tempfile
+import threading
+import httpclient
 from exceptions import Exception
+try:
+    import fcntl
+except ImportError:
+    # no flock on windows, concurrent checks may fetch the same snapshot
+    fcntl = None
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
 
 
 def BtoMB(bs):
@@ -25,6 +40,27 @@ def to_num(v):
         except ValueError:
             return None
 
+# increase of a counter from last to value. a counter lower than last has
+# either wrapped around, if it's wrap bits wide and last fits in, or been
+# reset (i.e. the server restarted) and counted up from zero since
+def counter_delta(last, value, wrap=None):
+    if value >= last:
+        return value - last
+    elif wrap and last < 2 ** wrap:
+        return value + 2 ** wrap - last
+    else:
+        return value
+
+# the StatusUnknownError for a failed httpclient request. no response at
+# all (refused, timed out) is UNKNOWN like it's always been, an error status
+# means the service is there but failing
+def http_error(request, e):
+    if e.status is None:
+        return StatusUnknownError(request, str(e))
+    if e.status in (401, 403):
+        return AuthenticationFailedError(request, str(e))
+    return ServiceInaccessibleError(request, str(e))
+
 def rootify(cmd, user=None):
     if sys.platform == "win32":
 #        import ctypes
@@ -70,6 +106,12 @@ class Status(object):
     def to_exit_code(status_code):
         return status_code
 
+    # the more severe of two status codes, critical > warning > unknown > ok
+    @staticmethod
+    def worst(status_code, other):
+        severity = [Status.OK, Status.UNKNOWN, Status.WARNING, Status.CRITICAL]
+        return max(status_code, other, key=severity.index)
+
 class Result(object):
     def __init__(self, name, status_code, message="", appname="nagios"):
         self.name = name.upper()
@@ -119,17 +161,43 @@ class Result(object):
         pdline = " %s=%s" % (perfdata["label"], perfdata["value"])
         if perfdata["UOM"] is not None:
             pdline += perfdata["UOM"]
-        if perfdata["warn"] is not None:
-            pdline += ';%s' % perfdata["warn"]
-        if perfdata["crit"] is not None:
-            pdline += ';%s' % perfdata["crit"]
-        if perfdata["minv"] is not None:
-            pdline += ';%s' % perfdata["minv"]
-        if perfdata["maxv"] is not None:
-            pdline += ';%s' % perfdata["maxv"]
+        # the fields are positional, a missing one is left empty unless
+        # no field follows it
+        fields = [perfdata["warn"], perfdata["crit"], perfdata["minv"], perfdata["maxv"]]
+        while fields and fields[-1] is None:
+            fields.pop()
+        for field in fields:
+            pdline += ';%s' % ("" if field is None else field)
         return pdline
 
 
+class MultipleResult(object):
+    ''' the results of several options checked in one run, reported with
+        the worst status of them. combined into one line with all the
+        performance data prefixed by the option, or one line per result.
+    '''
+    def __init__(self, results, combined=True):
+        self.results = results
+        self.combined = combined
+        self.status_code = reduce(Status.worst, [r.status_code for r in results], Status.OK)
+        self.status = Status.to_status(self.status_code)
+        self.exit_code = Status.to_exit_code(self.status_code)
+
+    def __str__(self):
+        if not self.combined:
+            return "\n".join(str(r) for r in self.results)
+        output = '%s: %s' % (self.status,
+            '; '.join('%s %s: %s' % (r.name, r.status, r.message) for r in self.results))
+        perf_data_output = ''
+        for r in self.results:
+            for pd in r.perf_data_list:
+                pd = dict(pd, label="%s.%s" % (r.name.lower(), pd["label"]))
+                perf_data_output += r._get_perfdata_output(pd)
+        if perf_data_output:
+            output += ' |' + perf_data_output
+        return filter(lambda x: x in string.printable, unicode(output))
+
+
 class StatusUnknownError(Exception):
     def __init__(self, request, msg=None):
         self.appname = request.appname
@@ -177,6 +245,135 @@ class OutputFormatError(StatusUnknownError):
         self.msg = msg or "output format is not as expected."
 
 
+# open and exclusively lock fn, blocking while another process holds it
+def lock_file(fn):
+    f = open(fn, "a")
+    if fcntl:
+        fcntl.flock(f, fcntl.LOCK_EX)
+    return f
+
+def unlock_file(f):
+    if fcntl:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    f.close()
+
+# write to a temp file and rename, so readers never see a partial file
+def dump_atomically(fn, obj, protocol=0):
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fn) or ".")
+    except (IOError, OSError):
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f, protocol)
+        if sys.platform == "win32" and os.path.exists(fn):
+            # rename doesn't replace on windows
+            os.remove(fn)
+        os.rename(tmp, fn)
+    except (IOError, OSError, pickle.PickleError):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# state stores keep the laststats of every instance (request.unique) sharing
+# rootdir/filename, so that delta values can be computed on the next check
+class PickleStateStore(object):
+    ''' the legacy store, one pickled dict of { unique: laststats }.
+        every save reads and rewrites the whole file, under a lock, merging
+        the keys saved into those of the instance.
+    '''
+    def __init__(self, path):
+        self.path = path
+
+    def _load_all(self):
+        try:
+            if os.path.exists(self.path):
+                return pickle.load(open(self.path, "rb"))
+        except (IOError, EOFError, ValueError, pickle.PickleError):
+            pass
+        return {}
+
+    def load(self, unique):
+        return self._load_all().get(unique, {})
+
+    def save(self, unique, laststats):
+        try:
+            lockfile = lock_file(self.path + ".lock")
+        except IOError:
+            return
+        try:
+            full = self._load_all()
+            full.setdefault(unique, {}).update(laststats)
+            dump_atomically(self.path, full)
+        finally:
+            unlock_file(lockfile)
+
+
+class SqliteStateStore(object):
+    ''' one row per instance in a sqlite database in WAL mode, so a save
+        only upserts the row of its instance. the keys saved are merged
+        into the row within one write transaction, so the concurrent checks
+        of an instance keep each other's keys. falls back to the legacy
+        pickle file for instances not stored yet.
+    '''
+    def __init__(self, path):
+        self.path = path + ".db"
+        self.legacy = PickleStateStore(path)
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is None:
+            # the connection is reused by nagiosd threads, one at a time.
+            # the transactions are begun and ended by save
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                        isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS laststats "
+                              "(uniq TEXT PRIMARY KEY, stats BLOB NOT NULL)")
+        return self.conn
+
+    def load(self, unique):
+        try:
+            row = self._connect().execute(
+                "SELECT stats FROM laststats WHERE uniq = ?", (unique,)).fetchone()
+        except sqlite3.Error:
+            return {}
+        if row is None:
+            return self.legacy.load(unique)
+        return self._unpickle(row)
+
+    def _unpickle(self, row):
+        try:
+            return pickle.loads(str(row[0]))
+        except (EOFError, ValueError, pickle.PickleError):
+            return {}
+
+    def save(self, unique, laststats):
+        try:
+            conn = self._connect()
+            # the write lock is taken before reading the row, the keys
+            # saved by another check since this one loaded are kept
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT stats FROM laststats WHERE uniq = ?", (unique,)).fetchone()
+                stats = self._unpickle(row) if row is not None else {}
+                stats.update(laststats)
+                blob = sqlite3.Binary(pickle.dumps(stats, pickle.HIGHEST_PROTOCOL))
+                conn.execute("INSERT OR REPLACE INTO laststats (uniq, stats) VALUES (?, ?)",
+                             (unique, blob))
+                conn.execute("COMMIT")
+            except:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            pass
+
+
+STATE_STORES = {"pickle": PickleStateStore}
+if sqlite3:
+    STATE_STORES["sqlite"] = SqliteStateStore
+
+
 class BasePlugin(object):
     def __init__(self):
         self.parser = argparse.ArgumentParser()
@@ -190,16 +387,25 @@ class BasePlugin(object):
         pass
 
     def run(self, args):
-        self.request = self.parser.parse_args(args)
-        try:
-            result = self.check(self.request)
-        except StatusUnknownError, e:
-            result = e.result
+        result = self.execute(args)
         if result is not None:
             print result
             sys.exit(result.exit_code)
         sys.exit(Status.to_exit_code(Status.UNKNOWN))
 
+    # parse the arguments and check, but hand the result back instead of
+    # exiting, so that one process (i.e. nagiosd.py) can serve many checks
+    def execute(self, args):
+        self.request = self.parse_args(args)
+        try:
+            result = self.check(self.request)
+        except StatusUnknownError, e:
+            result = e.result
+        return result
+
+    def parse_args(self, args):
+        return self.parser.parse_args(args)
+
     def check(self, request):
         raise NotImplementedError('need to override BasePlugin.check in subclass')
 
@@ -217,7 +423,8 @@ class BasePlugin(object):
                     ok     if value <  warn             crit
                     warn   if          warn <= value <  crit
                     crit   if          warn             crit <= value
-                if warn and crit is not defined then it's OK.
+                a warn or crit that is not defined (None) is left out,
+                if neither is defined then it's OK.
 
                 Table of Interval:
                                   ok       warn    crit
@@ -230,24 +437,17 @@ class BasePlugin(object):
 
                 NOTE: -oo means nagative infinite, +oo means positive infinite
         '''
-        status_code = Status.UNKNOWN
-        if   (warn is not None
-            and (  (not exclusive                          )
-                or (    exclusive and value == warn))
-            and (  (not reverse   and value <  warn)
-                or (    reverse   and value >  warn))):
-            status_code = Status.OK
-        elif (crit is not None
-            and (  (    exclusive                          )
-                or (not exclusive and value == warn))
-            and (  (not reverse   and value >  crit)
-                or (    reverse   and value <  crit))):
-            status_code = Status.CRITICAL
-        elif warn is not None:
-            status_code = Status.WARNING
-        else:
-            status_code = Status.OK
-        return status_code
+        def reached(threshold):
+            if threshold is None:
+                return False
+            if reverse:
+                return value < threshold if exclusive else value <= threshold
+            return value > threshold if exclusive else value >= threshold
+        if reached(crit):
+            return Status.CRITICAL
+        elif reached(warn):
+            return Status.WARNING
+        return Status.OK
 
     def superimpose(self, status_code, value, warn, crit, reverse=False, exclusive=False):
         sc = self.verdict(value, warn, crit, reverse, exclusive)
@@ -271,12 +471,55 @@ class CommandBasedPlugin(BasePlugin):
                 if method in method2commands:
                     command_str = method2commands[method]
                     self.commands[command_str] = method
-        self.parser.add_argument("-t", "--option", required=True, choices=self.commands.keys(),
-            help="options for different metrics, used to be type, keep legacy -t option for existing cfg files");
+        self.option_action = self.parser.add_argument("-t", "--option", required=True, type=self._option_type,
+            help="options for different metrics, used to be type, keep legacy -t option for existing cfg files. "
+                 "several options can be checked at once with a comma separated list, or ALL of them");
+        self.parser.add_argument("--multiple-output", required=False, choices=["combined", "lines"], default="combined",
+            help="when checking several options, combine the results into one line or print one line per result");
+
+    def parse_args(self, args):
+        # commands may be added after __init__, list them as of now
+        self.option_action.metavar = "{%s}" % ",".join(self.commands.keys() + ["ALL"])
+        return super(CommandBasedPlugin, self).parse_args(args)
+
+    # the command checking option, None if there's no such option
+    def lookup_command(self, option):
+        return self.commands.get(option)
+
+    def split_options(self, option_str):
+        if option_str == "ALL":
+            return sorted(self.commands.keys())
+        return [option for option in option_str.split(",") if option]
+
+    def _option_type(self, option_str):
+        options = self.split_options(option_str)
+        for option in options:
+            if self.lookup_command(option) is None:
+                raise argparse.ArgumentTypeError("invalid choice: %r (choose from %s)" % (option,
+                    ", ".join(repr(c) for c in self.commands.keys() + ["ALL"])))
+        if not options:
+            raise argparse.ArgumentTypeError("no option given")
+        return option_str
 
     def check(self, request):
-        if request.option in self.commands and self.commands[request.option]:
-            result = self.commands[request.option](self, request)
+        options = self.split_options(request.option)
+        if len(options) == 1:
+            return self.check_option(request)
+        results = []
+        for option in options:
+            subrequest = copy.copy(request)
+            subrequest.option = option
+            try:
+                result = self.check_option(subrequest)
+            except StatusUnknownError, e:
+                result = e.result
+            results.append(result)
+        return MultipleResult(results, request.multiple_output == "combined")
+
+    def check_option(self, request):
+        command = self.lookup_command(request.option)
+        if command:
+            result = command(self, request)
             if result:
                 return result
         return Result(request.option, Status.UNKNOWN, "mysterious status", request.appname)
@@ -297,6 +540,41 @@ class BatchStatusPlugin(CommandBasedPlugin):
     def __init__(self, *args, **kwargs):
         super(BatchStatusPlugin, self).__init__(*args, **kwargs)
         self.parser.add_argument("-d", "--rootdir", required=False, default='/tmp/', type=str);
+        self.parser.add_argument("--cache-ttl", required=False, default=0, type=int,
+            help="share the batch status on disk between checks for CACHE_TTL secs, 0 to disable");
+        self.parser.add_argument("--state-store", required=False, type=str, choices=STATE_STORES.keys(),
+            default="sqlite" if "sqlite" in STATE_STORES else "pickle",
+            help="where the laststats for delta values are kept under ROOTDIR");
+        self.unique_parser = argparse.ArgumentParser(add_help=False)
+        self.unique_dests = []
+        self.stats = None
+        self.fetchtime = None
+        self.fetch_error = None
+        # batch status fetched within snapshot_ttl secs is reused for the
+        # same instance, only useful when one process serves several checks
+        self.snapshot_ttl = 0
+        self.snapshots = {}
+        self.state_stores = {}
+
+    # options telling apart the instances sharing one state file, the raw
+    # values given on the command line make up the default of --unique
+    def add_unique_argument(self, *args, **kwargs):
+        action = self.unique_parser.add_argument(*args, required=False, **kwargs)
+        self.unique_dests.append(action.dest)
+
+    def parse_args(self, args):
+        request = super(BatchStatusPlugin, self).parse_args(args)
+        if getattr(request, "unique", "") is None:
+            chk, unknown = self.unique_parser.parse_known_args(args)
+            request.unique = "".join(str(getattr(chk, dest)) for dest in self.unique_dests)
+        return request
+
+    def execute(self, args):
+        # never carry the readings of the previous check over
+        self.stats = None
+        self.fetchtime = None
+        self.fetch_error = None
+        return super(BatchStatusPlugin, self).execute(args)
 
     # a class has to provide
     #    _get_batch_status(request)
@@ -312,58 +590,161 @@ class BatchStatusPlugin(CommandBasedPlugin):
             raise StatusUnknownError(request, output)
         return stats
 
+    # the store of rootdir/filename, kept open for the following checks
+    def get_state_store(self, request):
+        path = os.path.join(request.rootdir, request.filename)
+        key = (getattr(request, "state_store", "pickle"), path)
+        if key not in self.state_stores:
+            self.state_stores[key] = STATE_STORES[key[0]](path)
+        return self.state_stores[key]
+
     # read from rootdir/filename and return the laststats
     def retrieve_last_status(self, request):
-        laststats = {}
-        try:
-            fn = os.path.join(request.rootdir, request.filename)
-            if os.path.exists(fn):
-                laststats = pickle.load(open(fn))[request.unique]
-        except pickle.PickleError:
-            pass
-        except EOFError:
-            pass
-        except KeyError:
-            pass
-        return laststats
+        return self.get_state_store(request).load(request.unique)
 
     # dump the status as the laststats for future query
     def save_status(self, request, laststats):
-        full = {}
+        self.get_state_store(request).save(request.unique, laststats)
+
+    # the instance the batch status is of, a plugin fetching more for some
+    # options tells those snapshots apart too
+    def get_snapshot_key(self, request):
+        return getattr(request, "unique", None)
+
+    # batch status of the instance, reused if fetched within snapshot_ttl
+    # by this process or within --cache-ttl by any process
+    def retrieve_snapshot(self, request):
+        now = time.time()
+        unique = self.get_snapshot_key(request)
+        snapshot = self.snapshots.get(unique)
+        if snapshot is not None and now - snapshot[0] < self.snapshot_ttl:
+            self.fetchtime = snapshot[0]
+            return snapshot[1]
+        if getattr(request, "cache_ttl", 0) > 0:
+            fetchtime, stats = self.retrieve_cached_status(request)
+        else:
+            fetchtime, stats = now, self.retrieve_batch_status(request)
+        if self.snapshot_ttl > 0:
+            self.snapshots[unique] = (fetchtime, stats)
+        self.fetchtime = fetchtime
+        return stats
+
+    # snapshot file shared by all the checks of the same plugin and instance
+    def get_snapshot_path(self, request):
+        name = "snapshot@%s@%s" % (self.__class__.__name__, self.get_snapshot_key(request))
+        return os.path.join(request.rootdir, re.sub(r"[^\w@.-]", "_", name))
+
+    # read the parsed batch status from the snapshot file, or fetch and
+    # write it if it's older than --cache-ttl. the lock makes concurrent
+    # checks wait for the one fetching instead of fetching themselves
+    def retrieve_cached_status(self, request):
+        fn = self.get_snapshot_path(request)
         try:
-            fn = os.path.join(request.rootdir, request.filename)
-            if os.path.exists(fn):
-                full = pickle.load(open(fn))
-            full[request.unique] = laststats
-            pickle.dump(full, open(fn, "w"))
-        except pickle.PickleError:
-            pass
-        except EOFError:
-            pass
+            lockfile = lock_file(fn + ".lock")
         except IOError:
-            pass
+            return time.time(), self.retrieve_batch_status(request)
+        try:
+            try:
+                fetchtime, stats = pickle.load(open(fn, "rb"))
+                if time.time() - fetchtime < request.cache_ttl:
+                    return fetchtime, stats
+            except (IOError, EOFError, ValueError, TypeError, pickle.PickleError):
+                pass
+            fetchtime, stats = time.time(), self.retrieve_batch_status(request)
+            dump_atomically(fn, (fetchtime, stats), pickle.HIGHEST_PROTOCOL)
+            return fetchtime, stats
+        finally:
+            unlock_file(lockfile)
+
+    # get all the current readings, for the options reading a varying set
+    # of attributes, i.e. one per database
+    def get_status_values(self, request):
+        if self.fetch_error is not None:
+            # don't retry a failed fetch for every option checked in this run
+            raise self.fetch_error.__class__(request, self.fetch_error.msg)
+        if not hasattr(self, "stats") or self.stats is None:
+            try:
+                self.stats = self.retrieve_snapshot(request)
+            except StatusUnknownError, e:
+                self.fetch_error = e
+                raise
+        return self.stats
+
+    # readings of attr by database, server, etc, kept as attr@name, as
+    # sorted [(name, attr@name), ...]
+    def get_sub_attrs(self, attr, request):
+        prefix = attr + "@"
+        stats = self.get_status_values(request)
+        return sorted((k[len(prefix):], k) for k in stats if k.startswith(prefix))
 
     # get the current reading
     def get_status_value(self, attr, request):
-        if not hasattr(self, "stats") or self.stats is None:
-            self.stats = self.retrieve_batch_status(request)
-        if attr not in self.stats:
+        stats = self.get_status_values(request)
+        if attr not in stats:
             raise StatusUnknownError(request)
         else:
-            return self.stats[attr]
+            return stats[attr]
 
     # TODO request added, change in all references
     # get changes since last time
-    def get_delta_value(self, attr, request):
-        value = self.get_status_value(attr, request)
+    def get_delta_value(self, attr, request, initial=None):
+        return self.get_delta_values([attr], request, initial)[0]
+
+    # get changes of several attributes since last time, computed against
+    # one load of the laststats and saved once. only these attributes are
+    # saved, the stores merge them with those of concurrent checks. an
+    # attribute without a last value gives initial, or the value itself if
+    # initial is None
+    def get_delta_values(self, attrs, request, initial=None):
+        values = [self.get_status_value(attr, request) for attr in attrs]
         laststats = self.retrieve_last_status(request)
-        if attr in laststats:
-            delta = value - laststats[attr]
-        else:
-            delta = value
-        laststats[attr] = value
-        self.save_status(request, laststats)
-        return delta
+        deltas = []
+        for attr, value in zip(attrs, values):
+            if attr in laststats:
+                deltas.append(value - laststats[attr])
+            elif initial is not None:
+                deltas.append(initial)
+            else:
+                deltas.append(value)
+        if attrs:
+            self.save_status(request, dict(zip(attrs, values)))
+        return deltas
+
+    # get the per second rate of a counter since the last sample
+    def get_rate_value(self, attr, request, wrap=None):
+        return self.get_rate_values([attr], request, wrap)[0]
+
+    # get per second rates of counters since the last samples, which are
+    # kept apart from the laststats of the delta values along with their
+    # time, as ("@sample", attr). each sample is a key of its own, and only
+    # the samples taken are saved, so that the state stores merge those of
+    # concurrent checks. the first sample gives 0, and a check seeing the
+    # same sample again (i.e. from a cached snapshot) gives the last rate
+    # again.
+    def get_rate_values(self, attrs, request, wrap=None):
+        values = [self.get_status_value(attr, request) for attr in attrs]
+        now = self.fetchtime or time.time()
+        laststats = self.retrieve_last_status(request)
+        # samples saved before, all under one @samples key
+        oldsamples = laststats.get("@samples", {})
+        samples = {}
+        rates = []
+        for attr, value in zip(attrs, values):
+            key = ("@sample", attr)
+            sample = laststats.get(key, oldsamples.get(attr))
+            if sample is None:
+                rate = 0.0
+            else:
+                lasttime, last, rate = sample
+                if now <= lasttime:
+                    rates.append(rate)
+                    continue
+                rate = counter_delta(last, value, wrap) / float(now - lasttime)
+            samples[key] = (now, value, rate)
+            rates.append(rate)
+        if samples:
+            self.save_status(request, samples)
+        return rates
 
     # convenient method to make a result from request, performance value and message
     # optionally with some sub_performance value and the Units Of Measurement
@@ -376,3 +757,62 @@ class BatchStatusPlugin(CommandBasedPlugin):
         for pfname, pfvalue in sub_perfs:
             r.add_performance_data(pfname, pfvalue, warn=request.warn, crit=request.crit)
         return r
+
+
+# convenience skeleton class for the plugins reading a JSON API over HTTP.
+# the documents of get_endpoints(request) are fetched together, at once, and
+# make up one batch status, so all the options checked in a run or within
+# --cache-ttl share one request to each endpoint
+class JsonStatusPlugin(BatchStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(JsonStatusPlugin, self).__init__(*args, **kwargs)
+        self.parser.add_argument("--timeout", required=False, type=float, default=10,
+            help="secs to wait for each request to the server, default=10");
+        self.parser.set_defaults(cache_ttl=10)
+
+    # a class has to provide
+    #    get_endpoints(request), the urls to fetch as { name: url }
+    #    _parse_output(request, documents), documents as { name: JSON }
+    def get_endpoints(self, request):
+        raise NotImplementedError
+
+    # username and password of the requests, none by default
+    def get_credentials(self, request):
+        return None, None
+
+    def fetch_json(self, request, url):
+        username, password = self.get_credentials(request)
+        try:
+            return httpclient.get_json(url, username=username, password=password, timeout=request.timeout)
+        except httpclient.HTTPError, e:
+            raise http_error(request, e)
+        except ValueError, e:
+            raise OutputFormatError(request, "%s: %s" % (url, e))
+
+    # the endpoints are requested concurrently, a check takes as long as
+    # the slowest of them. the error of the first endpoint failing by name
+    # is raised
+    def _get_batch_status(self, request):
+        endpoints = self.get_endpoints(request)
+        documents = {}
+        errors = {}
+        def fetch(name, url):
+            try:
+                documents[name] = self.fetch_json(request, url)
+            except StatusUnknownError, e:
+                errors[name] = e
+        if len(endpoints) == 1:
+            fetch(*endpoints.items()[0])
+        else:
+            threads = [threading.Thread(target=fetch, args=item) for item in endpoints.iteritems()]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[min(errors)]
+        return documents
+
+    def _validate_output(self, request, output):
+        return True
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+'''
+Created on Oct 18, 2026
+
+A long running process hosting the BatchStatusPlugin checkers. It answers
+check requests on a local unix socket with exactly the output and exit
+code the check_*.py script would give, without paying interpreter startup
+and imports for every check. A batch status fetched for one option is
+reused by the other options of the same instance for --ttl seconds.
+
+Examples:
+   python nagiosd.py -S /tmp/nagiosd.sock serve -m check_mysql -m check_redis
+   python nagiosd.py -S /tmp/nagiosd.sock check check_mysql -t QUERIES -z mysql
+
+The request is the plugin module name followed by its arguments, separated
+by NUL characters; the response is the exit code on the first line followed
+by the plugin output.
+'''
+import os
+import sys
+import errno
+import socket
+import argparse
+import threading
+import SocketServer
+import nagios
+
+DEFAULT_SOCKET = "/tmp/nagiosd.sock"
+
+
+def load_plugin(modname):
+    '''import check_* module and return the BatchStatusPlugin defined there'''
+    module = __import__(modname)
+    for obj in vars(module).itervalues():
+        if (isinstance(obj, type) and issubclass(obj, nagios.BatchStatusPlugin)
+            and obj.__module__ == module.__name__):
+            return obj
+    raise ImportError("no BatchStatusPlugin found in %s" % modname)
+
+
+def to_module_name(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+class PluginHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        args = self.rfile.read().split("\0")
+        exit_code, output = self.server.dispatch(to_module_name(args[0]), args[1:])
+        self.wfile.write("%s\n%s\n" % (exit_code, output))
+
+
+class PluginServer(SocketServer.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, plugins, ttl=10):
+        # plugins = { modname: plugin class, ... }
+        # one plugin object per instance checked, as told apart by --unique.
+        # the checks of an instance are serialized as the object keeps the
+        # request and readings as attributes, different instances are
+        # checked concurrently. the arguments are parsed apart first to find
+        # the instance
+        self.plugins = plugins
+        self.ttl = ttl
+        self.parsers = {}
+        for modname, cls in plugins.iteritems():
+            parser = cls()
+            parser.parser.prog = modname + ".py"
+            self.parsers[modname] = (parser, threading.Lock())
+        self.instances = {}
+        self.instances_lock = threading.Lock()
+        if os.path.exists(path):
+            os.remove(path)
+        SocketServer.ThreadingUnixStreamServer.__init__(self, path, PluginHandler)
+        os.chmod(path, 0600)
+
+    # the plugin object checking that instance and its lock
+    def get_instance(self, modname, unique):
+        with self.instances_lock:
+            key = (modname, unique)
+            if key not in self.instances:
+                plugin = self.plugins[modname]()
+                plugin.snapshot_ttl = self.ttl
+                self.instances[key] = (plugin, threading.Lock())
+            return self.instances[key]
+
+    def dispatch(self, modname, args):
+        if modname not in self.plugins:
+            return (nagios.Status.UNKNOWN,
+                    "UNKNOWN: plugin %s is not served by nagiosd" % modname)
+        parser, parser_lock = self.parsers[modname]
+        with parser_lock:
+            try:
+                request = parser.parse_args(args)
+            except SystemExit, e:
+                # argparse exits 0 after printing the usage for -h
+                if not e.code:
+                    return nagios.Status.OK, parser.parser.format_help().rstrip("\n")
+                # and bails out on invalid arguments
+                return e.code, "UNKNOWN: invalid arguments %s" % " ".join(args)
+        plugin, lock = self.get_instance(modname, getattr(request, "unique", None))
+        with lock:
+            try:
+                result = plugin.execute(args)
+            except Exception, e:
+                return nagios.Status.UNKNOWN, "UNKNOWN: %s" % e
+        if result is None:
+            return nagios.Status.to_exit_code(nagios.Status.UNKNOWN), ""
+        return result.exit_code, str(result)
+
+    def server_close(self):
+        SocketServer.ThreadingUnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def query(path, modname, args, timeout=60):
+    '''send one check request to nagiosd, return (exit_code, output). raise
+       socket.error if nagiosd can't be connected to, once it is any error
+       is an UNKNOWN output'''
+    unknown = nagios.Status.to_exit_code(nagios.Status.UNKNOWN)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+        try:
+            sock.sendall("\0".join([modname] + list(args)))
+            sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        except socket.timeout:
+            return unknown, "UNKNOWN: timed out waiting for nagiosd"
+        except socket.error, e:
+            return unknown, "UNKNOWN: lost the connection to nagiosd: %s" % e
+    finally:
+        sock.close()
+    reply = "".join(chunks)
+    exit_code, _, output = reply.partition("\n")
+    try:
+        return int(exit_code), output.rstrip("\n")
+    except ValueError:
+        # nagiosd died or was stopped while checking
+        return unknown, "UNKNOWN: no exit code in the reply of nagiosd %r" % reply
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-S", "--socket", required=False, type=str, default=DEFAULT_SOCKET)
+    subparsers = parser.add_subparsers(dest="action")
+    serve = subparsers.add_parser("serve", help="serve checks of the given plugins")
+    serve.add_argument("-m", "--module", required=True, action="append",
+        help="check_* module to host, can be repeated")
+    serve.add_argument("--ttl", required=False, type=int, default=10,
+        help="seconds a batch status is shared between checks of the same instance")
+    check = subparsers.add_parser("check", help="run one check through nagiosd")
+    check.add_argument("--timeout", required=False, type=float, default=60,
+        help="secs to wait for the output of nagiosd, default=60")
+    check.add_argument("module")
+    check.add_argument("args", nargs=argparse.REMAINDER)
+    options = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+    if options.action == "serve":
+        plugins = {}
+        for name in options.module:
+            modname = to_module_name(name)
+            plugins[modname] = load_plugin(modname)
+        server = PluginServer(options.socket, plugins, options.ttl)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+    else:
+        modname = to_module_name(options.module)
+        try:
+            exit_code, output = query(options.socket, modname, options.args, options.timeout)
+        except socket.error, e:
+            if e.errno not in (errno.ENOENT, errno.ECONNREFUSED):
+                exit_code = nagios.Status.to_exit_code(nagios.Status.UNKNOWN)
+                output = "UNKNOWN: can't connect to nagiosd: %s" % e
+            else:
+                # nagiosd is not running, check in this process instead
+                load_plugin(modname)().run(options.args)
+        print output
+        sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,156 @@
+'''
+Created on Oct 18, 2026
+
+a small Redis client speaking RESP, the Redis serialization protocol. the
+commands are pipelined, i.e. all written before reading any reply, so a
+batch of them costs one network round-trip. connections are pooled per
+server, password and database for the following checks of the process.
+'''
+import atexit
+import socket
+import threading
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 6379
+
+
+class RedisError(Exception):
+    ''' an error reply, i.e. -ERR unknown command '''
+    pass
+
+
+class AuthenticationError(RedisError):
+    pass
+
+
+def encode(args):
+    '''a command as a RESP array of bulk strings'''
+    parts = ["*%d\r\n" % len(args)]
+    for arg in args:
+        arg = str(arg)
+        parts.append("$%d\r\n%s\r\n" % (len(arg), arg))
+    return "".join(parts)
+
+
+def parse_info(text):
+    '''INFO reply as { field: value string }, the section headers left out'''
+    info = {}
+    for l in text.splitlines():
+        if l and not l.startswith("#") and ":" in l:
+            k, v = l.split(":", 1)
+            info[k] = v
+    return info
+
+
+class Connection(object):
+    def __init__(self, host=None, port=None, password=None, database=None, timeout=10):
+        self.sock = socket.create_connection((host or DEFAULT_HOST, port or DEFAULT_PORT), timeout)
+        self.rfile = self.sock.makefile("rb")
+        try:
+            setup = []
+            if password:
+                setup.append(("AUTH", password))
+            if database:
+                setup.append(("SELECT", database))
+            if setup:
+                self.pipeline(setup)
+        except:
+            self.sock.close()
+            raise
+
+    def read_reply(self):
+        line = self.rfile.readline()
+        if not line.endswith("\r\n"):
+            raise socket.error("connection closed by server")
+        kind, line = line[0], line[1:-2]
+        if kind == "+":
+            return line
+        elif kind == "-":
+            if line.startswith(("NOAUTH", "WRONGPASS")) or "invalid password" in line:
+                return AuthenticationError(line)
+            return RedisError(line)
+        elif kind == ":":
+            return int(line)
+        elif kind == "$":
+            length = int(line)
+            if length < 0:
+                return None
+            data = self.rfile.read(length + 2)
+            if len(data) < length + 2:
+                raise socket.error("connection closed by server")
+            return data[:-2]
+        elif kind == "*":
+            length = int(line)
+            if length < 0:
+                return None
+            return [self.read_reply() for _ in xrange(length)]
+        raise RedisError("unexpected reply %r" % (kind + line))
+
+    def pipeline(self, commands):
+        '''send all the commands at once, return their replies in order.
+           raise the first error reply, after reading all of them to keep
+           the connection usable'''
+        self.sock.sendall("".join(encode(c) for c in commands))
+        replies = [self.read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def close(self):
+        self.sock.close()
+
+
+# idle connections by (host, port, password, database)
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def connect(host=None, port=None, password=None, database=None, timeout=10):
+    '''take an idle connection out of the pool, or connect anew'''
+    key = (host, port, password, database)
+    with _pool_lock:
+        idle = _pool.get(key)
+        if idle:
+            return key, idle.pop(), True
+    return key, Connection(host, port, password, database, timeout), False
+
+
+def release(key, connection):
+    with _pool_lock:
+        _pool.setdefault(key, []).append(connection)
+
+
+def close_all():
+    with _pool_lock:
+        connections = [c for idle in _pool.itervalues() for c in idle]
+        _pool.clear()
+    for c in connections:
+        c.close()
+
+
+# the pooled connections are closed as the process exits, the daemon's too
+atexit.register(close_all)
+
+
+def pipeline(commands, host=None, port=None, password=None, database=None, timeout=10):
+    '''run the commands in one round-trip on a pooled connection, a stale
+       pooled connection is replaced once'''
+    key, connection, pooled = connect(host, port, password, database, timeout)
+    try:
+        replies = connection.pipeline(commands)
+    except socket.error:
+        connection.close()
+        if not pooled:
+            raise
+        # the server has closed the idle connection, i.e. timeout in redis.conf
+        return pipeline(commands, host, port, password, database, timeout)
+    except RedisError:
+        release(key, connection)
+        raise
+    release(key, connection)
+    return replies
+
+
+def execute(*args, **kwargs):
+    return pipeline([args], **kwargs)[0]
@@ -0,0 +1,142 @@
+'''
+Created on Oct 18, 2026
+
+send one request to many servers at once over non-blocking sockets and
+collect the replies, for the text protocols where the server answers and
+closes the connection (memcached with a trailing quit, zookeeper four
+letter words). one select loop serves all the servers, so the time taken
+is about the one of the slowest server rather than the sum of them.
+'''
+import time
+import errno
+import select
+import socket
+
+
+def parse_target(target, default_port):
+    '''host[:port] as (host, port). an IPv6 address is bracketed to be
+       given a port, [::1]:11211, or bare for the default port. raise
+       ValueError if the host is missing or the port isn't one'''
+    target = target.strip()
+    if target.startswith("["):
+        host, _, port = target[1:].partition("]")
+        if port and not port.startswith(":"):
+            raise ValueError("bad target %r, expecting [address]:port" % target)
+        port = port[1:]
+    elif target.count(":") > 1:
+        host, port = target, ""
+    else:
+        host, _, port = target.partition(":")
+    if not host:
+        raise ValueError("no host in %r" % target)
+    if not port:
+        return host, default_port
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError("bad port %r in %r" % (port, target))
+    return host, int(port)
+
+
+def parse_targets(targets, default_port):
+    '''comma separated host[:port] as a list of (host, port)'''
+    return [parse_target(t, default_port) for t in targets.split(",") if t.strip()]
+
+
+def format_target(address):
+    '''(host, port) as host:port, or [host]:port for an IPv6 address'''
+    if ":" in address[0]:
+        return "[%s]:%s" % address
+    return "%s:%s" % address
+
+
+class _Exchange(object):
+    def __init__(self, address, payload):
+        self.address = address
+        self.payload = payload
+        self.chunks = []
+        self.error = None
+        self.sock = None
+        try:
+            family, socktype, proto, _, sockaddr = socket.getaddrinfo(
+                address[0], address[1], 0, socket.SOCK_STREAM)[0]
+            self.sock = socket.socket(family, socktype, proto)
+            self.sock.setblocking(0)
+            err = self.sock.connect_ex(sockaddr)
+            if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+                raise socket.error(err, "%s connecting to %s:%s" % (errno.errorcode.get(err, err),
+                                                                    address[0], address[1]))
+        except socket.error, e:
+            self.fail(e)
+
+    @property
+    def done(self):
+        return self.sock is None
+
+    @property
+    def sending(self):
+        return len(self.payload) > 0
+
+    def fail(self, error):
+        self.error = error
+        self.close()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def on_writable(self):
+        err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            return self.fail(socket.error(err, "%s connecting to %s:%s" % (
+                errno.errorcode.get(err, err), self.address[0], self.address[1])))
+        sent = self.sock.send(self.payload)
+        self.payload = self.payload[sent:]
+
+    def on_readable(self):
+        data = self.sock.recv(65536)
+        if data:
+            self.chunks.append(data)
+        else:
+            # the server has answered and closed the connection
+            self.close()
+
+    @property
+    def result(self):
+        return self.error if self.error is not None else "".join(self.chunks)
+
+
+def query_all(addresses, payload, timeout=10):
+    '''send payload to every (host, port), read until the server closes the
+       connection. return { (host, port): reply, or the socket.error }'''
+    exchanges = [_Exchange(address, payload) for address in addresses]
+    deadline = time.time() + timeout
+    while True:
+        pending = [x for x in exchanges if not x.done]
+        remaining = deadline - time.time()
+        if not pending or remaining <= 0:
+            break
+        readers = [x.sock for x in pending if not x.sending]
+        writers = [x.sock for x in pending if x.sending]
+        by_sock = dict((x.sock, x) for x in pending)
+        try:
+            readable, writable, _ = select.select(readers, writers, [], remaining)
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        for sock in writable + readable:
+            x = by_sock[sock]
+            if x.done:
+                continue
+            try:
+                if sock in writable:
+                    x.on_writable()
+                else:
+                    x.on_readable()
+            except socket.error, e:
+                if e.args[0] not in (errno.EWOULDBLOCK, errno.EAGAIN, errno.EINTR):
+                    x.fail(e)
+    for x in exchanges:
+        if not x.done:
+            x.fail(socket.timeout("timed out after %ss querying %s:%s" % (timeout, x.address[0], x.address[1])))
+    return dict((x.address, x.result) for x in exchanges)
@@ -0,0 +1,94 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import shutil
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+from check_apache import ApacheChecker, parse_server_status
+
+SERVER_STATUS = """localhost
+ServerVersion: Apache/2.4.18 (Ubuntu)
+ServerMPM: event
+Total Accesses: 1200
+Total kBytes: 3400
+CPULoad: .0123
+Uptime: 600
+ReqPerSec: 2
+BytesPerSec: 5802.67
+BytesPerReq: 2901.33
+BusyWorkers: 3
+IdleWorkers: 47
+Scoreboard: __W_K_R.........____WKKC....................
+"""
+
+
+class FakeApacheHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(SERVER_STATUS)))
+        self.end_headers()
+        self.wfile.write(SERVER_STATUS)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestApacheChecker(unittest.TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), FakeApacheHandler)
+        self.server.paths = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.rootdir = tempfile.mkdtemp()
+        self.args = ["-H", "127.0.0.1", "-P", str(self.server.server_address[1]), "-d", self.rootdir]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.rootdir)
+
+    def test_parse_server_status(self):
+        stats = parse_server_status(SERVER_STATUS)
+        self.assertEqual(0.0123, stats["CPULoad"])
+        self.assertEqual(1200, stats["Total Accesses"])
+        self.assertEqual(8, stats["scoreboard@waiting"])
+        self.assertEqual(0, stats["scoreboard@logging"])
+        self.assertEqual(len("__W_K_R.........____WKKC...................."),
+                         sum(v for k, v in stats.iteritems() if k.startswith("scoreboard@")))
+
+    def test_scoreboard_one_fetch(self):
+        options = "scoreboard__,scoreboard_k,scoreboard_.,busy_workers,total_accesses_rate"
+        result = ApacheChecker().execute(["-t", options, "--multiple-output", "lines"] + self.args)
+        self.assertEqual([8, 3, 29, 3, 0.0], [r["value"] for r in result.results])
+        self.assertEqual("SCOREBOARD_K OK: Keepalive: 3 | scoreboard_k=3", str(result.results[1]))
+        self.assertEqual(["/server-status?auto"], self.server.paths)
+
+    def test_critical(self):
+        options = "scoreboard__,scoreboard_k,busy_workers,scoreboard"
+        result = ApacheChecker().execute(["-t", options, "-W", "3", "-C", "5", "--multiple-output", "lines"]
+                                         + self.args)
+        self.assertEqual(["CRITICAL", "WARNING", "WARNING", "WARNING"], [r.status for r in result.results])
+        self.assertEqual("SCOREBOARD__ CRITICAL: Waiting for connection: 8 | scoreboard__=8;3.0;5.0", str(result.results[0]))
+        result = ApacheChecker().execute(["-t", "busy_workers", "-C", "3"] + self.args)
+        self.assertEqual("CRITICAL", result.status)
+
+    def test_cached_snapshot(self):
+        for option in ("idle_workers", "scoreboard"):
+            result = ApacheChecker().execute(["-t", option, "-W", "2"] + self.args)
+        self.assertEqual("WARNING", result.status)
+        self.assertEqual(12, len(result.perf_data_list))
+        self.assertEqual(1, len(self.server.paths))
+
+if __name__ == "__main__":
+    unittest.main()
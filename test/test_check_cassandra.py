@@ -0,0 +1,131 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import shutil
+import tempfile
+import unittest
+from check_cassandra import CassandraChecker, parse_cfstats
+
+# as of cassandra 2.0
+CFSTATS = """Keyspace: system
+\tRead Count: 120
+\tPending Tasks: 7
+\t\tColumn Family: local
+\t\tSSTable count: 2
+\t\tMemtable Columns Count: 10
+\t\tMemtable Data Size: 2048
+\t\tMemtable Switch Count: 3
+\t\tPending Tasks: 1
+\t\tBloom Filter False Positives: 0
+\t\tBloom Filter False Ratio: 0.00000
+\t\tBloom Filter Space Used: 16
+\t\tAverage live cells per slice (last five minutes): NaN
+\t\tColumn Family: peers
+\t\tMemtable Columns Count: 4
+\t\tMemtable Data Size: 512
+\t\tMemtable Switch Count: 1
+\t\tPending Tasks: 0
+\t\tBloom Filter False Positives: 2
+\t\tBloom Filter Space Used: 24
+----------------
+Keyspace: shop
+\tRead Count: 99
+\t\tColumn Family: orders
+\t\tMemtable Columns Count: 100
+\t\tMemtable Data Size: 40960
+\t\tMemtable Switch Count: 12
+\t\tPending Tasks: 2
+\t\tBloom Filter False Positives: 5
+\t\tBloom Filter Space Used: 1024
+----------------
+"""
+
+# as of cassandra 3.0
+CFSTATS_3 = """Keyspace : shop
+\tRead Count: 99
+\tPending Flushes: 0
+\t\tTable: orders
+\t\tMemtable cell count: 100
+\t\tMemtable data size: 40960
+\t\tMemtable switch count: 12
+\t\tPending flushes: 2
+\t\tBloom filter false positives: 5
+\t\tBloom filter space used: 1024
+\t\tLocal read latency: 0.250 ms
+----------------
+"""
+
+
+class TestCassandraChecker(unittest.TestCase):
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp()
+        self.bindir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+        shutil.rmtree(self.bindir)
+
+    # a nodetool printing output and counting its runs in bindir/runs
+    def fake_nodetool(self, output, exit_code=0):
+        with open(os.path.join(self.bindir, "cfstats.txt"), "w") as f:
+            f.write(output)
+        path = os.path.join(self.bindir, "nodetool")
+        with open(path, "w") as f:
+            f.write('#!/bin/sh\necho run >> "%s/runs"\ncat "%s/cfstats.txt"\nexit %d\n'
+                    % (self.bindir, self.bindir, exit_code))
+        os.chmod(path, 0755)
+
+    def runs(self):
+        return len(open(os.path.join(self.bindir, "runs")).readlines())
+
+    def execute(self, *args):
+        return CassandraChecker().execute(list(args) + ["-L", self.bindir, "-d", self.rootdir])
+
+    def test_parse_cfstats(self):
+        tree = parse_cfstats(CFSTATS)
+        self.assertEqual(["shop", "system"], sorted(tree))
+        self.assertEqual(["local", "peers"], sorted(tree["system"]))
+        self.assertEqual(2048, tree["system"]["local"]["memtable data size"])
+        self.assertEqual(0.0, tree["system"]["local"]["bloom filter false ratio"])
+        self.assertFalse("average live cells per slice (last five minutes)" in tree["system"]["local"])
+        self.assertEqual(0.25, parse_cfstats(CFSTATS_3)["shop"]["orders"]["local read latency"])
+
+    def test_all_metrics_one_run(self):
+        self.fake_nodetool(CFSTATS)
+        result = self.execute("-t", "ALL")
+        values = dict((r.name, r["value"]) for r in result.results)
+        self.assertEqual({"BLOOM_FILTER_SPACE_USED": 1064, "BLOOM_FILTER_FALSE_POSITIVES": 7,
+                          "BLOOM_FILTER_FALSE_RATIO": 0, "PENDING_TASKS": 3, "MEMTABLE_SWITCH_COUNT": 16,
+                          "MEMTABLE_DATA_SIZE": 43520, "MEMTABLE_COLUMNS_COUNT": 114}, values)
+        self.assertEqual(1, self.runs())
+
+    def test_cached_between_checks(self):
+        self.fake_nodetool(CFSTATS)
+        for option in ("pending_tasks", "memtable_data_size", "memtable_switch_count"):
+            result = self.execute("-t", option, "-W", "10", "-C", "15")
+        self.assertEqual("CRITICAL", result.status)
+        self.assertEqual(1, self.runs())
+
+    def test_keyspaces(self):
+        self.fake_nodetool(CFSTATS_3)
+        result = self.execute("-t", "memtable_columns_count", "--keyspaces")
+        self.assertEqual("MEMTABLE_COLUMNS_COUNT OK: Total Columns Count: 100"
+                         " | memtable_columns_count=100 shop=100", str(result))
+        self.fake_nodetool(CFSTATS)
+        result = self.execute("-t", "pending_tasks", "--keyspaces", "--cache-ttl", "0")
+        self.assertEqual("PENDING_TASKS OK: Total Pending Tasks: 3 | pending_tasks=3 shop=2 system=1", str(result))
+
+    def test_nodetool_failing(self):
+        self.fake_nodetool("nodetool: Failed to connect to '127.0.0.1:7199'", exit_code=1)
+        result = self.execute("-t", "pending_tasks")
+        self.assertEqual("CRITICAL", result.status)
+        self.assertTrue("Failed to connect" in result.message)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+from check_elasticsearch import ElasticsearchChecker, parse_nodes_stats, parse_cat_indices
+
+HEALTH = {"cluster_name": "es", "status": "yellow", "timed_out": False,
+          "number_of_nodes": 2, "number_of_data_nodes": 2, "active_primary_shards": 6,
+          "active_shards": 10, "relocating_shards": 0, "initializing_shards": 0,
+          "unassigned_shards": 2}
+
+NODES = {"nodes": {
+    "a1": {"name": "es-1", "jvm": {"mem": {"heap_used_percent": 41}}, "os": {"cpu": {"percent": 12}}},
+    "b2": {"name": "es 2", "jvm": {"mem": {"heap_used_percent": 77}}, "os": {"cpu_percent": 3}},
+}}
+
+INDICES = [
+    {"index": "logs", "health": "yellow", "pri": "5", "docs.count": "1200"},
+    {"index": "users", "health": "green", "pri": "1", "docs.count": "34"},
+    {"index": "old", "health": "red", "pri": None, "docs.count": None},
+]
+
+PAGES = {
+    "/_cluster/health": HEALTH,
+    "/_nodes/stats/jvm,os": NODES,
+    "/_cat/indices?format=json&h=index,health,pri,docs.count": INDICES,
+}
+
+
+class FakeElasticsearchHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.path not in PAGES:
+            self.send_error(404)
+            return
+        body = json.dumps(PAGES[self.path])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestElasticsearchChecker(unittest.TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), FakeElasticsearchHandler)
+        self.server.paths = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.rootdir = tempfile.mkdtemp()
+        self.args = ["-H", "127.0.0.1", "-P", str(self.server.server_address[1]), "-d", self.rootdir]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.rootdir)
+
+    def test_parse_nodes_stats(self):
+        self.assertEqual({"heap_used_percent": 77, "heap_used_percent@es-1": 41, "heap_used_percent@es_2": 77,
+                          "cpu_percent": 12, "cpu_percent@es-1": 12, "cpu_percent@es_2": 3},
+                         parse_nodes_stats(NODES))
+
+    def test_parse_cat_indices(self):
+        self.assertEqual({"docs_count": 1234, "docs_count@logs": 1200, "docs_count@users": 34,
+                          "active_primary_shards@logs": 5, "active_primary_shards@users": 1},
+                         parse_cat_indices(INDICES))
+
+    def test_less_and_greater(self):
+        result = ElasticsearchChecker().execute(["-t", "number_of_nodes", "-W", "3", "-C", "1"] + self.args)
+        self.assertEqual("NUMBER_OF_NODES WARNING: Number of nodes: 2 | number_of_nodes=2;3.0;1.0", str(result))
+        result = ElasticsearchChecker().execute(["-t", "unassigned_shards", "-W", "1", "-C", "2"] + self.args)
+        self.assertEqual("CRITICAL", result.status)
+        result = ElasticsearchChecker().execute(["-t", "number_of_nodes", "-C", "2"] + self.args)
+        self.assertEqual("CRITICAL", result.status)
+        self.assertEqual(["/_cluster/health"], self.server.paths)
+
+    def test_all_metrics_one_fetch_per_endpoint(self):
+        result = ElasticsearchChecker().execute(["-t", "ALL", "--nodes", "--indices"] + self.args)
+        results = dict((r.name, r) for r in result.results)
+        self.assertEqual("WARNING", results["STATUS"].status)
+        self.assertEqual("Cluster health status: yellow (logs, old)", results["STATUS"].message)
+        self.assertEqual("HEAP_USED_PERCENT OK: Highest JVM heap used percent of a node: 77"
+                         " | heap_used_percent=77 es-1=41 es_2=77", str(results["HEAP_USED_PERCENT"]))
+        self.assertEqual(1234, results["DOCS_COUNT"]["value"])
+        self.assertEqual([("logs", 5), ("users", 1)],
+                         [(pd["label"], pd["value"]) for pd in results["ACTIVE_PRIMARY_SHARDS"].perf_data_list[1:]])
+        self.assertEqual(3, len(self.server.paths))
+        self.assertEqual(sorted(PAGES), sorted(self.server.paths))
+
+    def test_all_metrics_of_the_endpoints_asked_for(self):
+        result = ElasticsearchChecker().execute(["-t", "ALL"] + self.args)
+        self.assertEqual("WARNING", result.status)
+        names = [r.name for r in result.results]
+        self.assertTrue("NUMBER_OF_NODES" in names)
+        self.assertFalse("HEAP_USED_PERCENT" in names or "DOCS_COUNT" in names)
+        result = ElasticsearchChecker().execute(["-t", "ALL", "--nodes"] + self.args)
+        names = [r.name for r in result.results]
+        self.assertTrue("HEAP_USED_PERCENT" in names and "CPU_PERCENT" in names)
+        self.assertFalse("DOCS_COUNT" in names)
+
+    def test_cached_snapshot(self):
+        for option in ("status", "active_shards", "relocating_shards"):
+            result = ElasticsearchChecker().execute(["-t", option] + self.args)
+        self.assertEqual("OK", result.status)
+        self.assertEqual(1, len(self.server.paths))
+
+    def test_needs_endpoint(self):
+        result = ElasticsearchChecker().execute(["-t", "cpu_percent"] + self.args)
+        self.assertEqual("UNKNOWN", result.status)
+        self.assertTrue("--nodes" in result.message)
+        self.assertEqual([], self.server.paths)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import base64
+import shutil
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+from check_haproxy import HAProxyChecker, aggregate_stats
+
+STATS_CSV = """# pxname,svname,qcur,qmax,scur,smax,slim,stot,bin,bout,dreq,dresp,ereq,econ,eresp,wretr,wredis,status,
+www,FRONTEND,,,10,20,2000,500,0,0,0,0,7,,,,,OPEN,
+www,web1,0,0,4,8,,200,0,0,,0,,1,2,0,0,UP,
+www,web2,1,1,5,9,,290,0,0,,0,,0,1,0,0,UP,
+www,BACKEND,1,1,9,17,200,490,0,0,0,0,,1,3,0,0,UP,
+api,FRONTEND,,,3,5,2000,60,0,0,0,0,2,,,,,OPEN,
+api,BACKEND,0,0,3,5,200,60,0,0,0,0,,0,0,0,0,UP,
+"""
+
+
+class FakeHAProxyHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.headers.get("Authorization") != "Basic " + base64.b64encode("guest:guest"):
+            self.send_response(401)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.end_headers()
+        self.wfile.write(STATS_CSV)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHAProxyChecker(unittest.TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), FakeHAProxyHandler)
+        self.server.paths = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.rootdir = tempfile.mkdtemp()
+        self.args = ["-H", "127.0.0.1", "-P", str(self.server.server_address[1]), "-L", "haproxy?stats",
+                     "-d", self.rootdir]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.rootdir)
+
+    def test_aggregate_stats(self):
+        stats = aggregate_stats(STATS_CSV.splitlines(True))
+        self.assertEqual(34, stats["scur"])
+        self.assertEqual((9, 3), (stats["scur@www"], stats["scur@api"]))
+        # frontends only
+        self.assertEqual((7, 2), (stats["ereq@www"], stats["ereq@api"]))
+        stats = aggregate_stats(STATS_CSV.splitlines(True), ["ap*"])
+        self.assertEqual(6, stats["scur"])
+        self.assertFalse("scur@www" in stats)
+
+    def test_all_metrics_one_fetch(self):
+        result = HAProxyChecker().execute(["-t", "ALL", "--multiple-output", "lines"] + self.args)
+        self.assertEqual([2, 9, 6, 2, 34, 1600], [r["value"] for r in result.results])
+        self.assertEqual("QCUR OK: Total current queues: 2 | qcur=2 api=0 www=1", str(result.results[3]))
+        self.assertEqual(["/haproxy?stats;csv"], self.server.paths)
+
+    def test_cached_snapshot(self):
+        for option in ("scur", "stot"):
+            result = HAProxyChecker().execute(["-t", option, "--proxy", "www", "-W", "2000"] + self.args)
+        self.assertEqual("STOT OK: Total sessions: 1480 | stot=1480;2000.0 www=490;2000.0", str(result))
+        self.assertEqual(1, len(self.server.paths))
+
+    def test_critical(self):
+        result = HAProxyChecker().execute(["-t", "scur", "-W", "10", "-C", "30"] + self.args)
+        self.assertEqual("SCUR CRITICAL: Total current sessions: 34 | scur=34;10.0;30.0 api=3;10.0;30.0"
+                         " www=9;10.0;30.0", str(result))
+        result = HAProxyChecker().execute(["-t", "scur", "-W", "10", "-C", "40"] + self.args)
+        self.assertEqual("WARNING", result.status)
+        result = HAProxyChecker().execute(["-t", "scur", "-C", "30"] + self.args)
+        self.assertEqual("CRITICAL", result.status)
+
+    def test_unauthorized(self):
+        result = HAProxyChecker().execute(["-t", "scur", "-p", "wrong"] + self.args)
+        self.assertEqual("UNKNOWN", result.status)
+        self.assertTrue("401" in result.message)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+import SocketServer
+from check_jenkins import JenkinsChecker, ENDPOINTS
+
+DOCUMENTS = {
+    "jenkins": {"mode": "NORMAL", "quietingDown": False, "useCrumbs": True,
+                "views": [{"name": "All"}, {"name": "nightly"}]},
+    "queue": {"items": [{"id": 7}, {"id": 8}, {"id": 9}]},
+    "computer": {"busyExecutors": 3, "totalExecutors": 4, "computer": [
+        {"displayName": "master", "offline": False, "executors": [{"idle": False}, {"idle": True}]},
+        {"displayName": "build agent", "offline": False, "executors": [{"idle": False}, {"idle": False}]},
+        {"displayName": "spare", "offline": True, "executors": []},
+    ]},
+}
+PAGES = dict(("/" + ENDPOINTS[name], document) for name, document in DOCUMENTS.iteritems())
+
+
+class FakeJenkinsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        # slow enough to tell concurrent requests from sequential ones
+        time.sleep(0.3)
+        body = json.dumps(PAGES[self.path])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class TestJenkinsChecker(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeJenkinsHandler)
+        self.server.paths = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.rootdir = tempfile.mkdtemp()
+        self.args = ["-H", "127.0.0.1", "-P", str(self.server.server_address[1]), "-d", self.rootdir]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.rootdir)
+
+    def test_all_metrics_one_concurrent_fetch(self):
+        start = time.time()
+        result = JenkinsChecker().execute(["-t", "ALL", "-W", "3"] + self.args)
+        self.assertTrue(time.time() - start < 0.8)
+        values = dict((r.name, r["value"]) for r in result.results)
+        self.assertEqual({"MODE": "NORMAL", "QUIETINGDOWN": "False", "USECRUMBS": "True", "VIEWS": 2,
+                          "BUILDQUEUE": 3, "EXECUTORSUTILIZATION": 0.75}, values)
+        # views below and buildQueue at -W 3
+        self.assertEqual("WARNING", result.status)
+        self.assertEqual(sorted(PAGES), sorted(self.server.paths))
+
+    def test_executors_utilization_per_node(self):
+        result = JenkinsChecker().execute(["-t", "executorsUtilization", "-W", "0.8", "-C", "0.9"] + self.args)
+        self.assertEqual("EXECUTORSUTILIZATION OK: Executors Utilization (%): 0.75 | executorsUtilization=0.75;0.8;0.9"
+                         " build_agent=1.0;0.8;0.9 master=0.5;0.8;0.9", str(result))
+
+    def test_cached_snapshot(self):
+        for option in ("mode", "views", "buildQueue"):
+            result = JenkinsChecker().execute(["-t", option, "-W", "5"] + self.args)
+        self.assertEqual("OK", result.status)
+        self.assertEqual(3, len(self.server.paths))
+
+if __name__ == "__main__":
+    unittest.main()
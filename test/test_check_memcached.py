@@ -9,38 +9,40 @@ _rootpath = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(_rootpath, ".."))
 
 import unittest
+import shutil
+import tempfile
 from test_plugin import TestPlugin
 from check_memcached import MemcachedChecker
 
 class TestMemcachedChecker(TestPlugin):
     def setUp(self):
         self.checker = MemcachedChecker()
-        try:
-            os.mkdir("./status/")
-        except OSError:
-            pass
+        self.rootdir = tempfile.mkdtemp()
         print 'check_memcached'
 
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
     def test_get_cmd_set(self):
-        self.assert_status("-t OPERATIONS_SET_REQUESTS -z memcached_test -d ./status/")
+        self.assert_status("-t OPERATIONS_SET_REQUESTS -z memcached_test -d " + self.rootdir)
 
     def test_get_cmd_get(self):
-        self.assert_status("-t OPERATIONS_GET_REQUESTS -z memcached_test -d ./status/")
+        self.assert_status("-t OPERATIONS_GET_REQUESTS -z memcached_test -d " + self.rootdir)
 
     def test_get_bytes_read(self):
-        self.assert_status("-t BYTES_READ -z memcached_test -d ./status/")
+        self.assert_status("-t BYTES_READ -z memcached_test -d " + self.rootdir)
 
     def test_get_bytes_written(self):
-        self.assert_status("-t BYTES_WRITTEN -z memcached_test -d ./status/")
+        self.assert_status("-t BYTES_WRITTEN -z memcached_test -d " + self.rootdir)
 
     def test_get_bytes_allocated(self):
-        self.assert_status("-t BYTES_ALLOCATED -z memcached_test -d ./status/")
+        self.assert_status("-t BYTES_ALLOCATED -z memcached_test -d " + self.rootdir)
 
     def test_get_total_items(self):
-        self.assert_status("-t TOTAL_ITEMS -z memcached_test -d ./status/")
+        self.assert_status("-t TOTAL_ITEMS -z memcached_test -d " + self.rootdir)
 
     def test_get_current_connections(self):
-        self.assert_status("-t CURRENT_CONNECTIONS -z memcached_test -d ./status/")
+        self.assert_status("-t CURRENT_CONNECTIONS -z memcached_test -d " + self.rootdir)
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
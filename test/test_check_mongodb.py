@@ -9,56 +9,103 @@ _rootpath = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(_rootpath, ".."))
 
 import unittest
+import shutil
+import tempfile
+import mock
 from test_plugin import TestPlugin
 from check_mongodb import MongoDBChecker
 
+# legacy shell output of a mongodb 2.2, NumberLongs as floatApprox
+STATUS_22 = ("MongoDB shell version: 2.2.7\n"
+    '{"version":"2.2.7","databases":3,"serverStatus":{"host":"db1","ok":1,'
+    '"connections":{"current":25,"available":75},'
+    '"globalLock":{"totalTime":{"floatApprox":2000},"lockTime":{"floatApprox":50},'
+    '"currentQueue":{"total":0,"readers":0,"writers":0}},'
+    '"opcounters":{"insert":10,"query":{"floatApprox":9007199254740993,"top":2097152,"bottom":1}},'
+    '"indexCounters":{"btree":{"accesses":4,"hits":4,"misses":0,"resets":0,"missRatio":0}}}}')
+
+STATUS_24 = STATUS_22.replace("2.2.7", "2.4.9").replace(
+    '{"btree":{"accesses":4,"hits":4,"misses":0,"resets":0,"missRatio":0}}',
+    '{"accesses":6,"hits":6,"misses":0,"resets":0,"missRatio":0}')
+
 class TestMongoDBChecker(TestPlugin):
     def setUp(self):
         self.checker = MongoDBChecker()
-        try:
-            os.mkdir("./status/")
-        except OSError:
-            pass
+        self.rootdir = tempfile.mkdtemp()
         print 'check_mongodb'
 
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
     def test_get_connections(self):
-        self.assert_status("-t CONNECTIONS -z mongodb_test -d ./status/")
+        self.assert_status("-t CONNECTIONS -z mongodb_test -d " + self.rootdir)
 
     def test_get_memory_used(self):
-        self.assert_status("-t MEMORY_USED -z mongodb_test -d ./status/")
+        self.assert_status("-t MEMORY_USED -z mongodb_test -d " + self.rootdir)
 
     def test_get_insert_rate(self):
-        self.assert_status("-t INSERT -z mongodb_test -d ./status/")
+        self.assert_status("-t INSERT -z mongodb_test -d " + self.rootdir)
 
     def test_get_update_rate(self):
-        self.assert_status("-t UPDATE -z mongodb_test -d ./status/")
+        self.assert_status("-t UPDATE -z mongodb_test -d " + self.rootdir)
 
     def test_get_command_rate(self):
-        self.assert_status("-t COMMAND -z mongodb_test -d ./status/")
+        self.assert_status("-t COMMAND -z mongodb_test -d " + self.rootdir)
 
     def test_get_query_rate(self):
-        self.assert_status("-t QUERY -z mongodb_test -d ./status/")
+        self.assert_status("-t QUERY -z mongodb_test -d " + self.rootdir)
 
     def test_get_delete_rate(self):
-        self.assert_status("-t DELETE -z mongodb_test -d ./status/")
+        self.assert_status("-t DELETE -z mongodb_test -d " + self.rootdir)
 
     def test_get_locked_ratio(self):
-        self.assert_status("-t LOCKED_PERCENTAGE -z mongodb_test -d ./status/")
+        self.assert_status("-t LOCKED_PERCENTAGE -z mongodb_test -d " + self.rootdir)
 
     def test_get_miss_ratio(self):
-        self.assert_status("-t MISS_PERCENTAGE -z mongodb_test -d ./status/")
+        self.assert_status("-t MISS_PERCENTAGE -z mongodb_test -d " + self.rootdir)
 
     def test_get_resets(self):
-        self.assert_status("-t RESETS -z mongodb_test -d ./status/")
+        self.assert_status("-t RESETS -z mongodb_test -d " + self.rootdir)
 
     def test_get_hits(self):
-        self.assert_status("-t HITS -z mongodb_test -d ./status/")
+        self.assert_status("-t HITS -z mongodb_test -d " + self.rootdir)
 
     def test_get_misses(self):
-        self.assert_status("-t MISSES -z mongodb_test -d ./status/")
+        self.assert_status("-t MISSES -z mongodb_test -d " + self.rootdir)
 
     def test_get_accesses(self):
-        self.assert_status("-t ACCESSES -z mongodb_test -d ./status/")
+        self.assert_status("-t ACCESSES -z mongodb_test -d " + self.rootdir)
+
+
+class TestMongoDBStatus(unittest.TestCase):
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp()
+        self.checker = MongoDBChecker()
+
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
+    def execute(self, option):
+        return self.checker.execute(["-t", option, "-d", self.rootdir])
+
+    @mock.patch.object(MongoDBChecker, "_get_batch_status", return_value=STATUS_22)
+    def test_status_fetched_once(self, get_batch_status):
+        result = self.execute("CONNECTIONS,CONNECTIONS_USED,LOCKED_PERCENTAGE,HITS,DATABASE_COUNT")
+        self.assertEqual([25, 25, 2.5, 0, 3], [r["value"] for r in result.results])
+        self.assertEqual(1, get_batch_status.call_count)
+
+    @mock.patch.object(MongoDBChecker, "_get_batch_status", return_value=STATUS_24)
+    def test_index_counters_saved_before(self, get_batch_status):
+        # the hits of a 2.4 used to be saved as indexCounters.btree.hits
+        request = self.checker.parse_args(["-t", "HITS", "-d", self.rootdir])
+        self.checker.save_status(request, {"indexCounters.btree.hits": 5})
+        self.assertEqual(0, self.execute("HITS")["value"])
+        get_batch_status.return_value = STATUS_24.replace('"hits":6', '"hits":9')
+        self.assertEqual(3, MongoDBChecker().execute(["-t", "HITS", "-d", self.rootdir])["value"])
+
+    @mock.patch.object(MongoDBChecker, "_get_batch_status", return_value=STATUS_22)
+    def test_number_long(self, get_batch_status):
+        self.assertEqual(2 ** 53 + 1, self.execute("QUERY")["value"])
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,95 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import socket
+import shutil
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+from check_nginx import NginxChecker, parse_stub_status
+
+STUB_STATUS = """Active connections: 291
+server accepts handled requests
+ 16630948 16630940 31070465
+Reading: 6 Writing: 179 Waiting: 106
+"""
+
+
+class FakeNginxHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(STUB_STATUS)))
+        self.end_headers()
+        self.wfile.write(STUB_STATUS)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestNginxChecker(unittest.TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), FakeNginxHandler)
+        self.server.paths = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.rootdir = tempfile.mkdtemp()
+        self.args = ["-H", "127.0.0.1", "-P", str(self.server.server_address[1]), "-d", self.rootdir]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.rootdir)
+
+    def test_parse_stub_status(self):
+        self.assertEqual({"active_connections": 291, "accepts": 16630948, "handled": 16630940,
+                          "requests": 31070465, "reading": 6, "writing": 179, "waiting": 106},
+                         parse_stub_status(STUB_STATUS))
+        self.assertEqual(None, parse_stub_status("<html>404 Not Found</html>"))
+
+    def test_all_metrics_one_fetch(self):
+        result = NginxChecker().execute(["-t", "ALL", "-W", "100"] + self.args)
+        values = dict((r.name, r["value"]) for r in result.results)
+        self.assertEqual(291, values["ACTIVE_CONNECTIONS"])
+        self.assertEqual(106, values["WAITING"])
+        self.assertEqual(0.0, values["HANDLED_REQUESTS_RATE"])
+        self.assertEqual("WARNING", result.status)
+        self.assertEqual(["/status"], self.server.paths)
+
+    def test_critical(self):
+        result = NginxChecker().execute(["-t", "active_connections", "-W", "100", "-C", "200"] + self.args)
+        self.assertEqual("ACTIVE_CONNECTIONS CRITICAL: 291 active connections"
+                         " | active_connections=291;100.0;200.0", str(result))
+        result = NginxChecker().execute(["-t", "active_connections", "-C", "200"] + self.args)
+        self.assertEqual("ACTIVE_CONNECTIONS CRITICAL: 291 active connections"
+                         " | active_connections=291;;200.0", str(result))
+
+    def test_cached_snapshot(self):
+        for option in ("reading", "writing", "requests_per_connection"):
+            result = NginxChecker().execute(["-t", option] + self.args)
+        self.assertEqual("REQUESTS_PER_CONNECTION OK: 1.87 requests per connection | req_per_conn=1.86823264349",
+                         str(result))
+        self.assertEqual(1, len(self.server.paths))
+
+    def test_unreachable(self):
+        # nothing listens on a port just closed
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = str(sock.getsockname()[1])
+        sock.close()
+        args = ["-t", "waiting", "-H", "127.0.0.1", "-P", port, "-d", self.rootdir, "--timeout", "1"]
+        result = NginxChecker().execute(args)
+        self.assertEqual("UNKNOWN", result.status)
+        self.assertTrue("Connection refused" in result.message)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+from check_opentsdb import OpenTSDBChecker, index_stats, parse_selector, stat_key
+
+
+def stat(metric, value, **tags):
+    tags.setdefault("host", "tsd1")
+    return {"metric": metric, "timestamp": 1415318500, "value": str(value), "tags": tags}
+
+STATS = [
+    stat("tsd.connectionmgr.connections", 4, type="open"),
+    stat("tsd.connectionmgr.connections", 120, type="total"),
+    stat("tsd.rpc.received", 300, type="put"),
+    stat("tsd.rpc.received", 25, type="http"),
+    stat("tsd.rpc.received", 5, type="http", host="tsd2"),
+    stat("tsd.hbase.rpcs", 1000, type="get"),
+    stat("tsd.jvm.ramused", 83886080),
+]
+
+
+class FakeOpenTSDBHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        body = json.dumps(self.server.stats)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOpenTSDBChecker(unittest.TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), FakeOpenTSDBHandler)
+        self.server.paths = []
+        self.server.stats = STATS
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.rootdir = tempfile.mkdtemp()
+        self.args = ["-H", "127.0.0.1", "-P", str(self.server.server_address[1]), "-d", self.rootdir]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.rootdir)
+
+    def test_index_stats(self):
+        index = index_stats(STATS)
+        self.assertEqual(30, index[stat_key("tsd.rpc.received", {"type": "http"})])
+        self.assertEqual(25, index[stat_key("tsd.rpc.received", {"type": "http", "host": "tsd1"})])
+        self.assertEqual(325, index[stat_key("tsd.rpc.received", {"host": "tsd1"})])
+        self.assertEqual(330, index[stat_key("tsd.rpc.received", {})])
+
+    def test_parse_selector(self):
+        self.assertEqual(("tsd.rpc.received", {"type": "put", "host": "tsd1"}, False),
+                         parse_selector("tsd.rpc.received:type=put:host=tsd1"))
+        self.assertEqual(("tsd.jvm.ramused", {}, True), parse_selector("rate:tsd.jvm.ramused"))
+        self.assertEqual(None, parse_selector("open_connection"))
+        self.assertEqual(None, parse_selector("tsd.rpc.received:type"))
+
+    def test_named_metrics_and_selectors_one_fetch(self):
+        result = OpenTSDBChecker().execute(["-t", "open_connections,http,compactions,tsd.rpc.received:type=put",
+                                            "-W", "200"] + self.args)
+        values = dict((r.name, r["value"]) for r in result.results)
+        self.assertEqual({"OPEN_CONNECTIONS": 4, "HTTP": 30, "COMPACTIONS": 0,
+                          "TSD.RPC.RECEIVED_TYPE_PUT": 300}, values)
+        self.assertEqual("WARNING", result.status)
+        self.assertEqual("TSD.RPC.RECEIVED_TYPE_PUT WARNING: tsd.rpc.received type=put: 300"
+                         " | tsd.rpc.received_type_put=300;200.0", str(result.results[3]))
+        self.assertTrue(" tsd.rpc.received_type_put.tsd.rpc.received_type_put=300;200.0" in str(result))
+        self.assertEqual(["/api/stats"], self.server.paths)
+
+    def test_rates(self):
+        args = ["-t", "get_rate,rate:tsd.rpc.received:type=http", "--cache-ttl", "0"] + self.args
+        result = OpenTSDBChecker().execute(args)
+        self.assertEqual([0.0, 0.0], [r["value"] for r in result.results])
+        time.sleep(0.2)
+        self.server.stats = STATS + [stat("tsd.hbase.rpcs", 100, type="get", host="tsd2"),
+                                     stat("tsd.rpc.received", 20, type="http", host="tsd3")]
+        result = OpenTSDBChecker().execute(args)
+        get_rate, http_rate = [r["value"] for r in result.results]
+        self.assertTrue(100 < get_rate < 500, get_rate)
+        self.assertTrue(abs(get_rate / http_rate - 5) < 0.01)
+
+    def test_unknown_selector(self):
+        result = OpenTSDBChecker().execute(["-t", "tsd.no.such:type=x"] + self.args)
+        self.assertEqual("UNKNOWN", result.status)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,27 +8,77 @@ import os
 _rootpath = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(_rootpath, ".."))
 
+import mock
+import shutil
+import tempfile
 import unittest
 from test_plugin import TestPlugin
 from check_passenger import PassengerChecker
 
+STATUS_XML = ('<?xml version="1.0" encoding="iso8859-1" ?>\n<info version="3">'
+    '<passenger_version>5.0.30</passenger_version><process_count>3</process_count><max>6</max>'
+    '<capacity_used>3</capacity_used><get_wait_list_size>2</get_wait_list_size><supergroups>'
+    '<supergroup><name>/var/www/shop (production)</name><group><name>/var/www/shop (production)</name>'
+    '<capacity_used>2</capacity_used><get_wait_list_size>2</get_wait_list_size><processes>'
+    '<process><pid>101</pid><sessions>1</sessions><processed>50</processed><cpu>3</cpu><rss>102400</rss></process>'
+    '<process><pid>102</pid><sessions>0</sessions><processed>20</processed><cpu>0</cpu><rss>51200</rss></process>'
+    '</processes></group></supergroup><supergroup><name>/var/www/blog (production)</name><group>'
+    '<name>/var/www/blog (production)</name><capacity_used>1</capacity_used><get_wait_list_size>0</get_wait_list_size>'
+    '<processes><process><pid>201</pid><sessions>1</sessions><processed>9</processed><cpu>1</cpu><rss>10240</rss>'
+    '</process></processes></group></supergroup></supergroups></info>')
+
 class TestPassengerChecker(TestPlugin):
     def setUp(self):
         self.checker = PassengerChecker()
-        try:
-            os.mkdir("./status/")
-        except OSError:
-            pass
+        self.rootdir = tempfile.mkdtemp()
         print 'check_passenger'
 
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
     def test_get_max_procs(self):
-        self.assert_status("-t MAX_PROCESSES -z passenger_test -d ./status/")
+        self.assert_status("-t MAX_PROCESSES -z passenger_test -d " + self.rootdir)
 
     def test_get_procs(self):
-        self.assert_status("-t RUNNING_PROCESSES -z passenger_test -d ./status/")
+        self.assert_status("-t RUNNING_PROCESSES -z passenger_test -d " + self.rootdir)
 
     def test_get_active_procs(self):
-        self.assert_status("-t ACTIVE_PROCESSES -z passenger_test -d ./status/")
+        self.assert_status("-t ACTIVE_PROCESSES -z passenger_test -d " + self.rootdir)
+
+
+class TestPassengerXml(unittest.TestCase):
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
+    def check(self, option):
+        return PassengerChecker().execute(["-t", option, "-d", self.rootdir])
+
+    def test_parse_xml(self):
+        stats = dict(PassengerChecker()._parse_output(None, STATUS_XML))
+        self.assertEqual((3, 2, 1), (stats["count"], stats["active"], stats["inactive"]))
+        self.assertEqual(2, stats["count@var_www_shop_production"])
+        self.assertEqual(1, stats["active@var_www_blog_production"])
+        self.assertEqual(50, stats["process_processed@var_www_shop_production/101"])
+
+    @mock.patch.object(PassengerChecker, "_get_batch_status", return_value=STATUS_XML)
+    def test_group_perfdata(self, fetch):
+        self.assertEqual("ACTIVE_PROCESSES OK: 2 active processes | active=2 "
+                         "var_www_blog_production=1 var_www_shop_production=1",
+                         str(self.check("ACTIVE_PROCESSES")))
+        self.assertEqual(2, self.check("WAIT_LIST_SIZE")["value"])
+        memory = self.check("MEMORY_USED")
+        self.assertEqual(160, memory["value"])
+        self.assertEqual(4, len(memory.perf_data_list))
+        # passenger-status is run once for all the checks within --cache-ttl
+        self.assertEqual(1, fetch.call_count)
+
+    @mock.patch.object(PassengerChecker, "_get_batch_status",
+                       return_value="----- General information -----\nmax      = 6\ncount    = 3\nactive   = 1\n")
+    def test_text_output(self, fetch):
+        self.assertEqual(2, self.check("INACTIVE_PROCESSES")["value"])
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -9,53 +9,124 @@ _rootpath = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(_rootpath, ".."))
 
 import unittest
+import shutil
+import tempfile
+import mock
 from test_plugin import TestPlugin
 from check_postgresql import PostgresChecker
+import check_postgresql_92
+
+SNAPSHOT = """tup_fetched|postgres|100
+tup_fetched|app|1000
+tup_inserted|postgres|0
+tup_inserted|app|10
+xact_commit|postgres|90
+xact_commit|app|290
+xact_rollback|postgres|10
+xact_rollback|app|10
+size|postgres|6291456
+size|app|10485760
+lock|AccessShareLock|3
+lock|RowExclusiveLock|2
+lock|ExclusiveLock|1
+setting|max_connections|100
+activity|active|2
+activity|waiting|0
+activity|idle|3
+activity|total|5"""
 
 class TestPostgresChecker(TestPlugin):
     def setUp(self):
         self.checker = PostgresChecker()
-        try:
-            os.mkdir("./status/")
-        except OSError:
-            pass
+        self.rootdir = tempfile.mkdtemp()
         print 'check_postgresql'
 
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
     def test_get_connections_active(self):
-        self.assert_status("-t CONNECTIONS_ACTIVE -z postgres_test -d ./status/")
+        self.assert_status("-t CONNECTIONS_ACTIVE -z postgres_test -d " + self.rootdir)
 
     def test_get_connections_waiting(self):
-        self.assert_status("-t CONNECTIONS_WAITING -z postgres_test -d ./status/")
+        self.assert_status("-t CONNECTIONS_WAITING -z postgres_test -d " + self.rootdir)
 
     def test_get_conenctions_idle(self):
-        self.assert_status("-t CONNECTIONS_IDLE -z postgres_test -d ./status/")
+        self.assert_status("-t CONNECTIONS_IDLE -z postgres_test -d " + self.rootdir)
 
     def test_get_database_size(self):
-        self.assert_status("-t DATABASE_SIZE -z postgres_test -d ./status/")
+        self.assert_status("-t DATABASE_SIZE -z postgres_test -d " + self.rootdir)
 
     def test_get_locks_access(self):
-        self.assert_status("-t LOCKS_ACCESS -z postgres_test -d ./status/")
+        self.assert_status("-t LOCKS_ACCESS -z postgres_test -d " + self.rootdir)
 
     def test_get_locks_row(self):
-        self.assert_status("-t LOCKS_ROW -z postgres_test -d ./status/")
+        self.assert_status("-t LOCKS_ROW -z postgres_test -d " + self.rootdir)
 
     def test_get_locks_share(self):
-        self.assert_status("-t LOCKS_SHARE -z postgres_test -d ./status/")
+        self.assert_status("-t LOCKS_SHARE -z postgres_test -d " + self.rootdir)
 
     def test_get_locks_exclusive(self):
-        self.assert_status("-t LOCKS_EXCLUSIVE -z postgres_test -d ./status/")
+        self.assert_status("-t LOCKS_EXCLUSIVE -z postgres_test -d " + self.rootdir)
 
     def test_get_tuple_read(self):
-        self.assert_status("-t TUPLES_READ -z postgres_test -d ./status/")
+        self.assert_status("-t TUPLES_READ -z postgres_test -d " + self.rootdir)
 
     def test_get_tuple_inserted(self):
-        self.assert_status("-t TUPLES_INSERTED -z postgres_test -d ./status/")
+        self.assert_status("-t TUPLES_INSERTED -z postgres_test -d " + self.rootdir)
 
     def test_get_tuple_updated(self):
-        self.assert_status("-t TUPLES_UPDATED -z postgres_test -d ./status/")
+        self.assert_status("-t TUPLES_UPDATED -z postgres_test -d " + self.rootdir)
 
     def test_get_tuple_deleted(self):
-        self.assert_status("-t TUPLES_DELETED -z postgres_test -d ./status/")
+        self.assert_status("-t TUPLES_DELETED -z postgres_test -d " + self.rootdir)
+
+
+class TestPostgresSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
+    def execute(self, checker, option, output=SNAPSHOT):
+        with mock.patch.object(checker, "_get_query_status", return_value=output) as query:
+            result = checker.execute(["-t", option, "-d", self.rootdir])
+            self.assertEqual(1, query.call_count)
+        return result
+
+    def test_snapshot(self):
+        result = self.execute(PostgresChecker(), "ALL")
+        values = dict((r.name, r["value"]) for r in result.results)
+        self.assertEqual(16, values["DATABASE_SIZE"])
+        self.assertEqual(3, values["LOCKS_EXCLUSIVE"])
+        self.assertEqual(3, values["CONNECTIONS_IDLE"])
+        self.assertEqual(1100, values["TUPLES_READ"])
+
+    def test_size_only_on_demand(self):
+        checker = PostgresChecker()
+        with mock.patch.object(checker, "_get_query_status", return_value=SNAPSHOT) as query:
+            checker.execute(["-t", "TUPLES_READ,LOCKS_EXCLUSIVE", "-d", self.rootdir, "--cache-ttl", "60"])
+            self.assertFalse("pg_database_size" in query.call_args[0][0])
+            # not served from the snapshot without the sizes
+            result = checker.execute(["-t", "DATABASE_SIZE", "-d", self.rootdir, "--cache-ttl", "60"])
+            self.assertTrue("pg_database_size" in query.call_args[0][0])
+            self.assertEqual(16, result["value"])
+            self.assertEqual(2, query.call_count)
+
+    def test_no_rows(self):
+        result = self.execute(PostgresChecker(), "CONNECTIONS_IDLE", "")
+        self.assertEqual("CONNECTIONS_IDLE UNKNOWN: psql returned no rows", str(result))
+
+    def test_tuples_delta_by_database(self):
+        self.execute(PostgresChecker(), "TUPLES_READ")
+        output = SNAPSHOT.replace("tup_fetched|app|1000", "tup_fetched|app|1500")
+        result = self.execute(PostgresChecker(), "TUPLES_READ", output)
+        perfs = dict((pd["label"], pd["value"]) for pd in result.perf_data_list)
+        self.assertEqual({"total": 500, "app": 500, "postgres": 0}, perfs)
+
+    def test_92_ratios(self):
+        result = self.execute(check_postgresql_92.PostgresChecker(), "CONNECTIONS_UTILIZATION,COMMIT_RATIO")
+        self.assertEqual([5.0, 95.0], [r["value"] for r in result.results])
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,111 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import re
+import json
+import base64
+import shutil
+import urlparse
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+from check_rabbitmq import RabbitMQChecker, substrings_regex
+
+OVERVIEW = {"queue_totals": {"messages": 42, "messages_ready": 40, "messages_unacknowledged": 2},
+            "object_totals": {"channels": 3, "connections": 2, "consumers": 5, "exchanges": 9, "queues": 6}}
+
+QUEUES = [{"name": "orders", "messages": 10, "consumers": 1, "memory": 1000},
+          {"name": "orders.retry", "messages": 7, "consumers": 0, "memory": 1000},
+          {"name": "retry.orders.eu", "messages": 3, "consumers": 0, "memory": 1000},
+          {"name": "mail", "messages": 20, "consumers": 2, "memory": 1000},
+          {"name": "retry.mail", "messages": 2, "consumers": 0, "memory": 1000},
+          {"name": "fresh.retry.orders", "consumers": 0, "memory": 1000}]
+
+
+# pages the queues the way the management plugin does
+def page_queues(query):
+    queues = QUEUES
+    if "name" in query:
+        assert query["use_regex"] == "true"
+        queues = [q for q in queues if re.search(query["name"], q["name"])]
+    columns = query["columns"].split(",")
+    queues = [dict((k, v) for k, v in q.iteritems() if k in columns) for q in queues]
+    page, page_size = int(query["page"]), int(query["page_size"])
+    return {"items": queues[(page - 1) * page_size:page * page_size], "page": page,
+            "page_count": max(1, (len(queues) + page_size - 1) // page_size),
+            "filtered_count": len(queues), "item_count": len(QUEUES)}
+
+
+class FakeRabbitMQHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.headers.get("Authorization") != "Basic " + base64.b64encode("guest:guest"):
+            self.send_error(401)
+            return
+        path, sep, query = self.path.partition("?")
+        if path == "/api/overview":
+            body = json.dumps(OVERVIEW)
+        else:
+            body = json.dumps(page_queues(dict(urlparse.parse_qsl(query))))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRabbitMQChecker(unittest.TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), FakeRabbitMQHandler)
+        self.server.paths = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.rootdir = tempfile.mkdtemp()
+        self.args = ["-H", "127.0.0.1", "-P", str(self.server.server_address[1]), "-d", self.rootdir]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.rootdir)
+
+    def test_substrings_regex(self):
+        regex = substrings_regex(["orders", "retry"])
+        self.assertEqual(["orders.retry", "retry.orders.eu", "fresh.retry.orders"],
+                         [q["name"] for q in QUEUES if re.search(regex, q["name"])])
+
+    def test_overview_metrics_one_fetch(self):
+        result = RabbitMQChecker().execute(["-t", "messages,consumers,queues", "-w", "30"] + self.args)
+        self.assertEqual([42, 5, 6], [r["value"] for r in result.results])
+        self.assertEqual("WARNING", result.status)
+        self.assertEqual(["/api/overview"], self.server.paths)
+
+    def test_list_queues_paged(self):
+        result = RabbitMQChecker().execute(["-t", "list_queues", "-s", "orders,retry", "-w", "10", "-c", "50",
+                                            "--page-size", "2"] + self.args)
+        self.assertEqual("LIST_QUEUES WARNING: queues: fresh.retry.orders orders.retry retry.orders.eu"
+                         " | qitems=10;10;50 fresh.retry.orders=0 orders.retry=7 retry.orders.eu=3", str(result))
+        queue_pages = [p for p in self.server.paths if p.startswith("/api/queues")]
+        self.assertEqual(2, len(queue_pages))
+        self.assertTrue("columns=name%2Cmessages" in queue_pages[0])
+
+    def test_list_queues_needs_filter(self):
+        result = RabbitMQChecker().execute(["-t", "list_queues"] + self.args)
+        self.assertEqual("UNKNOWN", result.status)
+
+    def test_authentication_failed(self):
+        result = RabbitMQChecker().execute(["-t", "messages", "-p", "wrong"] + self.args)
+        self.assertEqual("UNKNOWN", result.status)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,23 +9,25 @@ _rootpath = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(_rootpath, ".."))
 
 import unittest
+import shutil
+import tempfile
 from test_plugin import TestPlugin
 from check_resque import ResqueChecker
 
 class TestResqueChecker(TestPlugin):
     def setUp(self):
         self.checker = ResqueChecker()
-        try:
-            os.mkdir("./status/")
-        except OSError:
-            pass
+        self.rootdir = tempfile.mkdtemp()
         print 'check_resque'
 
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
     def test_get_connections_active(self):
-        self.assert_status("-t QUEUE_LENGTH -z resque_test -d ./status/")
+        self.assert_status("-t QUEUE_LENGTH -z resque_test -d " + self.rootdir)
 
     def test_get_connections_waiting(self):
-        self.assert_status("-t JOB_PROCESSED -z resque_test -d ./status/")
+        self.assert_status("-t JOB_PROCESSED -z resque_test -d " + self.rootdir)
 
 
 if __name__ == "__main__":
@@ -8,45 +8,146 @@ import os
 _rootpath = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(_rootpath, ".."))
 
+import time
+import mock
+import pickle
+import shutil
+import tempfile
 import unittest
 from test_plugin import TestPlugin
 from check_smart import SmartChecker
 
+SMART_ATTRIBUTES = """=== START OF READ SMART DATA SECTION ===
+SMART Attributes Data Structure revision number: 16
+ID# ATTRIBUTE_NAME          FLAG     VALUE WORST THRESH TYPE      UPDATED  WHEN_FAILED RAW_VALUE
+  1 Raw_Read_Error_Rate     0x002f   %d   200   051    Pre-fail  Always       -       0
+  5 Reallocated_Sector_Ct   0x0033   200   200   140    Pre-fail  Always       -       0"""
+
+SMART_JSON = """{"json_format_version": [1, 0], "smartctl": {"version": [7, 2], "exit_status": 0},
+ "ata_smart_attributes": {"revision": 16, "table": [
+  {"id": 1, "name": "Raw_Read_Error_Rate", "value": 200, "worst": 200, "thresh": 51, "raw": {"value": 0, "string": "0"}},
+  {"id": 194, "name": "Temperature_Celsius", "value": 112, "worst": 97, "thresh": 0,
+   "raw": {"value": 30064771110, "string": "38 (Min/Max 19/45)"}}]}}"""
+
+SMART_STATS = """Controllers found: 1
+<SmartStats controllerID="0" time="1365000000" deviceName="Adaptec 6405">
+<PhysicalDriveSmartStats channel="0" id="0" nonSpinning="false" isDescriptionAvailable="true">
+<Attribute id="0x01" name="Read Error Rate" normalizedCurrent="100" normalizedWorst="100" thresholdValue="6" rawValue="12" Status="OK"/>
+<Attribute id="0x05" name="Reallocated Sectors Count" normalizedCurrent="99" normalizedWorst="99" thresholdValue="36" rawValue="3" Status="OK"/>
+</PhysicalDriveSmartStats>
+</SmartStats>
+Command completed successfully."""
+
 class TestSmartChecker(TestPlugin):
     def setUp(self):
         self.checker = SmartChecker()
-        try:
-            os.mkdir("./status/")
-        except OSError:
-            pass
+        self.rootdir = tempfile.mkdtemp()
         print 'check_smart'
 
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
     def test_get_overall_health(self):
-        self.print_status("-t OVERALL_HEALTH -d ./status/")
+        self.print_status("-t OVERALL_HEALTH -d " + self.rootdir)
 
     def test_get_adapatec_health(self):
-        self.print_status("-t ADAPTEC_HEALTH -d ./status/")
+        self.print_status("-t ADAPTEC_HEALTH -d " + self.rootdir)
 
     def test_get_connections_active(self):
-        self.print_status("-t REALLOCATE_SECTOR_COUNT -d ./status/")
+        self.print_status("-t REALLOCATE_SECTOR_COUNT -d " + self.rootdir)
 
     def test_get_spin_retry_count(self):
-        self.print_status("-t SPIN_RETRY_COUNT -d ./status/")
+        self.print_status("-t SPIN_RETRY_COUNT -d " + self.rootdir)
 
     def test_get_offline_uncorrectable(self):
-        self.print_status("-t OFFLINE_UNCORRECTABLE -d ./status/")
+        self.print_status("-t OFFLINE_UNCORRECTABLE -d " + self.rootdir)
 
     def test_get_cur_pending_sector(self):
-        self.print_status("-t CUR_PENDING_SECTOR -d ./status/")
+        self.print_status("-t CUR_PENDING_SECTOR -d " + self.rootdir)
 
     def test_get_reallocated_event_count(self):
-        self.print_status("-t REALLOCATED_EVENT_COUNT -d ./status/")
+        self.print_status("-t REALLOCATED_EVENT_COUNT -d " + self.rootdir)
 
     def test_get_spin_up_time(self):
-        self.print_status("-t SPIN_UP_TIME -d ./status/")
+        self.print_status("-t SPIN_UP_TIME -d " + self.rootdir)
 
     def test_get_raw_read_error_rate(self):
-        self.print_status("-t RAW_READ_ERROR_RATE -d ./status/")
+        self.print_status("-t RAW_READ_ERROR_RATE -d " + self.rootdir)
+
+
+class TestSmartProbe(unittest.TestCase):
+    def setUp(self):
+        self.checker = SmartChecker()
+        self.rootdir = tempfile.mkdtemp()
+        self.disks = ["/dev/sda", "/dev/sdb", "/dev/sdc"]
+        self.probed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
+    def run_smartctl(self, cmd, timeout):
+        disk = cmd.split()[-1]
+        self.probed.append(disk)
+        if disk == "/dev/sdc":
+            return None
+        return SMART_ATTRIBUTES % (100 + self.disks.index(disk))
+
+    def test_run_timeout(self):
+        self.assertEqual("done", self.checker._run("echo done", 5))
+        start = time.time()
+        self.assertEqual(None, self.checker._run("sleep 5", 0.2))
+        self.assertTrue(time.time() - start < 2)
+
+    def test_partial_results(self):
+        args = ["-t", "RAW_READ_ERROR_RATE", "-d", self.rootdir, "-w", "50", "--parser", "text"]
+        with mock.patch.object(SmartChecker, "_get_disks", return_value=self.disks):
+            with mock.patch.object(SmartChecker, "_run", side_effect=self.run_smartctl):
+                result = self.checker.execute(args)
+                self.assertEqual({"/dev/sda": 100, "/dev/sdb": 101},
+                                 dict((pd["label"], int(pd["value"])) for pd in result.perf_data_list))
+                self.assertTrue(result.message.endswith("timed out on /dev/sdc"))
+                # the disks fetched within --interval aren't probed again
+                self.probed = []
+                SmartChecker().execute(args)
+                self.assertEqual(["/dev/sdc"], self.probed)
+
+    def test_topology_cache(self):
+        args = ["-t", "OVERALL_HEALTH", "-d", self.rootdir]
+        signature = ["sda", "sdb"]
+        with mock.patch.object(SmartChecker, "_discover_disks", return_value=self.disks) as discover:
+            with mock.patch.object(SmartChecker, "_get_block_signature", side_effect=lambda: list(signature)):
+                for _ in range(2):
+                    self.assertEqual(self.disks, SmartChecker()._get_disks(self.checker.parse_args(args)))
+                self.assertEqual(1, discover.call_count)
+                signature.append("sdc")
+                SmartChecker()._get_disks(self.checker.parse_args(args))
+                self.assertEqual(2, discover.call_count)
+                SmartChecker()._get_disks(self.checker.parse_args(args + ["--rescan"]))
+                SmartChecker()._get_disks(self.checker.parse_args(args + ["--topology-ttl", "-1"]))
+                self.assertEqual(4, discover.call_count)
+
+    def test_parse_json(self):
+        self.assertTrue(self.checker._validate_json_output(None, SMART_JSON))
+        attributes = dict(self.checker._parse_json_output(None, SMART_JSON))
+        self.assertEqual((112, 0, 97), (attributes["194"].value, attributes["194"].threshold,
+                                        attributes["194"].worst))
+        self.assertEqual("38 (Min/Max 19/45)", attributes["194"].raw_value)
+
+    def test_parse_text(self):
+        attributes = dict(self.checker._parse_output(None, SMART_ATTRIBUTES % 100))
+        self.assertEqual((100, 51, 200, 0), (attributes["1"].value, attributes["1"].threshold,
+                                             attributes["1"].worst, attributes["1"].raw_value))
+        # kept in the laststats
+        attribute = pickle.loads(pickle.dumps(attributes["5"], 0))
+        self.assertEqual((200, 140), (attribute.value, attribute.threshold))
+
+    def test_adaptec_stats(self):
+        request = self.checker.parse_args(["-t", "RAW_READ_ERROR_RATE", "-d", self.rootdir])
+        with mock.patch.object(SmartChecker, "get_adaptec_disks", return_value={"0": "/dev/sda-0"}):
+            with mock.patch("commands.getoutput", return_value=SMART_STATS):
+                stats = self.checker.retrieve_adaptec_status(request, ["/dev/sda"])
+        self.assertEqual(["1", "5"], sorted(stats))
+        self.assertEqual((99, 3), (stats["5"]["/dev/sda-0"].value, stats["5"]["/dev/sda-0"].raw_value))
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import time
+import shutil
+import socket
+import tempfile
+import unittest
+import threading
+import SocketServer
+from check_zookeeper import ZookeeperChecker, parse_mntr, parse_stat
+
+MNTR = """zk_version\t3.4.6-1569965, built on 02/20/2014 09:09 GMT
+zk_avg_latency\t%(avg)s
+zk_max_latency\t%(max)s
+zk_min_latency\t0
+zk_packets_received\t1200
+zk_packets_sent\t1199
+zk_num_alive_connections\t%(connections)s
+zk_outstanding_requests\t0
+zk_server_state\t%(mode)s
+zk_znode_count\t%(znodes)s
+zk_watch_count\t3
+"""
+
+STAT = """Zookeeper version: 3.3.6-1366786, built on 07/29/2012 06:22 GMT
+Clients:
+ /127.0.0.1:49232[0](queued=0,recved=1,sent=0)
+
+Latency min/avg/max: 0/%(avg)s/%(max)s
+Received: 1202
+Sent: 1201
+Outstanding: 0
+Zxid: 0x100000003
+Mode: %(mode)s
+Node count: %(znodes)s
+"""
+
+
+class FakeZookeeperHandler(SocketServer.BaseRequestHandler):
+    ''' answers one four letter word and closes, like zookeeper '''
+    def handle(self):
+        command = self.request.recv(4)
+        self.server.commands.append(command)
+        time.sleep(self.server.delay)
+        if command == "mntr" and self.server.mntr:
+            self.request.sendall(MNTR % self.server.values)
+        elif command == "stat":
+            self.request.sendall(STAT % dict(self.server.values, connections=1))
+
+
+class FakeZookeeperServer(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mntr=True, delay=0, **values):
+        SocketServer.ThreadingTCPServer.__init__(self, ("127.0.0.1", 0), FakeZookeeperHandler)
+        self.mntr = mntr
+        self.delay = delay
+        self.values = dict(dict(avg=0, max=10, connections=2, mode="follower", znodes=100), **values)
+        self.commands = []
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def target(self):
+        return "127.0.0.1:%d" % self.server_address[1]
+
+
+class TestZookeeperChecker(unittest.TestCase):
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp()
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.rootdir)
+
+    def start(self, **kwargs):
+        server = FakeZookeeperServer(**kwargs)
+        self.servers.append(server)
+        return server
+
+    def execute(self, option, *args):
+        hosts = ",".join(s.target for s in self.servers)
+        return ZookeeperChecker().execute(["-t", option, "-H", hosts, "-d", self.rootdir] + list(args))
+
+    def test_parse_mntr_and_stat(self):
+        values = dict(avg=1, max=12, connections=2, mode="leader", znodes=40)
+        mntr = parse_mntr(MNTR % values)
+        stat = parse_stat(STAT % values)
+        for key in ("zk_avg_latency", "zk_max_latency", "zk_min_latency", "zk_server_state", "zk_znode_count"):
+            self.assertEqual(mntr[key], stat[key])
+        self.assertEqual(1, stat["zk_num_alive_connections"])
+
+    def test_single_server(self):
+        self.start(connections=150)
+        result = self.execute("connections", "-W", "100", "-C", "200")
+        self.assertEqual("CONNECTIONS WARNING: Number of client connections: 150 | connections=150;100.0;200.0",
+                         str(result))
+        result = self.execute("mode")
+        self.assertEqual("MODE OK: Server Mode: follower | mode=follower", str(result))
+        # the leader is another member
+        result = self.execute("leaders")
+        self.assertEqual("OK", result.status)
+        self.assertTrue("follower" in result.message)
+
+    def test_single_standalone_server(self):
+        self.start(mode="standalone")
+        result = self.execute("leaders")
+        self.assertEqual("LEADERS OK: 1 leaders in the ensemble | leaders=1", str(result))
+
+    def test_ensemble(self):
+        leader = self.start(mode="leader", znodes=102, max=40, delay=0.3)
+        self.start(znodes=100, max=7, delay=0.3)
+        old = self.start(mntr=False, znodes=99, max=3, avg=1, delay=0.3)
+        start = time.time()
+        result = self.execute("ALL")
+        # the members are queried at once, the stat fallback after the mntr round
+        self.assertTrue(time.time() - start < 1.0)
+        results = dict((r.name, r) for r in result.results)
+        self.assertEqual(1, results["LEADERS"]["value"])
+        self.assertEqual("OK", results["LEADERS"].status)
+        self.assertEqual(3, results["ZNODE_COUNT_SKEW"]["value"])
+        self.assertEqual(40, results["ZK_MAX_LATENCY"]["value"])
+        self.assertEqual(5, results["CONNECTIONS"]["value"])
+        self.assertEqual(0, results["MEMBERS_DOWN"]["value"])
+        self.assertEqual(sorted([(s.target, s.values["max"]) for s in self.servers]),
+                         [(pd["label"], pd["value"]) for pd in results["ZK_MAX_LATENCY"].perf_data_list[1:]])
+        self.assertTrue("%s leader" % leader.target in results["MODE"].message)
+        self.assertEqual(["mntr", "stat"], old.commands)
+        self.assertEqual(["mntr"], leader.commands)
+
+    def test_no_leader_and_member_down(self):
+        self.start()
+        self.start()
+        # nothing listens on a port just closed
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        down = "127.0.0.1:%d" % sock.getsockname()[1]
+        sock.close()
+        hosts = ",".join([s.target for s in self.servers] + [down])
+        result = ZookeeperChecker().execute(["-t", "leaders,members_down", "-H", hosts, "-d", self.rootdir,
+                                             "-W", "1"])
+        self.assertEqual(["CRITICAL", "WARNING"], [r.status for r in result.results])
+        self.assertEqual([0, 1], [r["value"] for r in result.results])
+
+    def test_all_down(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = str(sock.getsockname()[1])
+        sock.close()
+        result = ZookeeperChecker().execute(["-t", "connections", "-H", "127.0.0.1", "-P", port,
+                                             "-d", self.rootdir, "--timeout", "1"])
+        self.assertEqual("UNKNOWN", result.status)
+
+    def test_bad_target(self):
+        result = ZookeeperChecker().execute(["-t", "connections", "-H", "zk1:abc", "-d", self.rootdir])
+        self.assertEqual("UNKNOWN", result.status)
+        self.assertTrue("usage: -H host[:port]" in str(result))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import gzip
+import time
+import mock
+import base64
+import unittest
+import threading
+import StringIO
+import urlparse
+import SocketServer
+import BaseHTTPServer
+import httpclient
+
+JSON = '{"status": "green", "number_of_nodes": 3}'
+PAGE = (JSON + "\n") * 100
+
+
+def gzipped(body):
+    out = StringIO.StringIO()
+    f = gzip.GzipFile(fileobj=out, mode="wb")
+    f.write(body)
+    f.close()
+    return out.getvalue()
+
+
+class FakeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    ''' keeps the connection alive, answers gzipped when asked to, with an
+        ETag on /etag, behind basic auth on /auth, slowly on /slow, moved
+        from /moved to /json and from /loop to itself. proxies the absolute
+        urls asked
+    '''
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        path = urlparse.urlsplit(self.path).path
+        if path == "/slow":
+            time.sleep(1)
+        if path == "/auth" and self.headers.get("Authorization") != "Basic " + base64.b64encode("guest:guest"):
+            return self.reply(401, "")
+        if path == "/etag" and self.headers.get("If-None-Match") == '"v1"':
+            return self.reply(304, "")
+        if path == "/missing":
+            return self.reply(404, "not found")
+        if path in ("/moved", "/loop"):
+            location = "/json" if path == "/moved" else "/loop"
+            return self.reply(302, "", {"Location": location})
+        body = JSON if path == "/json" else PAGE
+        headers = {"ETag": '"v1"'} if path == "/etag" else {}
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzipped(body)
+            headers["Content-Encoding"] = "gzip"
+        self.reply(200, body, headers)
+
+    def reply(self, status, body, headers={}):
+        self.send_response(status)
+        for k, v in headers.iteritems():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), FakeHandler)
+        self.connections = 0
+        self.requests = []
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.base = "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    def tearDown(self):
+        httpclient.close_all()
+        httpclient.clear_cache()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keepalive_gzip(self):
+        for _ in range(3):
+            self.assertEqual({"status": "green", "number_of_nodes": 3},
+                             httpclient.get_json(self.base + "/json"))
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual("gzip", self.server.requests[0][1]["accept-encoding"])
+
+    def test_conditional_and_ttl_cache(self):
+        self.assertEqual(PAGE, httpclient.get(self.base + "/etag"))
+        self.assertEqual(PAGE, httpclient.get(self.base + "/etag"))
+        self.assertEqual('"v1"', self.server.requests[1][1]["if-none-match"])
+        httpclient.get(self.base + "/plain", cache_ttl=60)
+        httpclient.get(self.base + "/plain", cache_ttl=60)
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_errors(self):
+        self.assertEqual(PAGE, httpclient.get(self.base + "/auth", username="guest", password="guest"))
+        try:
+            httpclient.get(self.base + "/auth", username="guest", password="wrong")
+            self.fail("no error")
+        except httpclient.HTTPError, e:
+            self.assertEqual(401, e.status)
+        try:
+            httpclient.get(self.base + "/missing")
+            self.fail("no error")
+        except httpclient.HTTPError, e:
+            self.assertEqual(404, e.status)
+        # the connection is still usable after the error replies
+        self.assertEqual(1, self.server.connections)
+
+    def test_timeout(self):
+        start = time.time()
+        self.assertRaises(httpclient.HTTPError, httpclient.get, self.base + "/slow", timeout=0.2)
+        self.assertTrue(time.time() - start < 0.9)
+
+    def test_iter_lines(self):
+        lines = list(httpclient.iter_lines(self.base + "/csv"))
+        self.assertEqual(PAGE.splitlines(True), lines)
+        list(httpclient.iter_lines(self.base + "/csv"))
+        self.assertEqual(1, self.server.connections)
+
+    def test_iter_lines_stopped(self):
+        lines = httpclient.iter_lines(self.base + "/csv")
+        lines.next()
+        lines.close()
+        # the connection with the rest of the body isn't reused
+        self.assertEqual(JSON, httpclient.get(self.base + "/json"))
+        self.assertEqual(2, self.server.connections)
+
+    def test_redirects(self):
+        self.assertEqual({"status": "green", "number_of_nodes": 3},
+                         httpclient.get_json(self.base + "/moved"))
+        self.assertEqual(["/moved", "/json"], [path for path, _ in self.server.requests])
+        try:
+            httpclient.get(self.base + "/loop")
+            self.fail("no error")
+        except httpclient.HTTPError, e:
+            self.assertEqual(302, e.status)
+        self.assertEqual(2 + httpclient.MAX_REDIRECTS + 1, len(self.server.requests))
+
+    def test_proxy(self):
+        proxy = "127.0.0.1:%d" % self.server.server_address[1]
+        with mock.patch.dict(os.environ, {"http_proxy": "http://user:pw@" + proxy, "no_proxy": "db1"}, clear=True):
+            self.assertEqual(("127.0.0.1", self.server.server_address[1],
+                              "Basic " + base64.b64encode("user:pw")), httpclient.get_proxy("http", "es1"))
+            self.assertEqual(None, httpclient.get_proxy("http", "db1"))
+            self.assertEqual(None, httpclient.get_proxy("https", "es1"))
+            self.assertEqual(JSON, httpclient.get("http://es1:9200/json"))
+        path, headers = self.server.requests[0]
+        self.assertEqual("http://es1:9200/json", path)
+        self.assertEqual("Basic " + base64.b64encode("user:pw"), headers["proxy-authorization"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import mock
+import struct
+import shutil
+import socket
+import tempfile
+import unittest
+import threading
+import SocketServer
+import mysqlwire
+from check_mysql import MySqlChecker
+
+SALT = "abcdefghij0123456789"
+STATUS = [("Queries", "42"), ("Slow_queries", "3"), ("Threads_connected", "5"),
+          ("Ssl_cipher", "")]
+
+
+class FakeMySQLHandler(SocketServer.BaseRequestHandler):
+    ''' speaks just enough of the server side: handshake v10 with
+        mysql_native_password, then text query results of STATUS
+    '''
+    def send(self, sequence, payload):
+        self.request.sendall(struct.pack("<I", len(payload))[:3] + chr(sequence) + payload)
+
+    def recv(self):
+        header = self.request.recv(4)
+        if len(header) < 4:
+            return None, None
+        length = struct.unpack("<I", header[:3] + "\0")[0]
+        payload = ""
+        while len(payload) < length:
+            payload += self.request.recv(length - len(payload))
+        return ord(header[3]), payload
+
+    def lenenc(self, s):
+        return chr(len(s)) + s
+
+    def handle(self):
+        self.server.connections += 1
+        handshake = ("\x0a" + "5.7.0-fake\0" + struct.pack("<I", 1) + SALT[:8] + "\0" +
+                     struct.pack("<H", 0xffff) + "\x21" + struct.pack("<H", 2) +
+                     struct.pack("<H", 0x000f) + chr(21) + "\0" * 10 + SALT[8:] + "\0" +
+                     "mysql_native_password\0")
+        self.send(0, handshake)
+        sequence, response = self.recv()
+        user, rest = response[32:].split("\0", 1)
+        auth = rest[1:1 + ord(rest[0])]
+        if user != "nagios" or auth != mysqlwire.scramble_native("secret", SALT):
+            self.send(sequence + 1, "\xff" + struct.pack("<H", 1045) + "#28000" +
+                      "Access denied for user '%s'" % user)
+            return
+        self.send(sequence + 1, "\x00\x00\x00\x02\x00\x00\x00")
+        while True:
+            sequence, packet = self.recv()
+            if packet is None or packet[0] == chr(mysqlwire.COM_QUIT):
+                return
+            self.server.queries.append(packet[1:])
+            packets = ["\x02", self.lenenc("Variable_name"), self.lenenc("Value"), "\xfe\0\0\x02\0"]
+            packets += [self.lenenc(k) + self.lenenc(v) for k, v in STATUS]
+            packets.append("\xfe\0\0\x02\0")
+            for i, p in enumerate(packets):
+                self.send(i + 1, p)
+
+
+class FakeMySQLServer(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        SocketServer.ThreadingTCPServer.__init__(self, ("127.0.0.1", 0), FakeMySQLHandler)
+        self.connections = 0
+        self.queries = []
+
+
+class TestMySQLWire(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeMySQLServer()
+        self.port = self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        mysqlwire.close_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_global_status(self):
+        status = mysqlwire.global_status(host="127.0.0.1", port=self.port,
+                                         user="nagios", password="secret")
+        self.assertEqual(dict(STATUS), status)
+        self.assertEqual(["SHOW GLOBAL STATUS"], self.server.queries)
+
+    def test_connection_reused(self):
+        for _ in range(3):
+            mysqlwire.global_status(host="127.0.0.1", port=self.port,
+                                    user="nagios", password="secret")
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(3, len(self.server.queries))
+
+    def test_connection_closed_on_bad_reply(self):
+        kwargs = dict(host="127.0.0.1", port=self.port, user="nagios", password="secret")
+        mysqlwire.global_status(**kwargs)
+        failed = []
+        def bad_reply(connection, sql):
+            failed.append(connection)
+            raise struct.error("unpack")
+        with mock.patch.object(mysqlwire.Connection, "query", autospec=True, side_effect=bad_reply):
+            self.assertRaises(struct.error, mysqlwire.global_status, **kwargs)
+        # the connection out of step is closed, not pooled again
+        self.assertRaises(socket.error, failed[0].sock.fileno)
+        self.assertFalse(any(mysqlwire._pool.values()))
+        self.assertEqual(dict(STATUS), mysqlwire.global_status(**kwargs))
+        self.assertEqual(2, self.server.connections)
+
+    def test_access_denied(self):
+        self.assertRaises(mysqlwire.AuthenticationError, mysqlwire.global_status,
+                          host="127.0.0.1", port=self.port, user="nagios", password="wrong")
+
+    def test_checker(self):
+        rootdir = tempfile.mkdtemp()
+        try:
+            args = ["-t", "SLOW_QUERIES", "-H", "127.0.0.1", "-p", str(self.port), "-u", "nagios",
+                    "-s", "secret", "-d", rootdir, "--collector", "native"]
+            self.assertEqual(3, MySqlChecker().execute(args)["value"])
+            with mock.patch("mysqlwire.global_status", return_value=dict(STATUS)) as global_status:
+                MySqlChecker().execute(args + ["--timeout", "2.5"])
+                self.assertEqual(2.5, global_status.call_args[1]["timeout"])
+            args[args.index("secret")] = "wrong"
+            result = MySqlChecker().execute(args)
+            self.assertEqual("UNKNOWN", result.status)
+            self.assertTrue("Access denied" in result.message)
+            # nothing listens on a port just closed
+            sock = socket.socket()
+            sock.bind(("127.0.0.1", 0))
+            args[args.index(str(self.port))] = str(sock.getsockname()[1])
+            sock.close()
+            self.assertEqual("UNKNOWN", MySqlChecker().execute(args).status)
+        finally:
+            shutil.rmtree(rootdir)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,10 +3,13 @@ Created on May 30, 2012
 
 @author: yangming
 '''
+import os
 import unittest
 import nagios
 import statsd
 import sys
+import shutil
+import tempfile
 from StringIO import StringIO
 import mock
 
@@ -14,11 +17,38 @@ class BasePluginMock(nagios.BasePlugin):
     def check(self, request):
         pass
 
+class BatchStatusPluginMock(nagios.BatchStatusPlugin):
+    def __init__(self, *args, **kwargs):
+        super(BatchStatusPluginMock, self).__init__(*args, **kwargs)
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default='pd@mock')
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default='mock')
+        self.parser.add_argument("--unique",   required=False, type=str, default='localhost')
+        self.fetches = 0
+        self.output = {}
+
+    def _get_batch_status(self, request):
+        self.fetches += 1
+        return self.output
+
+    def _validate_output(self, request, output):
+        return True
+
+    def _parse_output(self, request, output):
+        return output.iteritems()
+
+    @nagios.CommandBasedPlugin.command("MOCK_VALUE")
+    def get_value(self, request):
+        value = self.get_status_value("value", request)
+        return self.get_result(request, value, '%s value' % value, 'value')
+
+    @nagios.CommandBasedPlugin.command("MOCK_OTHER")
+    def get_other(self, request):
+        value = self.get_status_value("other", request)
+        return self.get_result(request, value, '%s other' % value, 'other')
+
 class TestNagios(unittest.TestCase):
-    def test_rootify(self):
-        mock_os = mock.Mock()
-#        sys.modules['os'] = mock_os
-        nagios.__dict__['os'] = mock_os
+    @mock.patch("nagios.os")
+    def test_rootify(self, mock_os):
         mock_os.geteuid.return_value = 1
         self.assertEqual("sudo ls",             nagios.rootify("ls"))
         self.assertEqual("sudo ls",             nagios.rootify("sudo ls"))
@@ -87,6 +117,190 @@ class TestBasePlugin(unittest.TestCase):
         self.assertEqual(nagios.Status.OK, ba.verdict(2, 6, 8))
         self.assertEqual(nagios.Status.OK, ba.verdict(2, 5, None))
         self.assertEqual(nagios.Status.OK, ba.verdict(2, None, None))
+        self.assertEqual([nagios.Status.OK, nagios.Status.WARNING, nagios.Status.WARNING,
+                          nagios.Status.CRITICAL, nagios.Status.CRITICAL],
+                         [ba.verdict(v, 10, 20) for v in (5, 10, 15, 20, 30)])
+        self.assertEqual(nagios.Status.CRITICAL, ba.verdict(30, None, 20))
+        self.assertEqual(nagios.Status.WARNING, ba.verdict(20, 10, 20, exclusive=True))
+        self.assertEqual(nagios.Status.CRITICAL, ba.verdict(5, 20, 10, reverse=True))
+        self.assertEqual(nagios.Status.WARNING, ba.verdict(10, 20, 10, reverse=True, exclusive=True))
+
+    def test_perfdata_empty_fields(self):
+        r = nagios.Result('CONNECTIONS', nagios.Status.CRITICAL, '30 connections', 'NGINX')
+        r.add_performance_data('connections', 30, crit=20.0)
+        self.assertEqual('CONNECTIONS CRITICAL: 30 connections | connections=30;;20.0', str(r))
+
+class TestBatchStatusPlugin(unittest.TestCase):
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
+    def new_plugin(self, value):
+        plugin = BatchStatusPluginMock()
+        plugin.output = {"value": value}
+        return plugin
+
+    def test_snapshot_cache(self):
+        args = ["-t", "MOCK_VALUE", "-d", self.rootdir, "--cache-ttl", "60"]
+        first, second = self.new_plugin(1), self.new_plugin(2)
+        self.assertEqual(1, first.execute(args)["value"])
+        # a second process within the ttl reuses the cached snapshot
+        self.assertEqual(1, second.execute(args)["value"])
+        self.assertEqual(0, second.fetches)
+        # another instance has its own snapshot
+        self.assertEqual(2, second.execute(args + ["--unique", "remote"])["value"])
+
+    def test_snapshot_cache_disabled(self):
+        args = ["-t", "MOCK_VALUE", "-d", self.rootdir]
+        self.new_plugin(1).execute(args)
+        self.assertEqual(2, self.new_plugin(2).execute(args)["value"])
+
+    def test_snapshot_cache_expired(self):
+        args = ["-t", "MOCK_VALUE", "-d", self.rootdir, "--cache-ttl", "60"]
+        first, second = self.new_plugin(1), self.new_plugin(2)
+        first.execute(args)
+        with mock.patch("time.time", return_value=nagios.time.time() + 61):
+            self.assertEqual(2, second.execute(args)["value"])
+        self.assertEqual(1, second.fetches)
+
+    def test_delta_values(self):
+        args = ["-t", "MOCK_VALUE", "-d", self.rootdir]
+        plugin = self.new_plugin(5)
+        plugin.output["other"] = 7
+        request = plugin.parse_args(args)
+        self.assertEqual([5, 7], plugin.get_delta_values(["value", "other"], request))
+        plugin.stats = {"value": 8, "other": 7}
+        with mock.patch.object(plugin, "save_status", wraps=plugin.save_status) as save:
+            self.assertEqual([3, 0], plugin.get_delta_values(["value", "other"], request))
+            self.assertEqual(1, save.call_count)
+        self.assertEqual({"value": 8, "other": 7}, plugin.retrieve_last_status(request))
+        # an attribute without a last value
+        plugin.stats["new"] = 4
+        self.assertEqual([0, 0], plugin.get_delta_values(["value", "new"], request, initial=0))
+
+    def test_delta_values_interleaved(self):
+        args = ["-t", "MOCK_VALUE", "-d", self.rootdir]
+        first, second = BatchStatusPluginMock(), BatchStatusPluginMock()
+        request = first.parse_args(args)
+        first.stats = {"value": 1, "other": 1}
+        first.get_delta_values(["value", "other"], request)
+        # both checks load the laststats before either saves
+        first.stats, second.stats = {"value": 5}, {"other": 7}
+        first_load = first.retrieve_last_status(request)
+        second_load = second.retrieve_last_status(request)
+        with mock.patch.object(first, "retrieve_last_status", return_value=first_load):
+            first.get_delta_value("value", request)
+        with mock.patch.object(second, "retrieve_last_status", return_value=second_load):
+            second.get_delta_value("other", request)
+        self.assertEqual({"value": 5, "other": 7}, first.retrieve_last_status(request))
+
+    def test_rate_values(self):
+        plugin = self.new_plugin(100)
+        request = plugin.parse_args(["-t", "MOCK_VALUE", "-d", self.rootdir])
+        def sample(value, fetchtime, wrap=None):
+            plugin.stats, plugin.fetchtime = {"value": value}, fetchtime
+            return plugin.get_rate_value("value", request, wrap)
+        self.assertEqual(0.0, sample(100, 1000))
+        self.assertEqual(5.0, sample(400, 1060))
+        # the same sample again
+        self.assertEqual(5.0, sample(400, 1060))
+        # restarted
+        self.assertEqual(2.0, sample(120, 1120))
+        # wrapped around
+        sample(2 ** 32 - 80, 1180)
+        self.assertEqual(2.0, sample(40, 1240, wrap=32))
+        # the deltas are kept apart
+        self.assertEqual(40, plugin.get_delta_value("value", request))
+
+    def test_rate_values_interleaved(self):
+        for store in ("pickle", "sqlite"):
+            args = ["-t", "MOCK_VALUE", "-d", self.rootdir, "--state-store", store,
+                    "--unique", store]
+            first, second = BatchStatusPluginMock(), BatchStatusPluginMock()
+            request = first.parse_args(args)
+            first.stats, first.fetchtime = {"value": 100, "other": 200}, 1000
+            first.get_rate_values(["value", "other"], request)
+            # both checks load the samples before either saves
+            first.stats, first.fetchtime = {"value": 400}, 1060
+            second.stats, second.fetchtime = {"other": 800}, 1060
+            first_load = first.retrieve_last_status(request)
+            second_load = second.retrieve_last_status(request)
+            with mock.patch.object(first, "retrieve_last_status", return_value=first_load):
+                first.get_rate_value("value", request)
+            with mock.patch.object(second, "retrieve_last_status", return_value=second_load):
+                second.get_rate_value("other", request)
+            laststats = first.retrieve_last_status(request)
+            self.assertEqual((1060, 400), laststats[("@sample", "value")][:2])
+            self.assertEqual((1060, 800), laststats[("@sample", "other")][:2])
+
+    def test_multiple_options(self):
+        plugin = self.new_plugin(1)
+        plugin.output["other"] = 7
+        args = ["-t", "MOCK_VALUE,MOCK_OTHER", "-w", "5", "-d", self.rootdir]
+        result = plugin.execute(args)
+        self.assertEqual(nagios.Status.WARNING, result.exit_code)
+        self.assertEqual("WARNING: MOCK_VALUE OK: 1 value; MOCK_OTHER WARNING: 7 other"
+                         " | mock_value.value=1;5 mock_other.other=7;5", str(result))
+        self.assertEqual(1, plugin.fetches)
+        result = plugin.execute(["-t", "ALL", "--multiple-output", "lines", "-d", self.rootdir])
+        self.assertEqual("MOCK_OTHER OK: 7 other | other=7\nMOCK_VALUE OK: 1 value | value=1", str(result))
+
+    def test_multiple_options_unknown(self):
+        plugin = BatchStatusPluginMock()
+        result = plugin.execute(["-t", "MOCK_VALUE,MOCK_OTHER", "-d", self.rootdir])
+        self.assertEqual(nagios.Status.UNKNOWN, result.exit_code)
+        # a failed fetch is not retried for every option
+        self.assertEqual(1, plugin.fetches)
+
+    def test_invalid_option(self):
+        plugin = self.new_plugin(1)
+        with mock.patch("sys.stderr", new_callable=StringIO):
+            self.assertRaises(SystemExit, plugin.parse_args, ["-t", "MOCK_VALUE,NOTHING"])
+
+
+class TestStateStore(unittest.TestCase):
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.rootdir, "pd@mock")
+
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
+    def assert_store(self, store):
+        self.assertEqual({}, store.load("db1"))
+        store.save("db1", {"Queries": 10})
+        store.save("db2", {"Queries": 20})
+        store.save("db1", {"Queries": 11})
+        self.assertEqual({"Queries": 11}, store.load("db1"))
+        self.assertEqual({"Queries": 20}, store.load("db2"))
+
+    def test_pickle_store(self):
+        self.assert_store(nagios.PickleStateStore(self.path))
+
+    def test_sqlite_store(self):
+        self.assert_store(nagios.SqliteStateStore(self.path))
+        # a new connection sees the saved rows
+        self.assertEqual({"Queries": 20}, nagios.SqliteStateStore(self.path).load("db2"))
+
+    def test_sqlite_store_merges_concurrent_saves(self):
+        store1 = nagios.SqliteStateStore(self.path)
+        store2 = nagios.SqliteStateStore(self.path)
+        # both checks load before either saves
+        stats1, stats2 = store1.load("db1"), store2.load("db1")
+        stats1["Queries"] = 10
+        stats2["Questions"] = 20
+        store1.save("db1", stats1)
+        store2.save("db1", stats2)
+        self.assertEqual({"Queries": 10, "Questions": 20}, store1.load("db1"))
+
+    def test_sqlite_store_reads_legacy_file(self):
+        nagios.PickleStateStore(self.path).save("db1", {"Queries": 10})
+        store = nagios.SqliteStateStore(self.path)
+        self.assertEqual({"Queries": 10}, store.load("db1"))
+        store.save("db1", {"Queries": 12})
+        self.assertEqual({"Queries": 12}, store.load("db1"))
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.test_']
@@ -0,0 +1,167 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import time
+import mock
+import errno
+import socket
+import unittest
+import tempfile
+import threading
+from StringIO import StringIO
+import nagios
+import nagiosd
+from nagios import CommandBasedPlugin as plugin
+
+class CounterChecker(nagios.BatchStatusPlugin):
+    fetches = 0
+
+    def __init__(self, *args, **kwargs):
+        super(CounterChecker, self).__init__(*args, **kwargs)
+        self.parser.add_argument("-f", "--filename", required=False, type=str, default='pd@counter')
+        self.parser.add_argument("-H", "--host",     required=False, type=str)
+        self.parser.add_argument("-z", "--appname",  required=False, type=str, default='counter')
+        self.parser.add_argument("--unique",   required=False, type=str, default=None)
+        self.add_unique_argument("-H", "--host", type=str)
+
+    def _get_batch_status(self, request):
+        CounterChecker.fetches += 1
+        if request.host == "slow":
+            time.sleep(0.5)
+        return "hits 5\nmisses 2"
+
+    def _validate_output(self, request, output):
+        return True
+
+    def _parse_output(self, request, output):
+        for l in output.split("\n"):
+            k, v = l.split()
+            yield k, nagios.to_num(v)
+
+    @plugin.command("HITS")
+    def get_hits(self, request):
+        value = self.get_status_value("hits", request)
+        return self.get_result(request, value, '%s hits' % value, 'hits')
+
+    @plugin.command("MISSES")
+    def get_misses(self, request):
+        value = self.get_status_value("misses", request)
+        return self.get_result(request, value, '%s misses' % value, 'misses')
+
+
+class TestPluginServer(unittest.TestCase):
+    def setUp(self):
+        CounterChecker.fetches = 0
+        self.path = os.path.join(tempfile.mkdtemp(), "nagiosd.sock")
+        self.server = nagiosd.PluginServer(self.path, {"check_counter": CounterChecker}, ttl=60)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_same_output_as_run(self):
+        args = ["-t", "HITS", "-w", "10", "-H", "db1"]
+        expected = str(CounterChecker().execute(args))
+        exit_code, output = nagiosd.query(self.path, "check_counter", args)
+        self.assertEqual(nagios.Status.OK, exit_code)
+        self.assertEqual(expected, output)
+
+    def test_snapshot_shared_between_options(self):
+        nagiosd.query(self.path, "check_counter", ["-t", "HITS", "-H", "db1"])
+        exit_code, output = nagiosd.query(self.path, "check_counter", ["-t", "MISSES", "-H", "db1"])
+        self.assertEqual("MISSES OK: 2 misses | misses=2", output)
+        self.assertEqual(1, CounterChecker.fetches)
+        nagiosd.query(self.path, "check_counter", ["-t", "MISSES", "-H", "db2"])
+        self.assertEqual(2, CounterChecker.fetches)
+
+    def test_instances_checked_concurrently(self):
+        slow = threading.Thread(target=nagiosd.query, args=(self.path, "check_counter", ["-t", "HITS", "-H", "slow"]))
+        slow.start()
+        time.sleep(0.1)
+        start = time.time()
+        exit_code, output = nagiosd.query(self.path, "check_counter", ["-t", "HITS", "-H", "db1"])
+        self.assertTrue(time.time() - start < 0.3)
+        self.assertEqual("HITS OK: 5 hits | hits=5", output)
+        slow.join()
+
+    def test_help(self):
+        exit_code, output = nagiosd.query(self.path, "check_counter", ["-h"])
+        self.assertEqual(nagios.Status.OK, exit_code)
+        self.assertTrue(output.startswith("usage: check_counter.py"))
+
+    def test_short_reply(self):
+        path = self.path + ".short"
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.listen(1)
+        # reads the request and closes without replying, like a nagiosd
+        # stopped while checking
+        def accept():
+            conn = sock.accept()[0]
+            while conn.recv(4096):
+                pass
+            conn.close()
+        thread = threading.Thread(target=accept)
+        thread.start()
+        try:
+            exit_code, output = nagiosd.query(path, "check_counter", ["-t", "HITS"])
+        finally:
+            thread.join()
+            sock.close()
+            os.remove(path)
+        self.assertEqual(nagios.Status.UNKNOWN, exit_code)
+        self.assertTrue(output.startswith("UNKNOWN"))
+
+
+    def main(self, *args):
+        try:
+            with mock.patch("sys.stdout", new_callable=StringIO) as stdout:
+                nagiosd.main(list(args))
+        except SystemExit, e:
+            return e.code, stdout.getvalue()
+
+    @mock.patch("nagiosd.load_plugin")
+    def test_checked_in_process_without_nagiosd(self, load_plugin):
+        args = ["-S", self.path + ".none", "check", "check_counter", "-t", "HITS"]
+        load_plugin.return_value.return_value.run.side_effect = SystemExit(0)
+        self.assertEqual(0, self.main(*args)[0])
+        load_plugin.return_value.return_value.run.assert_called_once_with(["-t", "HITS"])
+        load_plugin.reset_mock()
+        with mock.patch("nagiosd.query", side_effect=socket.error(errno.ECONNREFUSED, "refused")):
+            self.main(*args)
+        self.assertEqual(1, load_plugin.call_count)
+
+    @mock.patch("nagiosd.load_plugin")
+    def test_not_checked_again_after_timeout(self, load_plugin):
+        # accepts the check and never replies
+        path = self.path + ".silent"
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.listen(1)
+        try:
+            exit_code, output = self.main("-S", path, "check", "--timeout", "0.2", "check_counter", "-t", "HITS")
+        finally:
+            sock.close()
+            os.remove(path)
+        self.assertEqual((nagios.Status.UNKNOWN, "UNKNOWN: timed out waiting for nagiosd\n"), (exit_code, output))
+        args = ["-S", self.path, "check", "check_counter", "-t", "HITS"]
+        with mock.patch("nagiosd.query", side_effect=socket.error(errno.EACCES, "denied")):
+            exit_code, output = self.main(*args)
+        self.assertEqual(nagios.Status.UNKNOWN, exit_code)
+        self.assertFalse(load_plugin.called)
+
+    def test_unknown_plugin(self):
+        exit_code, output = nagiosd.query(self.path, "check_nothing", ["-t", "HITS"])
+        self.assertEqual(nagios.Status.UNKNOWN, exit_code)
+
+if __name__ == "__main__":
+    unittest.main()
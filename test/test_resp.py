@@ -0,0 +1,131 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import mock
+import shutil
+import socket
+import tempfile
+import unittest
+import threading
+import SocketServer
+from StringIO import StringIO
+import resp
+from check_redis import RedisChecker
+from check_resque import ResqueChecker
+
+INFO = "# Server\r\nredis_version:2.4.0\r\nuptime_in_seconds:100\r\n\r\n# Clients\r\nconnected_clients:7\r\nrole:master\r\n"
+QUEUES = {"mail": 3, "thumbnails": 12}
+
+
+class FakeRedisHandler(SocketServer.StreamRequestHandler):
+    ''' a redis 2.4 without scripting, with the data of a resque '''
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def bulk(self, s):
+        return "$%d\r\n%s\r\n" % (len(s), s)
+
+    def reply(self, args):
+        command = args[0].upper()
+        if command == "INFO":
+            return self.bulk(INFO)
+        elif command == "DBSIZE":
+            return ":42\r\n"
+        elif command == "GET":
+            return self.bulk("1000")
+        elif command == "SMEMBERS":
+            return "*%d\r\n%s" % (len(QUEUES), "".join(self.bulk(q) for q in QUEUES))
+        elif command == "LLEN":
+            return ":%d\r\n" % QUEUES.get(args[1].split(":")[-1], 0)
+        return "-ERR unknown command '%s'\r\n" % args[0]
+
+    def handle(self):
+        self.server.connections += 1
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            self.server.commands.append(args[0].upper())
+            self.wfile.write(self.reply(args))
+            self.wfile.flush()
+
+
+class FakeRedisServer(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        SocketServer.ThreadingTCPServer.__init__(self, ("127.0.0.1", 0), FakeRedisHandler)
+        self.connections = 0
+        self.commands = []
+
+
+class TestResp(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeRedisServer()
+        self.port = self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.rootdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        resp.close_all()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.rootdir)
+
+    def test_pipeline(self):
+        replies = resp.pipeline([("INFO",), ("DBSIZE",), ("SMEMBERS", "resque:queues")], port=self.port)
+        self.assertEqual("master", resp.parse_info(replies[0])["role"])
+        self.assertEqual(42, replies[1])
+        self.assertEqual(sorted(QUEUES), sorted(replies[2]))
+        self.assertRaises(resp.RedisError, resp.execute, "NOSUCHCOMMAND", port=self.port)
+        # the connection is still in sync after an error reply
+        self.assertEqual(42, resp.execute("DBSIZE", port=self.port))
+        self.assertEqual(1, self.server.connections)
+
+    def test_redis_checker(self):
+        args = ["-t", "CONNECTED_CLIENTS,TOTAL_KEYS", "-p", str(self.port), "-d", self.rootdir]
+        result = RedisChecker().execute(args)
+        self.assertEqual([7, 42], [r["value"] for r in result.results])
+        self.assertEqual(["INFO", "DBSIZE"], self.server.commands)
+
+    def test_resque_checker(self):
+        args = ["-t", "QUEUE_LENGTH", "-p", str(self.port), "-d", self.rootdir]
+        result = ResqueChecker().execute(args)
+        self.assertEqual("QUEUE_LENGTH OK: 15 jobs in queues | total=15 mail=3 thumbnails=12", str(result))
+        # no scripting, falls back to the pipelines
+        self.assertEqual(["EVAL", "GET", "SMEMBERS", "LLEN", "LLEN"], self.server.commands)
+
+    def test_connection_refused(self):
+        # nothing listens on a port just closed
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = str(sock.getsockname()[1])
+        sock.close()
+        for checker, option in ((RedisChecker, "TOTAL_KEYS"), (ResqueChecker, "QUEUE_LENGTH")):
+            result = checker().execute(["-t", option, "-p", port, "-d", self.rootdir])
+            self.assertEqual("UNKNOWN", result.status)
+
+    def test_user_deprecated(self):
+        args = ["-t", "TOTAL_KEYS", "-p", str(self.port), "-d", self.rootdir, "-u", "redis"]
+        with mock.patch("sys.stderr", new_callable=StringIO) as stderr:
+            self.assertEqual(42, RedisChecker().execute(args)["value"])
+        self.assertTrue("deprecated" in stderr.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
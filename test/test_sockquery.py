@@ -0,0 +1,149 @@
+'''
+Created on Oct 18, 2026
+
+'''
+import sys
+import os
+_rootpath = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_rootpath, ".."))
+
+import time
+import shutil
+import socket
+import tempfile
+import unittest
+import threading
+import SocketServer
+import sockquery
+from check_memcached import MemcachedChecker
+
+STATS = "STAT pid 1\r\nSTAT curr_connections %d\r\nSTAT cmd_get %d\r\nSTAT version 1.4.13\r\nEND\r\n"
+SLABS = "STAT 1:chunk_size 96\r\nSTAT active_slabs 1\r\nSTAT total_malloced 1048576\r\nEND\r\n"
+ITEMS = "STAT items:1:number 5\r\nSTAT items:1:outofmemory %d\r\nEND\r\n"
+
+
+class FakeMemcachedHandler(SocketServer.StreamRequestHandler):
+    ''' answers stats commands until quit '''
+    def handle(self):
+        time.sleep(self.server.delay)
+        n = self.server.n
+        while True:
+            command = self.rfile.readline().strip()
+            if command == "stats":
+                self.wfile.write(STATS % (n, n * 100))
+            elif command == "stats slabs":
+                self.wfile.write(SLABS)
+            elif command == "stats items":
+                self.wfile.write(ITEMS % n)
+            else:
+                return
+
+
+class FakeMemcachedServer(SocketServer.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, n, delay=0):
+        SocketServer.ThreadingTCPServer.__init__(self, ("127.0.0.1", 0), FakeMemcachedHandler)
+        self.n = n
+        self.delay = delay
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def target(self):
+        return "127.0.0.1:%d" % self.server_address[1]
+
+
+class TestSockQuery(unittest.TestCase):
+    def setUp(self):
+        self.servers = [FakeMemcachedServer(1, delay=0.3), FakeMemcachedServer(2, delay=0.3)]
+        # nothing listens on a port just closed
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.closed = "127.0.0.1:%d" % sock.getsockname()[1]
+        sock.close()
+        self.rootdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.rootdir)
+
+    def test_parse_targets(self):
+        self.assertEqual([("db1", 11211), ("db2", 11212)], sockquery.parse_targets("db1, db2:11212", 11211))
+        self.assertEqual([("::1", 11211), ("fe80::1", 11212)], sockquery.parse_targets("::1,[fe80::1]:11212", 11211))
+        self.assertEqual(("db1", 11211), sockquery.parse_target("db1:", 11211))
+        for target in ("db1:abc", "db1:0", "db1:70000", ":11211", "[::1]11211"):
+            self.assertRaises(ValueError, sockquery.parse_target, target, 11211)
+        self.assertEqual("[::1]:11211", sockquery.format_target(("::1", 11211)))
+
+    def test_memcached_all_down(self):
+        args = ["-t", "CURRENT_CONNECTIONS", "-H", self.closed, "-d", self.rootdir]
+        self.assertEqual("UNKNOWN", MemcachedChecker().execute(args).status)
+
+    def test_memcached_bad_target(self):
+        result = MemcachedChecker().execute(["-t", "CURRENT_CONNECTIONS", "-H", "db1:abc", "-d", self.rootdir])
+        self.assertEqual("UNKNOWN", result.status)
+        self.assertTrue("usage: -H host[:port]" in str(result))
+
+    def test_query_all(self):
+        targets = [s.target for s in self.servers] + [self.closed]
+        start = time.time()
+        replies = sockquery.query_all(sockquery.parse_targets(",".join(targets), 0), "stats\r\nquit\r\n")
+        # the servers are queried concurrently
+        self.assertTrue(time.time() - start < 0.6)
+        self.assertEqual(STATS % (1, 100), replies[sockquery.parse_target(targets[0], 0)])
+        self.assertTrue(isinstance(replies[sockquery.parse_target(self.closed, 0)], socket.error))
+
+    def test_query_all_timeout(self):
+        replies = sockquery.query_all([sockquery.parse_target(self.servers[0].target, 0)],
+                                      "stats\r\nquit\r\n", timeout=0.1)
+        self.assertTrue(isinstance(replies.values()[0], socket.timeout))
+
+    def test_memcached_servers(self):
+        targets = ",".join([s.target for s in self.servers] + [self.closed])
+        args = ["-t", "CURRENT_CONNECTIONS,SERVERS_DOWN,ITEMS_OUTOFMEMORY", "-H", targets,
+                "--slabs", "-d", self.rootdir]
+        connections, down, outofmemory = MemcachedChecker().execute(args).results
+        self.assertEqual(3, connections["value"])
+        self.assertEqual({"connections": 3, self.servers[0].target: 1, self.servers[1].target: 2},
+                         dict((pd["label"], pd["value"]) for pd in connections.perf_data_list))
+        self.assertEqual(1, down["value"])
+        # no last values yet
+        self.assertEqual(0, outofmemory["value"])
+
+    def test_memcached_single_server(self):
+        args = ["-t", "OPERATIONS_GET_REQUESTS", "-H", "127.0.0.1", "-p",
+                str(self.servers[1].server_address[1]), "-d", self.rootdir]
+        # the first sample isn't taken for a delta of the whole counter
+        self.assertEqual("OPERATIONS_GET_REQUESTS OK: 0 get resquests | get_requests=0",
+                         str(MemcachedChecker().execute(args)))
+        self.servers[1].n = 3
+        self.assertEqual("OPERATIONS_GET_REQUESTS OK: 100 get resquests | get_requests=100",
+                         str(MemcachedChecker().execute(args)))
+
+    def test_memcached_totals_saved_before(self):
+        # the deltas used to be saved as the totals, without the server
+        port = self.servers[1].server_address[1]
+        args = ["-t", "OPERATIONS_GET_REQUESTS", "-H", "127.0.0.1", "-p", str(port), "-d", self.rootdir]
+        checker = MemcachedChecker()
+        checker.save_status(checker.parse_args(args), {"cmd_get": 150})
+        self.assertEqual(0, MemcachedChecker().execute(args)["value"])
+
+    def test_memcached_server_dropping_out(self):
+        args = ["-t", "OPERATIONS_GET_REQUESTS,ITEMS_OUTOFMEMORY", "-H", ",".join(s.target for s in self.servers),
+                "--slabs", "-d", self.rootdir]
+        MemcachedChecker().execute(args)
+        self.servers[0].n = 3
+        self.servers[1].shutdown()
+        self.servers[1].server_close()
+        self.servers.pop()
+        # the delta of the server left, the total of the other isn't taken off
+        get_requests, outofmemory = MemcachedChecker().execute(args).results
+        self.assertEqual((200, 2), (get_requests["value"], outofmemory["value"]))
+
+if __name__ == "__main__":
+    unittest.main()